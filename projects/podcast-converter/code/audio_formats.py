@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+音声モードの定義
+----------------------------------------
+- mp3: yt-dlp で取得した音声を ffmpeg で MP3（128kbps）に再エンコードする（従来の方式）
+- m4a: AAC の音声のみのストリームを選び、再エンコードせずに M4A コンテナへ格納する
+       （CPU負荷がほぼない。AAC の音声ストリームがなければ mp3 にフォールバックする）
+"""
+
+import os
+
+AUDIO_MODES = {
+    "mp3": {"ext": ".mp3", "mime": "audio/mpeg"},
+    "m4a": {"ext": ".m4a", "mime": "audio/mp4"},
+}
+DEFAULT_AUDIO_MODE = "mp3"
+AUDIO_EXTENSIONS = tuple(mode["ext"] for mode in AUDIO_MODES.values())
+
+# m4a モードで選ぶ形式（AAC の音声のみのストリーム）
+M4A_FORMAT = "bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]"
+
+
+def is_audio_file(filename):
+    return os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS
+
+
+def mime_type_for(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    for mode in AUDIO_MODES.values():
+        if mode["ext"] == ext:
+            return mode["mime"]
+    return "audio/mpeg"
+
+
+def audio_ext(mode):
+    return AUDIO_MODES.get(mode, AUDIO_MODES[DEFAULT_AUDIO_MODE])["ext"]
+
+
+def fallback_modes(mode):
+    """音声モードと、その形式のストリームがない場合のフォールバック先（m4a → mp3）"""
+    return [mode] if mode == DEFAULT_AUDIO_MODE else [mode, DEFAULT_AUDIO_MODE]
+
+
+def download_args(mode, filepath, ffmpeg_path):
+    """音声モードごとの yt-dlp 引数（URLを除く）"""
+    if mode == "m4a":
+        # 元がAACなので ExtractAudio は変換せずそのまま M4A として残す
+        return [
+            "-f", M4A_FORMAT,
+            "-x",
+            "--audio-format", "m4a",
+            "--ffmpeg-location", ffmpeg_path,
+            "-o", filepath,
+        ]
+    return [
+        "-x",
+        "--audio-format", "mp3",
+        "--ffmpeg-location", ffmpeg_path,
+        "--postprocessor-args", "-b:a 128k",
+        "-o", filepath,
+    ]
+
+
+def stream_format(mode):
+    """ストリーミング時に yt-dlp で選ぶ形式"""
+    return M4A_FORMAT if mode == "m4a" else "bestaudio/best"
+
+
+def stream_codec_args(mode):
+    """ストリーミング時に ffmpeg でパイプ出力するための引数"""
+    if mode == "m4a":
+        # パイプにはシークできないので断片化MP4で書き出す（音声はコピー）
+        return ["-c:a", "copy", "-f", "ipod", "-movflags", "+frag_keyframe+empty_moov"]
+    return ["-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3"]
+
+
+def is_format_unavailable(error_msg):
+    """指定した形式のストリームがない（mp3 へフォールバックすべき）エラーか"""
+    return "Requested format is not available" in (error_msg or "")
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+ポッドキャスト変換のベンチマーク
+----------------------------------------
+使い方:
+  python code/benchmark.py engine --playlist <URL> --count 15
+      yt-dlp のメタデータ取得を subprocess / library バックエンドで比較する
+  python code/benchmark.py audio --urls <URL> ...
+      音声モード（mp3 / m4a）ごとに音声1時間あたりのCPU秒を比較する
+  python code/benchmark.py offline --channels 5 20 --workers 3 6 --processes 2 4
+      偽の yt-dlp / ffmpeg / ffprobe とローカルのS3互換サーバーで podcast_update.py 全体を実行し、
+      チャンネル数・同時実行数ごとの実行時間・最大メモリ・ディスク書き込み量・アップロード速度を記録する
+  python code/benchmark.py compare <前回の結果.json> <今回の結果.json>
+      offline の結果を比較する
+  python code/benchmark.py startup --repeat 10
+      podcast_update の import 時間と、時間のかかるモジュールを表示する
+      （起動から最初の子プロセスまでの時間は offline の結果に入る）
+"""
+
+import argparse
+import configparser
+import glob
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from audio_formats import AUDIO_MODES, audio_ext, download_args, is_audio_file
+from ytdlp_engine import SubprocessEngine, LibraryEngine, YtDlpError
+
+
+# ---- yt-dlp エンジン比較 ----
+
+def _playlist_video_urls(playlist_url, count):
+    playlist = SubprocessEngine().list_playlist(
+        ["--flat-playlist", "--playlist-items", f"1-{count}"], playlist_url)
+    return [f"https://www.youtube.com/watch?v={entry['id']}"
+            for entry in playlist.get("entries", []) if entry and entry.get("id")]
+
+
+def _time_batch(engine, urls):
+    start = time.perf_counter()
+    results = engine.fetch_metadata_batch(urls)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for value in results.values() if isinstance(value, Exception))
+    return elapsed, errors
+
+
+def bench_engine(args):
+    urls = list(args.urls or [])
+    if args.playlist:
+        urls += _playlist_video_urls(args.playlist, args.count)
+    if not urls:
+        print("対象URLがありません（--urls または --playlist を指定）")
+        return 1
+    print(f"対象動画数: {len(urls)} / 繰り返し: {args.repeat}")
+
+    rows = []
+
+    engine = SubprocessEngine()
+    for i in range(args.repeat):
+        elapsed, errors = _time_batch(engine, urls)
+        rows.append(("subprocess", i + 1, elapsed, errors))
+
+    start = time.perf_counter()
+    engine = LibraryEngine(args.workers)
+    startup = time.perf_counter() - start
+    try:
+        for i in range(args.repeat):
+            elapsed, errors = _time_batch(engine, urls)
+            rows.append((f"library({args.workers})", i + 1, elapsed, errors))
+    finally:
+        engine.close()
+
+    print(f"library ワーカー起動: {startup:.2f}秒")
+    print(f"{'backend':<14}{'run':>4}{'total[s]':>10}{'per url[s]':>12}{'errors':>8}")
+    for backend, run, elapsed, errors in rows:
+        print(f"{backend:<14}{run:>4}{elapsed:>10.2f}{elapsed / len(urls):>12.3f}{errors:>8}")
+    return 0
+
+
+# ---- 音声モード比較 ----
+
+def _children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _probe_seconds(path, ffmpeg_path):
+    result = subprocess.run([
+        os.path.join(ffmpeg_path, "ffprobe"), "-v", "error",
+        "-show_entries", "format=duration", "-of", "json", path
+    ], capture_output=True, text=True, check=True)
+    return float(json.loads(result.stdout)['format']['duration'])
+
+
+def bench_audio(args):
+    engine = SubprocessEngine()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="podcast-bench-") as tmp_dir:
+        for url in args.urls:
+            for mode in args.modes:
+                path = os.path.join(tmp_dir, f"{len(rows)}{audio_ext(mode)}")
+                cpu_before = _children_cpu_seconds()
+                start = time.perf_counter()
+                try:
+                    engine.download(download_args(mode, path, args.ffmpeg_path), url)
+                except YtDlpError as e:
+                    print(f"失敗: {mode} {url}\n{e.stderr.strip()}")
+                    continue
+                wall = time.perf_counter() - start
+                cpu = _children_cpu_seconds() - cpu_before
+                audio_hours = _probe_seconds(path, args.ffmpeg_path) / 3600
+                rows.append((mode, url, wall, cpu, audio_hours, os.path.getsize(path)))
+                os.remove(path)
+
+    print(f"{'mode':<6}{'wall[s]':>9}{'cpu[s]':>9}{'audio[h]':>10}{'cpu s/h':>10}{'MB':>8}  url")
+    for mode, url, wall, cpu, audio_hours, size in rows:
+        per_hour = cpu / audio_hours if audio_hours else 0
+        print(f"{mode:<6}{wall:>9.1f}{cpu:>9.1f}{audio_hours:>10.2f}{per_hour:>10.1f}{size / 1024 / 1024:>8.1f}  {url}")
+    return 0
+
+
+# ---- 起動時間 ----
+
+def _import_times(output):
+    """-X importtime の出力から {モジュール: 累計マイクロ秒} を返す"""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_startup(args):
+    # 測るのは2回目以降（.pyc がある状態）。PYTHONDONTWRITEBYTECODE は外して cron と同じ条件にする
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    command = [sys.executable, "-X", "importtime", "-c", "import podcast_update"]
+    subprocess.run(command, cwd=script_dir, env=env, capture_output=True, check=True)
+    walls = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=script_dir, env=env, capture_output=True, text=True, check=True)
+        walls.append(time.perf_counter() - start)
+    walls.sort()
+    times = _import_times(result.stderr)
+    print(f"import podcast_update: 中央値 {walls[len(walls) // 2] * 1000:.0f}ms / 最小 {walls[0] * 1000:.0f}ms"
+          f"（{args.repeat} 回, インタプリタの起動を含む）")
+    print(f"{'累計[ms]':>10}  モジュール")
+    for name, micros in sorted(times.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{micros / 1000:>10.1f}  {name}")
+    return 0
+
+
+# ---- オフライン全体ベンチマーク ----
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+results_dir = os.path.join(os.path.dirname(script_dir), "data", "benchmarks")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_local_s3():
+    """moto のS3互換サーバーを起動し (エンドポイント, 停止関数) を返す（moto がなければ None）"""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        return None
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return f"http://127.0.0.1:{port}", server.stop
+
+
+def _create_bucket(endpoint, access_key, secret_key, bucket):
+    import boto3
+    client = boto3.client("s3", region_name="us-east-1", endpoint_url=endpoint,
+                          aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+    client.create_bucket(Bucket=bucket)
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir,
+                                capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=script_dir,
+                               capture_output=True, text=True).stdout.strip()
+        return result.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_fake_bin(bin_dir):
+    """PATH 上で yt-dlp / ffmpeg / ffprobe として呼ばれるラッパーを置く"""
+    os.makedirs(bin_dir)
+    fake_tools = os.path.join(script_dir, "fake_tools.py")
+    for tool in ("yt-dlp", "ffmpeg", "ffprobe"):
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_tools}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+
+
+def _write_bench_config(path, channels, settings, r2):
+    """本番の config.ini の [Settings] を元に、R2・チャンネル・ツールの場所を差し替えた設定を書く"""
+    base = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
+    base.read(os.path.join(script_dir, "config.ini"), encoding="utf-8")
+    config = configparser.ConfigParser()
+    config["R2"] = r2
+    config["Paths"] = {"repo_dir": os.path.dirname(os.path.dirname(path)),
+                       "ffmpeg_path": os.path.join(os.path.dirname(os.path.dirname(path)), "bin")}
+    config["Settings"] = dict(base["Settings"]) if base.has_section("Settings") else {}
+    config["Settings"].update(settings)
+    config["Channels"] = {f"bench{i:02d}": f"ベンチ{i:02d}" for i in range(channels)}
+    config["Playlists"] = {f"bench{i:02d}": f"https://www.youtube.com/@bench{i:02d}/videos" for i in range(channels)}
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+
+
+def _dir_bytes(path, predicate=lambda name: True):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if predicate(name):
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _latest_report(project):
+    reports = glob.glob(os.path.join(project, "data", "reports", "run-*.json"))
+    if not reports:
+        return None
+    with open(max(reports, key=os.path.getmtime), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _counter(report, name, **labels):
+    return sum(c["value"] for c in report["metrics"]["counters"]
+               if c["name"] == name and all(c["labels"].get(k) == v for k, v in labels.items()))
+
+
+def _run_point(args, spec, endpoint, point_number, channels, workers, processes):
+    """1つの組み合わせについて、一時ディレクトリに構成を作って podcast_update.py を実行する"""
+    project = tempfile.mkdtemp(prefix="podcast-bench-")
+    rows = []
+    try:
+        code_dir = os.path.join(project, "code")
+        os.makedirs(code_dir)
+        for path in glob.glob(os.path.join(script_dir, "*.py")):
+            shutil.copy(path, code_dir)
+        _write_fake_bin(os.path.join(project, "bin"))
+        spec_path = os.path.join(project, "spec.json")
+        with open(spec_path, "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+
+        bucket = f"bench-{os.getpid()}-{point_number}"
+        _create_bucket(endpoint, args.s3_access_key, args.s3_secret_key, bucket)
+        settings = dict(args.set)
+        settings.update({
+            "max_workers": str(workers),
+            "max_yt_dlp_processes": str(processes),
+            "yt_dlp_backend": "subprocess",
+            "run_report_keep": "100",
+            "metrics_textfile": "",
+        })
+        _write_bench_config(os.path.join(code_dir, "config.ini"), channels, settings, {
+            "access_key": args.s3_access_key, "secret_key": args.s3_secret_key,
+            "endpoint": endpoint, "bucket": bucket, "public_base_url": "http://bench.invalid",
+        })
+
+        env = dict(os.environ, PATH=os.path.join(project, "bin") + os.pathsep + os.environ.get("PATH", ""),
+                   PODCAST_BENCH_SPEC=spec_path)
+        for run in range(1, args.runs + 1):
+            log_path = os.path.join(project, f"run-{run}.log")
+            start = time.perf_counter()
+            with open(log_path, "w", encoding="utf-8") as log:
+                proc = subprocess.Popen([sys.executable, os.path.join(code_dir, "podcast_update.py")],
+                                        cwd=project, env=env, stdout=log, stderr=subprocess.STDOUT)
+                # wait4 でこの実行（と待ち合わせた子プロセス）だけのリソース使用量を取る
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+            wall = time.perf_counter() - start
+
+            report = _latest_report(project) or {"metrics": {"stages": {}, "counters": []}, "subprocesses": {}}
+            stages = report["metrics"]["stages"]
+            upload_bytes = _counter(report, "bytes", kind="uploaded") + _counter(report, "bytes", kind="streamed")
+            upload_seconds = sum(values["seconds"] for stage, values in stages.items()
+                                 if stage == "r2_upload" or stage.startswith("stream_"))
+            rows.append({
+                "channels": channels,
+                "max_workers": workers,
+                "max_yt_dlp_processes": processes,
+                "run": run,
+                "exit_code": proc.returncode,
+                "wall_seconds": round(wall, 3),
+                # ru_maxrss は fork 元（このベンチマーク）の値を引き継ぐので、本体が記録した値を優先する
+                "peak_rss_mb": report.get("peak_rss_mb", round(usage.ru_maxrss / 1024, 1)),
+                # プロセスの起動から import 完了・最初の子プロセス（yt-dlp の一覧取得）までの秒数
+                "imports_seconds": report.get("startup", {}).get("imports") or 0,
+                "first_subprocess_seconds": report.get("startup", {}).get("first_subprocess") or 0,
+                "disk_write_bytes": usage.ru_oublock * 512,
+                "audio_bytes": _dir_bytes(os.path.join(project, "data"), is_audio_file),
+                "upload_bytes": upload_bytes,
+                "upload_mb_s": round(upload_bytes / 1024 / 1024 / upload_seconds, 2) if upload_seconds else 0,
+                "aggregate_mb_s": round(upload_bytes / 1024 / 1024 / wall, 2),
+                "episodes": _counter(report, "episodes"),
+                "dedup_hits": _counter(report, "dedup_hits"),
+                "errors": _counter(report, "errors"),
+                "stages": {stage: values["seconds"] for stage, values in stages.items()},
+                "subprocesses": report.get("subprocesses", {}),
+            })
+            if proc.returncode != 0:
+                print(f"⚠️ 終了コード {proc.returncode}: ログ {log_path}")
+                args.keep = True
+                break
+    finally:
+        if args.keep:
+            print(f"📁 作業ディレクトリ: {project}")
+        else:
+            shutil.rmtree(project, ignore_errors=True)
+    return rows
+
+
+def _print_offline_rows(rows):
+    print(f"{'ch':>4}{'work':>5}{'proc':>5}{'run':>4}{'wall[s]':>9}{'1st[s]':>8}{'RSS[MB]':>9}{'disk[MB]':>10}"
+          f"{'up[MB]':>8}{'MB/s':>7}{'total MB/s':>11}{'eps':>5}{'errs':>5}")
+    for row in rows:
+        print(f"{row['channels']:>4}{row['max_workers']:>5}{row['max_yt_dlp_processes']:>5}{row['run']:>4}"
+              f"{row['wall_seconds']:>9.2f}{row['first_subprocess_seconds']:>8.2f}"
+              f"{row['peak_rss_mb']:>9.1f}{row['disk_write_bytes'] / 1024 / 1024:>10.1f}"
+              f"{row['upload_bytes'] / 1024 / 1024:>8.1f}{row['upload_mb_s']:>7.1f}{row['aggregate_mb_s']:>11.1f}"
+              f"{row['episodes']:>5}{row['errors']:>5}")
+
+
+def bench_offline(args):
+    from fake_tools import merge_spec
+
+    overrides = {}
+    if args.spec:
+        with open(args.spec, encoding="utf-8") as f:
+            overrides = json.load(f)
+    spec = merge_spec(overrides)
+    if args.videos is not None:
+        spec["videos_per_channel"] = args.videos
+    if args.shared_videos is not None:
+        spec["shared_videos_per_channel"] = args.shared_videos
+    if args.size_mb:
+        spec["size_mb"] = args.size_mb
+    spec["latency"] = {kind: seconds * args.latency_scale for kind, seconds in spec["latency"].items()}
+
+    stop_server = None
+    endpoint = args.s3_endpoint
+    if not endpoint:
+        started = _start_local_s3()
+        if started is None:
+            print("ローカルのS3互換サーバーがありません: pip install 'moto[server]' するか、"
+                  "--s3-endpoint でMinIOなどを指定してください")
+            return 1
+        endpoint, stop_server = started
+    print(f"🪣 S3互換サーバー: {endpoint}")
+
+    points = list(itertools.product(args.channels, args.workers, args.processes))
+    rows = []
+    try:
+        for number, (channels, workers, processes) in enumerate(points, 1):
+            print(f"▶️ [{number}/{len(points)}] チャンネル {channels} / max_workers {workers} / "
+                  f"max_yt_dlp_processes {processes}")
+            rows.extend(_run_point(args, spec, endpoint, number, channels, workers, processes))
+    finally:
+        if stop_server:
+            stop_server()
+
+    _print_offline_rows(rows)
+    result = {
+        "label": args.label,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "spec": spec,
+        "settings": dict(args.set),
+        "results": rows,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(results_dir, exist_ok=True)
+        name = f"offline-{datetime.now().strftime('%Y%m%d-%H%M%S')}{'-' + args.label if args.label else ''}.json"
+        output = os.path.join(results_dir, name)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 結果: {output}")
+    return 0
+
+
+def bench_compare(args):
+    results = []
+    for path in (args.base, args.new):
+        with open(path, encoding="utf-8") as f:
+            results.append(json.load(f))
+    base, new = results
+    print(f"基準: {base.get('label') or args.base}（{base.get('git_revision')}, {base.get('created_at')}）")
+    print(f"比較: {new.get('label') or args.new}（{new.get('git_revision')}, {new.get('created_at')}）")
+    if base.get("spec") != new.get("spec") or base.get("settings") != new.get("settings"):
+        print("⚠️ 偽ツールの設定または config の上書きが異なります")
+
+    def key(row):
+        return row["channels"], row["max_workers"], row["max_yt_dlp_processes"], row["run"]
+
+    base_rows = {key(row): row for row in base["results"]}
+    metrics = (("wall_seconds", "wall[s]", 1), ("first_subprocess_seconds", "1st proc[s]", 1),
+               ("peak_rss_mb", "RSS[MB]", 1), ("disk_write_bytes", "disk[MB]", 1 / 1024 / 1024),
+               ("upload_mb_s", "MB/s", 1))
+    print(f"{'ch':>4}{'work':>5}{'proc':>5}{'run':>4}" + "".join(f"{label:>24}" for _, label, _ in metrics))
+    for row in new["results"]:
+        old = base_rows.get(key(row))
+        if old is None:
+            continue
+        cells = []
+        for name, _, scale in metrics:
+            before, after = old.get(name, 0) * scale, row.get(name, 0) * scale
+            change = f"{(after - before) / before * 100:+.0f}%" if before else "-"
+            cells.append(f"{before:>9.2f}→{after:<9.2f}{change:>5}")
+        print(f"{row['channels']:>4}{row['max_workers']:>5}{row['max_yt_dlp_processes']:>5}{row['run']:>4}"
+              + "".join(f"{cell:>24}" for cell in cells))
+    return 0
+
+
+def _setting(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"KEY=VALUE の形式で指定してください: {text}")
+    return key.strip(), value.strip()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ポッドキャスト変換のベンチマーク")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    engine = sub.add_parser("engine", help="yt-dlp バックエンドのメタデータ取得速度を比較する")
+    engine.add_argument("--urls", nargs="*", help="対象の動画URL")
+    engine.add_argument("--playlist", help="対象動画を取得するプレイリスト・チャンネルURL")
+    engine.add_argument("--count", type=int, default=15, help="プレイリストから取得する動画数")
+    engine.add_argument("--repeat", type=int, default=2, help="繰り返し回数（2回目以降はワーカーが温まった状態）")
+    engine.add_argument("--workers", type=int, default=4, help="library バックエンドのワーカー数")
+    engine.set_defaults(func=bench_engine)
+
+    audio = sub.add_parser("audio", help="音声モードごとの音声1時間あたりCPU秒を比較する")
+    audio.add_argument("--urls", nargs="+", required=True, help="対象の動画URL")
+    audio.add_argument("--modes", nargs="+", default=list(AUDIO_MODES), choices=list(AUDIO_MODES))
+    audio.add_argument("--ffmpeg-path", default="/usr/bin", help="ffmpeg / ffprobe のあるディレクトリ")
+    audio.set_defaults(func=bench_audio)
+
+    offline = sub.add_parser("offline", help="偽の yt-dlp とローカルS3で全体を実行し、同時実行数ごとに比較する")
+    offline.add_argument("--channels", nargs="+", type=int, default=[5], help="チャンネル数（複数指定で掃引）")
+    offline.add_argument("--workers", nargs="+", type=int, default=[3], help="max_workers（複数指定で掃引）")
+    offline.add_argument("--processes", nargs="+", type=int, default=[2], help="max_yt_dlp_processes（複数指定で掃引）")
+    offline.add_argument("--runs", type=int, default=1,
+                         help="組み合わせごとの実行回数（2回目以降は状態ストア・R2が温まった状態）")
+    offline.add_argument("--videos", type=int, help="チャンネルあたりの動画数")
+    offline.add_argument("--shared-videos", type=int, help="全チャンネルに共通して現れる動画数（重複排除の計測用）")
+    offline.add_argument("--size-mb", nargs=2, type=float, metavar=("MIN", "MAX"), help="音声ファイルの大きさ（MB）")
+    offline.add_argument("--latency-scale", type=float, default=1.0, help="偽ツールの遅延の倍率（0で遅延なし）")
+    offline.add_argument("--spec", help="偽ツールの設定（JSON、fake_tools.DEFAULT_SPEC を上書き）")
+    offline.add_argument("--set", type=_setting, action="append", default=[], metavar="KEY=VALUE",
+                         help="config.ini の [Settings] を上書き（例: --set audio_mode=m4a）")
+    offline.add_argument("--s3-endpoint", help="既存のS3互換サーバー（未指定なら moto を起動）")
+    offline.add_argument("--s3-access-key", default="minioadmin")
+    offline.add_argument("--s3-secret-key", default="minioadmin")
+    offline.add_argument("--label", help="結果ファイル名に付けるラベル")
+    offline.add_argument("--output", help="結果の保存先（既定: data/benchmarks/offline-<日時>.json）")
+    offline.add_argument("--keep", action="store_true", help="作業ディレクトリ（ログ・出力）を残す")
+    offline.set_defaults(func=bench_offline)
+
+    compare = sub.add_parser("compare", help="offline の結果を比較する")
+    compare.add_argument("base", help="基準の結果ファイル")
+    compare.add_argument("new", help="比較する結果ファイル")
+    compare.set_defaults(func=bench_compare)
+
+    startup = sub.add_parser("startup", help="podcast_update の import 時間と時間のかかるモジュールを表示する")
+    startup.add_argument("--repeat", type=int, default=10, help="計測回数")
+    startup.add_argument("--top", type=int, default=15, help="表示するモジュール数")
+    startup.set_defaults(func=bench_startup)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+yt-dlp 同時実行数の適応制御
+----------------------------------------
+固定のセマフォの代わりに、ダウンロードのスループットとエラー率を見て
+同時実行数を [最小, 最大] の範囲で上下させる。
+- レート制限（HTTP 429, "Sign in to confirm" など）を検知したら同時実行数を半減し、
+  指数的に伸びる待機時間（バックオフ）の間は新しいダウンロードを始めない
+- チャンネルごとのサーキットブレーカー：連続して失敗したチャンネルは一定時間ダウンロードを止める
+判断はすべてログに出すので、上下限の調整に使える。
+"""
+
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# チャンネルの健全性とは無関係な（動画固有の）エラー分類
+VIDEO_SPECIFIC_ERRORS = {"premiere", "private", "removed", "unavailable"}
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているチャンネル"""
+
+
+class _Breaker:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+
+
+class Slot:
+    """取得した実行枠。succeed / fail で結果を記録する"""
+
+    def __init__(self, limiter, channel):
+        self._limiter = limiter
+        self.channel = channel
+        self.started = time.monotonic()
+        self._recorded = False
+
+    def succeed(self, nbytes=0):
+        self._recorded = True
+        self._limiter._record(self, ok=True, nbytes=nbytes)
+
+    def fail(self, category="other"):
+        self._recorded = True
+        self._limiter._record(self, ok=False, category=category)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._recorded:
+            if exc_type is None:
+                self.succeed()
+            else:
+                self.fail()
+        self._limiter._release()
+        return False
+
+
+class AdaptiveLimiter:
+    """スループット・エラー率・レート制限に応じて同時実行数を調整するリミッター"""
+
+    def __init__(self, min_limit, max_limit, adaptive=True,
+                 adjust_every=4, max_error_rate=0.3,
+                 backoff_base=30.0, backoff_max=900.0,
+                 breaker_threshold=3, breaker_cooldown=1800.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.adaptive = adaptive
+        self.limit = (self.min_limit + self.max_limit + 1) // 2 if adaptive else self.max_limit
+        self.adjust_every = adjust_every
+        self.max_error_rate = max_error_rate
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._backoff_until = 0.0
+        self._backoff_level = 0
+        self._breakers = collections.defaultdict(_Breaker)
+        # 前回の調整以降の完了記録
+        self._window = []
+        self._window_start = time.monotonic()
+        self._saturated = False
+        self._last_change = 0
+        self._last_throughput = None
+
+    # ---- 枠の取得・返却 ----
+
+    def slot(self, channel):
+        """実行枠を取得する（空きとバックオフ明けを待つ）。ブレーカーが開いていれば CircuitOpenError"""
+        with self._cond:
+            self._check_breaker(channel)
+            while True:
+                wait = self._backoff_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue
+                if self._active < self.limit:
+                    break
+                self._saturated = True
+                self._cond.wait()
+            self._active += 1
+        return Slot(self, channel)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _check_breaker(self, channel):
+        breaker = self._breakers[channel]
+        if breaker.open_until and time.monotonic() < breaker.open_until:
+            remaining = int(breaker.open_until - time.monotonic())
+            raise CircuitOpenError(f"{channel}: 連続失敗のため停止中（残り{remaining}秒）")
+
+    # ---- 結果の記録と調整 ----
+
+    def report_throttle(self, source=""):
+        """一覧・メタデータ取得などダウンロード以外で検知したレート制限を反映する"""
+        with self._cond:
+            self._throttled(source)
+
+    def _record(self, slot, ok, nbytes=0, category=None):
+        elapsed = time.monotonic() - slot.started
+        with self._cond:
+            breaker = self._breakers[slot.channel]
+            if ok:
+                breaker.failures = 0
+                breaker.open_until = 0.0
+                breaker.cooldown = 0.0
+                self._backoff_level = 0
+            elif category not in VIDEO_SPECIFIC_ERRORS:
+                breaker.failures += 1
+                if breaker.failures >= self.breaker_threshold:
+                    breaker.cooldown = (min(breaker.cooldown * 2, self.breaker_cooldown * 8)
+                                        if breaker.cooldown else self.breaker_cooldown)
+                    breaker.open_until = time.monotonic() + breaker.cooldown
+                    logger.warning(f"🚧 サーキットブレーカー作動: {slot.channel}"
+                                   f"（連続失敗 {breaker.failures} 回, {int(breaker.cooldown)}秒停止）")
+                    # 停止明けに1回だけ試せるよう、閾値の手前まで戻しておく
+                    breaker.failures = self.breaker_threshold - 1
+
+            if category == "throttled":
+                self._throttled(slot.channel)
+                return
+
+            self._window.append((ok, nbytes, elapsed))
+            if len(self._window) >= self.adjust_every:
+                self._adjust()
+
+    def _throttled(self, source):
+        self._backoff_level += 1
+        backoff = min(self.backoff_base * (2 ** (self._backoff_level - 1)), self.backoff_max)
+        self._backoff_until = time.monotonic() + backoff
+        old = self.limit
+        if self.adaptive:
+            self.limit = max(self.min_limit, self.limit // 2)
+        self._reset_window(change=self.limit - old)
+        logger.warning(f"🐢 レート制限を検知（{source}）: 同時実行数 {old}→{self.limit}, {int(backoff)}秒待機")
+        self._cond.notify_all()
+
+    def _adjust(self):
+        window = self._window
+        errors = sum(1 for ok, _, _ in window if not ok)
+        error_rate = errors / len(window)
+        wall = max(time.monotonic() - self._window_start, 1e-6)
+        throughput = sum(nbytes for _, nbytes, _ in window) / wall
+        old = self.limit
+
+        if not self.adaptive:
+            reason = "固定"
+        elif error_rate > self.max_error_rate:
+            self.limit = max(self.min_limit, self.limit - 1)
+            reason = f"エラー率 {error_rate:.0%} が上限 {self.max_error_rate:.0%} を超過"
+        elif (self._last_change > 0 and self._last_throughput
+              and throughput < self._last_throughput * 0.9):
+            self.limit = max(self.min_limit, self.limit - 1)
+            reason = "増やしてもスループットが伸びないため戻す"
+        elif self._saturated and self.limit < self.max_limit:
+            self.limit += 1
+            reason = "枠が埋まっておりエラーも少ないため増加"
+        elif self._saturated:
+            reason = "上限に到達"
+        else:
+            reason = "枠に余裕があるため維持"
+
+        logger.info(f"🎛️ yt-dlp同時実行数 {old}→{self.limit}（{reason}; "
+                    f"スループット {throughput / 1024 / 1024:.2f}MB/s, エラー率 {error_rate:.0%}, 件数 {len(window)}）")
+        self._last_throughput = throughput
+        self._reset_window(change=self.limit - old)
+        self._cond.notify_all()
+
+    def _reset_window(self, change):
+        self._window = []
+        self._window_start = time.monotonic()
+        self._saturated = False
+        self._last_change = change
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+オフラインベンチマーク用の yt-dlp / ffmpeg / ffprobe の代用品
+----------------------------------------
+使い方: python fake_tools.py <yt-dlp|ffmpeg|ffprobe> 引数...
+（benchmark.py offline が PATH 上にラッパーを置いて呼び出させる）
+
+動作は環境変数 PODCAST_BENCH_SPEC の JSON ファイルで指定する（DEFAULT_SPEC を参照）。
+- 遅延: 一覧取得・メタデータ取得・ダウンロード開始・ffprobe ごとの秒数（±jitter の割合でゆらぐ）
+- 失敗: 非公開・削除・利用不可・プレミア待ちは動画IDごとに決まり（何度呼んでも同じ結果）、
+  レート制限（429）とダウンロード失敗は呼び出しごとに確率で起きる（結果がぶれるので既定は0）
+- 出力: 音声ファイルの大きさ（MB の範囲）と書き込み速度、長さ（秒の範囲）
+- 重複: shared_videos_per_channel 本は全チャンネルの一覧に同じ動画（shared-<番号>）として現れる
+"""
+
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_SPEC = {
+    "seed": 1,
+    "videos_per_channel": 5,
+    "shared_videos_per_channel": 0,
+    "latency": {"list": 0.3, "metadata": 0.2, "download": 0.5, "ffprobe": 0.02},
+    "jitter": 0.2,
+    "download_mb_s": 50,
+    "size_mb": [5, 20],
+    "duration": [600, 3600],
+    "failures": {
+        "private": 0.05,
+        "removed": 0.02,
+        "unavailable": 0.0,
+        "premiere": 0.0,
+        "throttled": 0.0,
+        "download": 0.0,
+    },
+}
+
+# classify_youtube_error が分類できる yt-dlp のエラーメッセージ
+ERROR_MESSAGES = {
+    "private": "ERROR: [youtube] {id}: Private video. Sign in if you've been granted access to this video",
+    "removed": "ERROR: [youtube] {id}: Video unavailable. This video has been removed by the uploader",
+    "unavailable": "ERROR: [youtube] {id}: This video is not available",
+    "premiere": "ERROR: [youtube] {id}: Premieres in 5 hours",
+    "throttled": "ERROR: [youtube] {id}: HTTP Error 429: Too Many Requests",
+    "download": "ERROR: unable to download video data: HTTP Error 403: Forbidden",
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def merge_spec(overrides=None):
+    """DEFAULT_SPEC に上書き分を重ねた設定を返す（latency・failures は項目ごとに上書き）"""
+    spec = json.loads(json.dumps(DEFAULT_SPEC))
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(spec.get(key), dict):
+            spec[key].update(value)
+        else:
+            spec[key] = value
+    return spec
+
+
+def load_spec():
+    path = os.environ.get("PODCAST_BENCH_SPEC")
+    if not path:
+        return merge_spec()
+    with open(path, encoding="utf-8") as f:
+        return merge_spec(json.load(f))
+
+
+def _unit(spec, *parts):
+    """動画IDなどから 0〜1 の決まった値を作る（同じ入力なら毎回同じ）"""
+    text = "/".join(str(p) for p in (spec["seed"], *parts))
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def _between(spec, bounds, *parts):
+    low, high = bounds
+    return low + (high - low) * _unit(spec, *parts)
+
+
+def _sleep(spec, kind):
+    base = spec["latency"].get(kind, 0)
+    if base > 0:
+        time.sleep(base * (1 + random.uniform(-spec["jitter"], spec["jitter"])))
+
+
+def _fail(message, video_id=""):
+    sys.stderr.write(message.format(id=video_id) + "\n")
+    sys.exit(1)
+
+
+def _video_failure(spec, video_id):
+    """動画IDごとに決まる失敗（非公開・削除・利用不可・プレミア待ち）"""
+    point = _unit(spec, "failure", video_id)
+    for category in ("private", "removed", "unavailable", "premiere"):
+        rate = spec["failures"].get(category, 0)
+        if point < rate:
+            return category
+        point -= rate
+    return None
+
+
+def _video_id(url):
+    return url.rsplit("v=", 1)[-1] if "v=" in url else url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _channel_name(url):
+    # https://www.youtube.com/@bench03/videos → bench03
+    parts = [p for p in url.split("/") if p]
+    for part in parts:
+        if part.startswith("@"):
+            return part[1:]
+    return parts[-1]
+
+
+def _video_info(spec, video_id):
+    channel, _, number = video_id.rpartition("-")
+    published = datetime.now() - timedelta(hours=int(number or 0) * 6)
+    return {
+        "id": video_id,
+        "title": f"{channel} エピソード {number}",
+        "upload_date": published.strftime("%Y%m%d"),
+        "timestamp": int(published.timestamp()),
+        "duration": int(_between(spec, spec["duration"], "duration", video_id)),
+        "live_status": "not_live",
+    }
+
+
+def _write_audio(spec, out, video_id):
+    """動画IDごとに決まった大きさの音声データを、指定の速度で書き出す"""
+    size = int(_between(spec, spec["size_mb"], "size", video_id) * 1024 * 1024)
+    rate = spec["download_mb_s"] * 1024 * 1024
+    chunk = b"\0" * CHUNK_SIZE
+    start = time.perf_counter()
+    written = 0
+    while written < size:
+        n = min(CHUNK_SIZE, size - written)
+        out.write(chunk[:n])
+        written += n
+        if rate > 0:
+            ahead = written / rate - (time.perf_counter() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+    return size
+
+
+def fake_yt_dlp(spec, args):
+    url = args[-1]
+    if "--flat-playlist" in args:
+        _sleep(spec, "list")
+        if random.random() < spec["failures"].get("throttled", 0):
+            _fail(ERROR_MESSAGES["throttled"], _channel_name(url))
+        channel = _channel_name(url)
+        entries = []
+        shared = spec["shared_videos_per_channel"]
+        for number in range(spec["videos_per_channel"]):
+            video_id = f"shared-{number:04d}" if number < shared else f"{channel}-{number:04d}"
+            info = _video_info(spec, video_id)
+            entries.append({"id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}",
+                            "title": info["title"], "timestamp": info["timestamp"]})
+        print(json.dumps({"id": channel, "entries": entries}))
+        return
+
+    video_id = _video_id(url)
+    if "-J" in args:
+        _sleep(spec, "metadata")
+        if random.random() < spec["failures"].get("throttled", 0):
+            _fail(ERROR_MESSAGES["throttled"], video_id)
+        category = _video_failure(spec, video_id)
+        if category:
+            _fail(ERROR_MESSAGES[category], video_id)
+        print(json.dumps(_video_info(spec, video_id), ensure_ascii=False))
+        return
+
+    # ダウンロード（-o - なら標準出力へ）
+    _sleep(spec, "download")
+    category = _video_failure(spec, video_id)
+    if category:
+        _fail(ERROR_MESSAGES[category], video_id)
+    if random.random() < spec["failures"].get("download", 0):
+        _fail(ERROR_MESSAGES["download"])
+    output = args[args.index("-o") + 1]
+    if output == "-":
+        _write_audio(spec, sys.stdout.buffer, video_id)
+        sys.stdout.buffer.flush()
+    else:
+        with open(output, "wb") as f:
+            _write_audio(spec, f, video_id)
+
+
+def fake_ffmpeg(spec, args):
+    """ストリーミング時のパイプ変換: 標準入力をそのまま出力し、長さを進捗表示の形式で出す"""
+    size = 0
+    for chunk in iter(lambda: sys.stdin.buffer.read(CHUNK_SIZE), b""):
+        sys.stdout.buffer.write(chunk)
+        size += len(chunk)
+    sys.stdout.buffer.flush()
+    seconds = size / (128000 / 8)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    sys.stderr.write(f"size={size // 1024}kB time={int(h):02d}:{int(m):02d}:{s:05.2f} bitrate=128.0kbits/s\n")
+
+
+def fake_ffprobe(spec, args):
+    _sleep(spec, "ffprobe")
+    path = args[-1]
+    size = os.path.getsize(path)
+    print(json.dumps({"format": {"duration": f"{size / (128000 / 8):.2f}"}}))
+
+
+TOOLS = {"yt-dlp": fake_yt_dlp, "ffmpeg": fake_ffmpeg, "ffprobe": fake_ffprobe}
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in TOOLS:
+        sys.stderr.write(f"usage: fake_tools.py {{{'|'.join(TOOLS)}}} args...\n")
+        return 2
+    TOOLS[argv[0]](load_spec(), argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
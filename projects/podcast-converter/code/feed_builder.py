@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+RSSフィード生成
+----------------------------------------
+チャンネル情報とエピソード一覧から Apple Podcast 形式の feed.xml を
+ストリーミング出力する（XMLGenerator によるエスケープ付き）。
+内容のハッシュを前回と比べ、変わったときだけ書き出し・アップロードできるようにする。
+"""
+
+import email.utils
+import hashlib
+import json
+import os
+from xml.sax.saxutils import XMLGenerator
+
+ITUNES_NS = "http://www.itunes.com/dtds/podcast-1.0.dtd"
+
+
+def format_duration(duration_sec):
+    """秒数を HH:MM:SS に変換する"""
+    duration_sec = int(duration_sec or 0)
+    h, m, s = duration_sec // 3600, (duration_sec % 3600) // 60, duration_sec % 60
+    return f"{h:02}:{m:02}:{s:02}"
+
+
+def make_item(title, url, length, mime_type, pub_date, duration_sec):
+    """RSSの1項目を表す辞書を作る（pub_date は datetime）"""
+    return {
+        "title": title,
+        "url": url,
+        "length": int(length),
+        "type": mime_type,
+        "pubDate": email.utils.format_datetime(pub_date),
+        "duration": format_duration(duration_sec),
+    }
+
+
+def feed_hash(channel, items):
+    """チャンネル情報と項目一覧から内容ハッシュを求める（lastBuildDate は含めない）"""
+    payload = json.dumps({"channel": channel, "items": items}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _text_element(xml, indent, name, text, attrs=None):
+    xml.ignorableWhitespace(indent)
+    xml.startElement(name, attrs or {})
+    if text is not None:
+        xml.characters(str(text))
+    xml.endElement(name)
+
+
+def write_feed(path, channel, items, last_build_date):
+    """feed.xml を一時ファイルに書き出してから置き換える
+
+    channel: {"title", "link", "description", "language", "category"}
+    items: make_item() の戻り値のリスト
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        xml = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+        xml.startDocument()
+        xml.startElement("rss", {"version": "2.0", "xmlns:itunes": ITUNES_NS})
+        xml.ignorableWhitespace("\n  ")
+        xml.startElement("channel", {})
+
+        _text_element(xml, "\n    ", "title", channel["title"])
+        _text_element(xml, "\n    ", "link", channel["link"])
+        _text_element(xml, "\n    ", "description", channel["description"])
+        _text_element(xml, "\n    ", "language", channel.get("language", "ja"))
+        _text_element(xml, "\n    ", "itunes:category", None, {"text": channel.get("category", "News")})
+        _text_element(xml, "\n    ", "lastBuildDate", email.utils.format_datetime(last_build_date))
+
+        for item in items:
+            xml.ignorableWhitespace("\n    ")
+            xml.startElement("item", {})
+            _text_element(xml, "\n      ", "title", item["title"])
+            _text_element(xml, "\n      ", "enclosure", None,
+                          {"url": item["url"], "length": str(item["length"]), "type": item["type"]})
+            _text_element(xml, "\n      ", "guid", item["url"])
+            _text_element(xml, "\n      ", "pubDate", item["pubDate"])
+            _text_element(xml, "\n      ", "itunes:duration", item["duration"])
+            xml.ignorableWhitespace("\n    ")
+            xml.endElement("item")
+
+        xml.ignorableWhitespace("\n  ")
+        xml.endElement("channel")
+        xml.ignorableWhitespace("\n")
+        xml.endElement("rss")
+        xml.ignorableWhitespace("\n")
+        xml.endDocument()
+    os.replace(tmp_path, path)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+複数ノードでのチャンネル分担（リース）
+----------------------------------------
+[Playlists] のチャンネルを複数のホストで分け合うため、チャンネルごとのリース（担当権）を
+R2 のバケット（_leases/）または共有ディレクトリに置く。
+- リースは有効期限付き。持っている間は定期的に延長し、止まったノードのリースは期限が切れたら
+  他のノードが引き継ぐ
+- 書き込みは条件付き（R2: If-None-Match / If-Match、ディレクトリ: ファイルロック中に内容を比較）なので、
+  同じチャンネルを2つのノードが同時に持つことはない
+- 各ノードは生存通知（ハートビート）を書き、生きているノードの間でチャンネルをランデブーハッシュで
+  振り分ける（ノードが増減しても動くチャンネルが少なく、担当が固定されやすい）。
+  止まったノードの生存通知が古くなると、そのチャンネルは残りのノードに振り分けられる
+期限は各ノードの時計で比べるので、NTP などで時刻を合わせておく。
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+NODES_DIR = "_nodes"
+
+
+class LeaseConflict(Exception):
+    """条件付き書き込みで他のノードに先を越された"""
+
+
+class Lease:
+    def __init__(self, name, version, acquired_at, expires_at, previous_owner):
+        self.name = name
+        self.version = version            # R2 は ETag、ディレクトリは内容のハッシュ
+        self.acquired_at = acquired_at
+        self.expires_at = expires_at
+        self.previous_owner = previous_owner  # 直前にこのリースを持っていたノード（なければNone）
+
+
+class LeaseStore:
+    """リースの取得・延長・解放（保存先ごとに _read / _write / heartbeat / live_nodes を実装する）"""
+
+    def __init__(self, node_id, lease_seconds=600, node_timeout=5400):
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.node_timeout = node_timeout
+        self._lock = threading.Lock()
+        self._held = {}  # 名前 -> Lease
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _record(self, acquired_at, expires_at):
+        return {"owner": self.node_id, "acquired_at": acquired_at, "expires_at": expires_at,
+                "pid": os.getpid()}
+
+    def preferred_node(self, name, nodes):
+        """ランデブーハッシュで name を受け持つノードを選ぶ"""
+        return max(nodes, key=lambda node: hashlib.sha1(f"{node}/{name}".encode("utf-8")).hexdigest())
+
+    def assign(self, names):
+        """生きているノードの間で振り分けたとき、このノードが受け持つ名前を返す"""
+        nodes = set(self.live_nodes()) | {self.node_id}
+        return [name for name in names if self.preferred_node(name, nodes) == self.node_id]
+
+    def acquire(self, name):
+        """リースを取る（他のノードが期限内で持っていれば None）"""
+        record, version = self._read(name)
+        now = time.time()
+        if record and record.get("owner") != self.node_id and record.get("expires_at", 0) > now:
+            return None
+        try:
+            version = self._write(name, self._record(now, now + self.lease_seconds), version)
+        except LeaseConflict:
+            return None
+        lease = Lease(name, version, now, now + self.lease_seconds, record.get("owner") if record else None)
+        with self._lock:
+            self._held[name] = lease
+        if record and record.get("owner") != self.node_id:
+            logger.info(f"🤝 リースを引き継ぎました: {name}（前のノード {record.get('owner')}）")
+        return lease
+
+    def holds(self, name):
+        """このノードが期限内のリースを持っているか"""
+        with self._lock:
+            lease = self._held.get(name)
+        return lease is not None and lease.expires_at > time.time()
+
+    def renew_all(self):
+        """持っているリースをすべて延長し、失ったものの名前を返す"""
+        with self._lock:
+            leases = list(self._held.values())
+        lost = []
+        for lease in leases:
+            now = time.time()
+            try:
+                lease.version = self._write(lease.name, self._record(lease.acquired_at, now + self.lease_seconds),
+                                            lease.version)
+                lease.expires_at = now + self.lease_seconds
+            except LeaseConflict:
+                lost.append(lease.name)
+            except Exception as e:
+                # 一時的な失敗は次の延長で取り返す（期限が切れれば他のノードに渡る）
+                logger.warning(f"⚠️ リース延長に失敗: {lease.name} - {e}")
+        with self._lock:
+            for name in lost:
+                self._held.pop(name, None)
+        for name in lost:
+            logger.warning(f"⚠️ リースを失いました: {name}（他のノードが引き継ぎました）")
+        return lost
+
+    def release(self, name):
+        """リースを手放す（持ち主の記録は残し、期限だけ切る）"""
+        with self._lock:
+            lease = self._held.pop(name, None)
+        if lease is None:
+            return
+        try:
+            self._write(name, self._record(lease.acquired_at, 0), lease.version)
+        except LeaseConflict:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ リース解放に失敗: {name} - {e}（期限切れで解放されます）")
+
+    def release_all(self):
+        with self._lock:
+            names = list(self._held)
+        for name in names:
+            self.release(name)
+
+    def start(self):
+        """生存通知を書き、リースの延長と生存通知をバックグラウンドで続ける"""
+        self.heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-renewer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.release_all()
+        # 終了後も node_timeout の間は生存扱いにして、次の実行まで担当チャンネルを保つ
+        try:
+            self.heartbeat()
+        except Exception as e:
+            logger.warning(f"⚠️ 生存通知の書き込みに失敗: {e}")
+
+    def _run(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop.wait(interval):
+            self.renew_all()
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning(f"⚠️ 生存通知の書き込みに失敗: {e}")
+
+    def _heartbeat_record(self):
+        return {"node": self.node_id, "pid": os.getpid(), "updated_at": time.time()}
+
+
+class R2LeaseStore(LeaseStore):
+    """バケットの <prefix><名前>.json にリースを置く（条件付き PUT で取り合う）"""
+
+    def __init__(self, client, bucket, node_id, prefix="_leases/", **kwargs):
+        super().__init__(node_id, **kwargs)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _read(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{name}.json")
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None, None
+            raise
+        return json.loads(response["Body"].read()), response["ETag"]
+
+    def _write(self, name, record, version):
+        from botocore.exceptions import ClientError
+
+        condition = {"IfNoneMatch": "*"} if version is None else {"IfMatch": version}
+        try:
+            response = self.client.put_object(Bucket=self.bucket, Key=f"{self.prefix}{name}.json",
+                                              Body=json.dumps(record).encode("utf-8"),
+                                              ContentType="application/json", **condition)
+        except ClientError as e:
+            # 412: 条件不一致 / 409: 同じキーへの条件付き書き込みが同時に起きた
+            if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict") or \
+                    e.response["ResponseMetadata"].get("HTTPStatusCode") in (409, 412):
+                raise LeaseConflict(name) from e
+            raise
+        return response["ETag"]
+
+    def heartbeat(self):
+        self.client.put_object(Bucket=self.bucket, Key=f"{self.prefix}{NODES_DIR}/{self.node_id}.json",
+                               Body=json.dumps(self._heartbeat_record()).encode("utf-8"),
+                               ContentType="application/json")
+
+    def live_nodes(self):
+        now = datetime.now(timezone.utc)
+        nodes = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{NODES_DIR}/"):
+            for item in page.get('Contents', []):
+                if (now - item['LastModified']).total_seconds() <= self.node_timeout:
+                    nodes.append(os.path.splitext(os.path.basename(item['Key']))[0])
+        return nodes
+
+
+class DirectoryLeaseStore(LeaseStore):
+    """共有ディレクトリの <名前>.json にリースを置く（<名前>.lock のファイルロック中に比較して書き込む）"""
+
+    def __init__(self, directory, node_id, **kwargs):
+        super().__init__(node_id, **kwargs)
+        self.directory = directory
+        os.makedirs(os.path.join(directory, NODES_DIR), exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _read(self, name):
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None, None
+        return json.loads(data), hashlib.sha1(data).hexdigest()
+
+    def _write(self, name, record, version):
+        with open(os.path.join(self.directory, f"{name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._read(name)[1] != version:
+                raise LeaseConflict(name)
+            data = json.dumps(record).encode("utf-8")
+            tmp_path = f"{self._path(name)}.{self.node_id}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(name))
+        return hashlib.sha1(data).hexdigest()
+
+    def heartbeat(self):
+        path = os.path.join(self.directory, NODES_DIR, f"{self.node_id}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._heartbeat_record(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def live_nodes(self):
+        now = time.time()
+        nodes_dir = os.path.join(self.directory, NODES_DIR)
+        return [os.path.splitext(name)[0] for name in os.listdir(nodes_dir)
+                if name.endswith(".json") and now - os.path.getmtime(os.path.join(nodes_dir, name)) <= self.node_timeout]
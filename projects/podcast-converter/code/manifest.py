@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+チャンネルごとのエピソード一覧（マニフェスト）
+----------------------------------------
+R2 の <チャンネル>/manifest.json に、そのチャンネルでR2に置いているエピソード
+（R2のキー・動画ID・タイトル・公開日・サイズ・長さ）をまとめ、ローカルの
+data/<チャンネル>/manifest.json にキャッシュする。
+- RSS生成と期限切れ削除はバケットを一覧せずにマニフェストだけで行う
+- アップロード・削除のたびに差分だけを書き込む。条件付き書き込み（If-Match / If-None-Match）で
+  他の書き込みと重なったことが分かったら、読み直して差分をかけ直す
+- 読み込みは条件付き取得（If-None-Match: キャッシュのMD5 = R2のETag）で、変わっていなければ本文を取得しない。
+  書き込むのがこのノードだけ（trust_cache）なら、キャッシュがあればR2に問い合わせない
+- バケットの一覧から作り直すのは reconcile（--reconcile-manifests）だけ
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ManifestConflict(Exception):
+    """条件付き書き込みの競合（読み直しても解消しなかった）"""
+
+
+def _status(error):
+    return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+
+
+class ManifestStore:
+    """チャンネルごとのマニフェストの読み書き（複数スレッドから使う）
+
+    エピソードは {ファイル名: {"key", "video_id", "title", "upload_date", "size", "duration"}}。
+    共有ストアのエピソードは key が _shared/ のオブジェクトを指す。
+    """
+
+    def __init__(self, client, bucket, cache_dir, retries=5, trust_cache=False):
+        self.client = client  # None ならキャッシュだけを読む（--plan）
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.retries = retries
+        # 他のノードが書き込まない（複数ノードで分担しない）ならキャッシュを最新とみなす
+        # （書き込みは条件付きなので、R2側が変わっていれば競合として読み直す）
+        self.trust_cache = trust_cache
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def key(self, folder):
+        return f"{folder}/{MANIFEST_NAME}"
+
+    def _lock(self, folder):
+        with self._locks_guard:
+            return self._locks.setdefault(folder, threading.Lock())
+
+    def _cache_path(self, folder):
+        return os.path.join(self.cache_dir, folder, MANIFEST_NAME)
+
+    def _read_cache(self, folder):
+        try:
+            with open(self._cache_path(folder), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, folder, body):
+        path = self._cache_path(folder)
+        if body is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(body)
+        os.replace(f"{path}.tmp", path)
+
+    def _etag(self, body):
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    def _current(self, folder):
+        """(本文, ETag) を返す。trust_cache かR2を使わない場合はキャッシュから読み、なければ (None, None)"""
+        if self.trust_cache or self.client is None:
+            cached = self._read_cache(folder)
+            if cached is not None or self.client is None:
+                return cached, self._etag(cached) if cached is not None else None
+        return self._fetch(folder)
+
+    def _fetch(self, folder):
+        """R2から読む（キャッシュと同じなら本文を取らない）。(本文, ETag) を返し、なければ (None, None)"""
+        from botocore.exceptions import ClientError
+
+        cached = self._read_cache(folder)
+        condition = {}
+        if cached is not None:
+            condition["IfNoneMatch"] = self._etag(cached)
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(folder), **condition)
+        except ClientError as e:
+            if _status(e) == 304:
+                return cached, condition["IfNoneMatch"]
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                self._write_cache(folder, None)
+                return None, None
+            raise
+        body = response["Body"].read()
+        self._write_cache(folder, body)
+        return body, response["ETag"]
+
+    def load(self, folder):
+        """エピソードの辞書を返す（マニフェストがまだなければ None）"""
+        body, _ = self._current(folder)
+        if body is None:
+            return None
+        return json.loads(body)["episodes"]
+
+    def _store(self, folder, episodes, etag):
+        body = json.dumps({
+            "version": MANIFEST_VERSION,
+            "channel": folder,
+            "updated_at": int(time.time()),
+            "episodes": dict(sorted(episodes.items())),
+        }, ensure_ascii=False, indent=1).encode("utf-8")
+        condition = {"IfNoneMatch": "*"} if etag is None else {"IfMatch": etag}
+        self.client.put_object(Bucket=self.bucket, Key=self.key(folder), Body=body,
+                               ContentType="application/json; charset=utf-8",
+                               CacheControl="no-cache", **condition)
+        self._write_cache(folder, body)
+
+    def update(self, folder, change):
+        """change(episodes) で書き換えて保存する（競合したら読み直してかけ直す）。書き換え後の辞書を返す"""
+        from botocore.exceptions import ClientError
+
+        with self._lock(folder):
+            for _ in range(self.retries):
+                body, etag = self._current(folder)
+                episodes = json.loads(body)["episodes"] if body is not None else {}
+                if change(episodes) is False:
+                    return episodes
+                try:
+                    self._store(folder, episodes, etag)
+                    return episodes
+                except ClientError as e:
+                    if _status(e) not in (404, 409, 412):
+                        raise
+                    # 他の書き込みが先に入った・キャッシュにあるものが消されていた（キャッシュを捨てて読み直す）
+                    self._write_cache(folder, None)
+            raise ManifestConflict(folder)
+
+    def put(self, folder, entries):
+        """{ファイル名: エピソード} を追加・更新する（内容が同じなら書き込まない）"""
+        def change(episodes):
+            if all(episodes.get(name) == entry for name, entry in entries.items()):
+                return False
+            episodes.update(entries)
+        return self.update(folder, change)
+
+    def remove(self, folder, filenames):
+        def change(episodes):
+            removed = [episodes.pop(name) for name in filenames if name in episodes]
+            if not removed:
+                return False
+        return self.update(folder, change)
+
+    def replace(self, folder, episodes):
+        """一覧から作り直した内容で置き換える"""
+        return self.update(folder, lambda current: (current.clear(), current.update(episodes)))
+
+
+def make_entry(key, video_id, title, upload_date, size, duration):
+    return {
+        "key": key,
+        "video_id": video_id or "",
+        "title": title,
+        "upload_date": str(upload_date),
+        "size": int(size),
+        "duration": int(duration or 0),
+    }
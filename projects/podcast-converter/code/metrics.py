@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+実行の計測（段ごとの所要時間・カウンタ）とレポート出力
+----------------------------------------
+- span(段, チャンネル): 一覧取得・メタデータ取得・ダウンロード・ffprobe・R2アップロードなどの所要時間を記録
+- count(名前, 値, **ラベル): 転送バイト数・エラー分類などのカウンタ
+- 実行ごとに JSON レポートと Prometheus の textfile collector 形式で書き出す
+- ThreadProfiler: 各段のスレッドで cProfile を取り、まとめて .pstats に保存する（--profile）
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import resource
+import threading
+import time
+
+
+def _percentile(sorted_values, ratio):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RunMetrics:
+    """1回の実行（デーモンモードでは1巡）の計測値を集める（複数スレッドから使う）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._spans = {}      # 段 -> [秒, ...]
+            self._channels = {}   # チャンネル -> {段: 秒}
+            self._counters = {}   # (名前, ((ラベル, 値), ...)) -> 値
+
+    @contextlib.contextmanager
+    def span(self, stage, channel=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, channel)
+
+    def add_time(self, stage, seconds, channel=None):
+        with self._lock:
+            self._spans.setdefault(stage, []).append(seconds)
+            if channel:
+                per_channel = self._channels.setdefault(channel, {})
+                per_channel[stage] = per_channel.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        """計測値を JSON にできる辞書で返す"""
+        with self._lock:
+            stages = {}
+            for stage, values in sorted(self._spans.items()):
+                values = sorted(values)
+                stages[stage] = {
+                    "calls": len(values),
+                    "seconds": round(sum(values), 3),
+                    "mean": round(sum(values) / len(values), 3),
+                    "p50": round(_percentile(values, 0.5), 3),
+                    "p95": round(_percentile(values, 0.95), 3),
+                    "max": round(values[-1], 3),
+                }
+            channels = {channel: {stage: round(seconds, 3) for stage, seconds in sorted(per_stage.items())}
+                        for channel, per_stage in sorted(self._channels.items())}
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"stages": stages, "channels": channels, "counters": counters}
+
+
+def peak_rss_mb():
+    """このプロセスの最大常駐メモリ（MB）
+
+    Linux では /proc/self/status の VmHWM を使う（ru_maxrss は exec 前の親プロセスの値を引き継ぐため）。
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def process_started_at():
+    """このプロセスの起動時刻（Unix時刻、インタプリタの起動・import を含めて計るため）
+
+    Linux では /proc/self/stat の起動時刻（システム起動からのクロック数、10ms 単位）から求める。取れなければ None。
+    """
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # 2番目の項目（コマンド名）は空白を含みうるので ")" の後から数える
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - age
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def write_json_report(path, report):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def write_prometheus_textfile(path, report, prefix="podcast_"):
+    """Prometheus node_exporter の textfile collector 形式で書き出す（一時ファイル経由で置き換え）"""
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append(f"# HELP {prefix}{name} {help_text}")
+        lines.append(f"# TYPE {prefix}{name} gauge")
+        for labels, value in samples:
+            lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+
+    stages = report["metrics"]["stages"]
+    metric("run_timestamp_seconds", "Unix time when the last run finished",
+           [({"status": report["status"]}, report["finished_at_unix"])])
+    metric("run_duration_seconds", "Wall time of the last run", [({}, report["duration_seconds"])])
+    metric("peak_rss_megabytes", "Peak resident memory of the converter process", [({}, report["peak_rss_mb"])])
+    metric("startup_seconds", "Seconds from process start to the end of imports and to the first subprocess",
+           [({"phase": phase}, seconds) for phase, seconds in report["startup"].items() if seconds is not None])
+    metric("stage_seconds", "Total time spent in each stage during the last run",
+           [({"stage": stage}, values["seconds"]) for stage, values in stages.items()])
+    metric("stage_calls", "Number of timed operations per stage during the last run",
+           [({"stage": stage}, values["calls"]) for stage, values in stages.items()])
+    metric("stage_max_seconds", "Slowest single operation per stage during the last run",
+           [({"stage": stage}, values["max"]) for stage, values in stages.items()])
+    metric("channel_stage_seconds", "Time spent per channel and stage during the last run",
+           [({"channel": channel, "stage": stage}, seconds)
+            for channel, per_stage in report["metrics"]["channels"].items()
+            for stage, seconds in per_stage.items()])
+    metric("subprocesses", "Subprocesses started during the last run",
+           [({"program": program}, n) for program, n in report["subprocesses"].items()])
+
+    by_name = {}
+    for counter in report["metrics"]["counters"]:
+        by_name.setdefault(counter["name"], []).append((counter["labels"], counter["value"]))
+    for name, samples in sorted(by_name.items()):
+        metric(name, f"Counter {name} for the last run", samples)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+class ThreadProfiler:
+    """各段のタスクを実行するスレッドごとに cProfile を取り、最後にまとめる"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def task(self, stage_name):
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def dump(self, path):
+        """全スレッドの結果をまとめて .pstats に保存し、pstats.Stats を返す（記録なしならNone）"""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        return stats
+
+
+# 実行全体で共有する計測値
+metrics = RunMetrics()
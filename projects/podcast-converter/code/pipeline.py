@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+段階別の並列処理パイプライン
+----------------------------------------
+一覧取得・メタデータ取得・ダウンロード・アップロードなどの各段を
+独立したスレッドプールで動かし、段ごとに同時実行数と待ち行列の上限を持たせる。
+待ち行列が埋まると投入側がブロックするので、前段が後段を追い越しすぎない（背圧）。
+停止要求（stop_event）が出た段は、待ち行列に残ったタスクを実行せずに完了扱いにする。
+task_context を渡すと各タスクをその中で実行する（スレッドごとのプロファイル取得など）。
+スレッド名は stage-<段名>_<番号> なので py-spy などでも段を見分けられる。
+"""
+
+import concurrent.futures
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WorkTracker:
+    """未完了タスク数を数え、0になったら一度だけコールバックを呼ぶ"""
+
+    def __init__(self, on_drained):
+        self._on_drained = on_drained
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._drained = False
+
+    def add(self):
+        with self._lock:
+            self._pending += 1
+
+    def done(self):
+        with self._lock:
+            self._pending -= 1
+            fire = self._pending == 0 and not self._drained
+            if fire:
+                self._drained = True
+        if fire:
+            self._on_drained()
+
+
+class Stage:
+    """同時実行数（workers）と待ち行列（queue_size）の上限を持つ処理段
+
+    queue_size が None の段は投入時にブロックしない（後段から投入される終端の段向け）。
+    """
+
+    def __init__(self, name, workers, queue_size=None, stop_event=None, task_context=None):
+        self.name = name
+        self.workers = workers
+        self._stop_event = stop_event
+        self._task_context = task_context
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"stage-{name}")
+        self._slots = (threading.BoundedSemaphore(workers + queue_size)
+                       if queue_size is not None else None)
+
+    def submit(self, fn, *args, tracker=None):
+        """タスクを投入する（待ち行列が満杯なら空くまで待つ）"""
+        if tracker:
+            tracker.add()
+        if self._slots:
+            self._slots.acquire()
+
+        def run():
+            try:
+                if self._stop_event is not None and self._stop_event.is_set():
+                    return
+                if self._task_context is not None:
+                    with self._task_context(self.name):
+                        fn(*args)
+                else:
+                    fn(*args)
+            except Exception as e:
+                logger.error(f"⚠️ {self.name} 段で予期せぬエラー: {e}", exc_info=True)
+            finally:
+                if self._slots:
+                    self._slots.release()
+                if tracker:
+                    tracker.done()
+
+        return self._executor.submit(run)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -12,20 +12,74 @@ YouTube→ポッドキャスト変換スクリプト（改良版）
 """
 
 import os
-import subprocess
 import json
 import re
 import glob
-from datetime import datetime, timedelta
-import email.utils
-import boto3
-from botocore.client import Config
+from datetime import datetime, timedelta, timezone
 import logging
 import concurrent.futures
 import time
 import configparser
 import sys
 import threading
+import argparse
+import hashlib
+import signal
+import socket
+
+from audio_formats import (
+    AUDIO_MODES,
+    AUDIO_EXTENSIONS,
+    DEFAULT_AUDIO_MODE,
+    audio_ext,
+    download_args,
+    fallback_modes,
+    is_audio_file,
+    is_format_unavailable,
+    mime_type_for,
+)
+from feed_builder import make_item, feed_hash, write_feed
+from leases import DirectoryLeaseStore, R2LeaseStore
+from manifest import ManifestStore, make_entry
+from metrics import (
+    ThreadProfiler,
+    metrics,
+    peak_rss_mb,
+    process_started_at,
+    write_json_report,
+    write_prometheus_textfile,
+)
+from concurrency import AdaptiveLimiter, CircuitOpenError
+from pipeline import Stage, WorkTracker
+from r2_stream import StreamUploadError, stream_audio_to_r2
+from scheduler import ChannelScheduler, read_status, start_status_server, write_status
+from ytdlp_engine import (
+    YtDlpError,
+    SubprocessEngine,
+    create_engine,
+    first_process_at,
+    process_counts,
+    run_process,
+    terminate_active_processes,
+)
+from state_store import (
+    StateStore,
+    DECISION_DOWNLOADED,
+    DECISION_EXISTS,
+    DECISION_TOO_OLD,
+    DECISION_OUT_OF_RANGE,
+    DECISION_FAILED,
+    DECISION_REMOVED,
+    JOURNAL_METADATA,
+    JOURNAL_DOWNLOADING,
+    JOURNAL_DOWNLOADED,
+    JOURNAL_UPLOADED,
+    RUN_INTERRUPTED,
+    RUN_FINISHED,
+)
+
+# モジュールの読み込みが終わった時刻（起動時間の計測用。boto3 などは使うときに読み込む）
+imported_at = time.time()
 
 # スクリプトのディレクトリを取得
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -35,11 +89,15 @@ project_dir = os.path.dirname(script_dir)  # codeの1階層上がプロジェク
 logs_dir = os.path.join(project_dir, "logs")
 # logs ディレクトリがなければ作成
 os.makedirs(logs_dir, exist_ok=True)
+# 実行レポート・プロファイルの保存先
+reports_dir = os.path.join(project_dir, "data", "reports")
 
 # 日付形式の設定（YYYY-MM-DD）
 today = datetime.now().strftime("%Y-%m-%d")
 # 日別のログファイルパスを作成
 log_file = os.path.join(logs_dir, f"podcast_{today}.log")
+# その日の最初の実行か（古いログの掃除は1日1回だけ行う）
+first_log_of_day = not os.path.exists(log_file)
 
 # ロギング設定
 logging.basicConfig(
@@ -54,89 +112,148 @@ logger = logging.getLogger(__name__)
 
 # 古いログファイルのクリーンアップ (100日以上前のログを削除)
 MAX_LOG_DAYS = 100
-try:
-    log_pattern = os.path.join(logs_dir, "podcast_*.log")
-    for log_path in glob.glob(log_pattern):
-        try:
-            # ファイル名から日付を抽出 (podcast_YYYY-MM-DD.log)
-            file_date_str = os.path.basename(log_path).replace("podcast_", "").replace(".log", "")
-            file_date = datetime.strptime(file_date_str, "%Y-%m-%d")
-            # 100日以上前のログファイルを削除
-            if (datetime.now() - file_date).days > MAX_LOG_DAYS:
-                os.remove(log_path)
-                logger.info(f"古いログファイルを削除しました: {log_path}")
-        except Exception as e:
-            logger.error(f"ログファイルの処理中にエラーが発生: {log_path} - {e}")
-except Exception as e:
-    logger.error(f"ログクリーンアップ中にエラーが発生: {e}")
+
+def cleanup_old_logs():
+    try:
+        log_pattern = os.path.join(logs_dir, "podcast_*.log")
+        for log_path in glob.glob(log_pattern):
+            try:
+                # ファイル名から日付を抽出 (podcast_YYYY-MM-DD.log)
+                file_date_str = os.path.basename(log_path).replace("podcast_", "").replace(".log", "")
+                file_date = datetime.strptime(file_date_str, "%Y-%m-%d")
+                # 100日以上前のログファイルを削除
+                if (datetime.now() - file_date).days > MAX_LOG_DAYS:
+                    os.remove(log_path)
+                    logger.info(f"古いログファイルを削除しました: {log_path}")
+            except Exception as e:
+                logger.error(f"ログファイルの処理中にエラーが発生: {log_path} - {e}")
+    except Exception as e:
+        logger.error(f"ログクリーンアップ中にエラーが発生: {e}")
+
+if first_log_of_day:
+    cleanup_old_logs()
+
+# 日付が変わったら日別のログファイルに切り替える（デーモンモード用）
+def switch_daily_log_file():
+    global log_file
+    path = os.path.join(logs_dir, f"podcast_{datetime.now().strftime('%Y-%m-%d')}.log")
+    if path == log_file:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.FileHandler):
+            root.removeHandler(handler)
+            handler.close()
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+    log_file = path
+    cleanup_old_logs()
+
+# エラーメッセージの分類（premiere / private / removed / unavailable / throttled / other）
+def classify_youtube_error(error_msg):
+    """YouTubeのエラーメッセージを分類キーに変換する"""
+    error_msg = error_msg or ""
+    if "Premieres in" in error_msg or "This live event will begin in" in error_msg:
+        return "premiere"
+    elif "Private video" in error_msg:
+        return "private"
+    elif "Video unavailable" in error_msg or "removed by the uploader" in error_msg:
+        return "removed"
+    elif "This video is not available" in error_msg:
+        return "unavailable"
+    elif ("HTTP Error 429" in error_msg or "Too Many Requests" in error_msg
+          or "Sign in to confirm" in error_msg or "rate-limited" in error_msg):
+        return "throttled"
+    else:
+        return "other"
+
+# エラー件数を段・分類ごとに数える（実行レポート用）
+def count_error(stage, error_msg):
+    metrics.count("errors", stage=stage, category=classify_youtube_error(error_msg))
 
 # エラーメッセージの日本語化関数
 def translate_youtube_error(error_msg):
     """YouTubeのエラーメッセージを日本語に変換する"""
-    if "Premieres in" in error_msg:
+    category = classify_youtube_error(error_msg)
+    if category == "premiere":
         days = re.search(r'in (\d+) days', error_msg)
         if days:
             return f"📅 プレミア公開待ち（{days.group(1)}日後）"
         else:
             return f"📅 プレミア公開待ち"
-    elif "Private video" in error_msg:
+    elif category == "private":
         return "🔒 非公開動画です"
-    elif "Video unavailable" in error_msg or "removed by the uploader" in error_msg:
+    elif category == "removed":
         return "❌ 動画が削除されています"
-    elif "This video is not available" in error_msg:
+    elif category == "unavailable":
         return "⛔ この動画は利用できません"
+    elif category == "throttled":
+        return f"🐢 アクセス制限（レート制限）: {error_msg.strip()}"
     else:
         return f"⚠️ {error_msg}"  # その他のエラーはそのまま表示
 
-# yt-dlpの同時実行数を制限するためのセマフォ
-yt_dlp_semaphore = threading.Semaphore(2)  # 最大2つのyt-dlpプロセスを同時実行
+# ダウンロード途中のファイルを置くディレクトリ（data/<フォルダ名>/ の下）
+PARTIAL_DIR = ".partial"
+
+# 共有ストア：複数チャンネルに同じ動画があっても音声は動画IDごとに1つだけ保存する
+# （ローカルは data/_shared/<動画ID>.<拡張子>、R2は _shared/<動画ID>.<拡張子>）
+SHARED_DIR = "_shared"
+shared_dir = os.path.join(project_dir, "data", SHARED_DIR)
+
+# ネガティブキャッシュの分類ごとの既定の有効期間（時間）
+NEGATIVE_CACHE_HOURS = {
+    "premiere": 6,        # 公開予定時刻がわからない場合
+    "private": 24,
+    "unavailable": 24,
+    "removed": 24 * 90,   # 削除済みは長期間スキップ
+}
+
+# プレミア公開・ライブ開始までの待ち時間（秒）をエラーメッセージから求める（不明ならNone）
+def premiere_wait_seconds(error_msg):
+    match = re.search(r'(?:Premieres|begin) in (\d+) (day|hour|minute)s?', error_msg or "")
+    if not match:
+        return None
+    unit = {"day": 86400, "hour": 3600, "minute": 60}[match.group(2)]
+    return int(match.group(1)) * unit
+
+# yt-dlpの同時実行数を制御するリミッター（main で設定値から作り直す）
+yt_dlp_limiter = AdaptiveLimiter(1, 2)  # 最大2つのyt-dlpプロセスを同時実行
+
+# yt-dlpの実行エンジン（main で設定に応じて差し替える）
+yt_dlp_engine = SubprocessEngine()
+
+# 読み込んだ設定（config.ini の更新時刻・サイズが変わるまで使い回す）
+_config_cache = {}
 
 def load_config():
+    config_path = os.path.join(script_dir, 'config.ini')
     try:
-        # スクリプトファイルのディレクトリパスを取得
-        print(f"スクリプトディレクトリ: {script_dir}")
-        config_path = os.path.join(script_dir, 'config.ini')
-        print(f"設定ファイルパス: {config_path}")
-        
-        # ファイルの存在確認
-        file_exists = os.path.exists(config_path)
-        print(f"設定ファイルは存在する: {file_exists}")
-        
-        if file_exists:
-            # ファイルが読み取り可能か確認
-            try:
-                with open(config_path, 'r', encoding='utf-8') as test_file:
-                    first_line = test_file.readline()
-                print(f"ファイル読み取りテスト成功: 最初の行 = {first_line}")
-            except Exception as read_error:
-                print(f"ファイル読み取りテスト失敗: {str(read_error)}")
-            
-            # 設定を読み込む
-            config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
-            config.read(config_path, encoding='utf-8')
-            
-            # 正しく読み込めたか確認
-            if len(config.sections()) > 0:
-                print(f"設定セクション: {config.sections()}")
-            else:
-                print("警告: 設定ファイルからセクションを読み込めませんでした")
-            
-            return config
-        else:
-            # 設定ファイルがない場合
-            error_msg = f"エラー: 設定ファイル '{config_path}' が見つかりません。"
-            print(error_msg)  # 標準出力にも出力
-            logger.error(error_msg)
-            
-            # 現在のディレクトリの内容を表示
-            print(f"現在のディレクトリ内容: {os.listdir(script_dir)}")
-            
-            # 親ディレクトリも確認
-            parent_dir = os.path.dirname(script_dir)
-            print(f"親ディレクトリ: {parent_dir}")
-            print(f"親ディレクトリ内容: {os.listdir(parent_dir)}")
-            
-            sys.exit(1)
+        stat = os.stat(config_path)
+    except FileNotFoundError:
+        # 設定ファイルがない場合（探した場所がわかるように表示する）
+        error_msg = f"エラー: 設定ファイル '{config_path}' が見つかりません。"
+        print(error_msg)  # 標準出力にも出力
+        logger.error(error_msg)
+
+        # 現在のディレクトリの内容を表示
+        print(f"現在のディレクトリ内容: {os.listdir(script_dir)}")
+
+        # 親ディレクトリも確認
+        parent_dir = os.path.dirname(script_dir)
+        print(f"親ディレクトリ: {parent_dir}")
+        print(f"親ディレクトリ内容: {os.listdir(parent_dir)}")
+
+        sys.exit(1)
+
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _config_cache.get("key") == key:
+        return _config_cache["config"]
+    try:
+        # 設定を読み込む
+        config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config.read_file(f)
     except Exception as e:
         print(f"設定読み込み中に予期せぬエラー: {str(e)}")
         print(f"エラータイプ: {type(e).__name__}")
@@ -144,8 +261,20 @@ def load_config():
         traceback.print_exc()
         sys.exit(1)
 
+    # 正しく読み込めたか確認
+    if not config.sections():
+        print(f"警告: 設定ファイルからセクションを読み込めませんでした: {config_path}")
+    _config_cache.update(key=key, config=config)
+    return config
+
 # R2クライアント初期化
 def init_r2_client(config):
+    import boto3
+    from botocore.client import Config
+
+    settings = config['Settings']
+    # 同時アップロード数 × パート並列数ぶんの接続を確保する
+    pool_size = max(10, int(settings.get('upload_workers', '2')) * int(settings.get('r2_part_concurrency', '4')) + 2)
     session = boto3.session.Session()
     client = session.client(
         's3',
@@ -153,174 +282,677 @@ def init_r2_client(config):
         endpoint_url=config['R2']['endpoint'],
         aws_access_key_id=config['R2']['access_key'],
         aws_secret_access_key=config['R2']['secret_key'],
-        config=Config(signature_version='s3v4')
+        config=Config(
+            signature_version='s3v4',
+            # 失敗したリクエスト（マルチパートの各パートを含む）の再試行回数
+            retries={'max_attempts': int(settings.get('r2_max_attempts', '5')), 'mode': 'standard'},
+            max_pool_connections=pool_size,
+        )
     )
     return client
 
-# R2へアップロード
-def upload_to_r2(client, local_path, remote_path, bucket):
+# 最初に使うときに作るオブジェクト（R2クライアントなど、boto3 の読み込みを実際にR2へアクセスするまで遅らせる）
+class LazyObject:
+    """属性を参照したときに factory() で本体を作り、以降はその属性を返す（複数スレッドから使う）
+
+    作成にかかった時間は段 stage として計測する。
+    """
+
+    def __init__(self, factory, stage):
+        self._factory = factory
+        self._stage = stage
+        self._target = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._target is not None
+
+    def get(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    with metrics.span(self._stage):
+                        self._target = self._factory()
+                target = self._target
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+# R2クライアントを最初にR2へアクセスするときに作る
+def lazy_r2_client(config):
+    return LazyObject(lambda: init_r2_client(config), "r2_client")
+
+# R2アップロードのマルチパート設定（main で設定値から作り直す。TransferConfig は最初のアップロードで作る）
+r2_transfer_config = None
+
+def create_transfer_config(config):
+    return LazyObject(lambda: build_transfer_config(config), "r2_transfer_config")
+
+def build_transfer_config(config):
+    from boto3.s3.transfer import TransferConfig
+
+    settings = config['Settings']
+    chunk_size = int(settings.get('r2_multipart_chunk_mb', '16')) * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=int(settings.get('r2_part_concurrency', '4')),
+    )
+
+# ローカルファイルのETag（R2と同じ計算方法）とMD5を求める
+def compute_local_etag(local_path, transfer_config):
+    whole = hashlib.md5()
+    part_digests = []
+    with open(local_path, 'rb') as f:
+        while True:
+            chunk = f.read(transfer_config.multipart_chunksize)
+            if not chunk:
+                break
+            whole.update(chunk)
+            part_digests.append(hashlib.md5(chunk).digest())
+
+    size = os.path.getsize(local_path)
+    if size < transfer_config.multipart_threshold:
+        etag = whole.hexdigest()
+    else:
+        etag = f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+    return etag, whole.hexdigest()
+
+# R2に同一内容のオブジェクトがすでにあるか（サイズとETag、またはアップロード時に記録したMD5で判定）
+def is_same_on_r2(client, bucket, remote_path, size, etag, md5_hex):
     try:
-        with open(local_path, 'rb') as f:
-            client.upload_fileobj(f, bucket, remote_path, ExtraArgs={'ACL': 'public-read'})
-        return True
-    except Exception as e:
-        logger.error(f"R2アップロード失敗: {e}")
+        head = client.head_object(Bucket=bucket, Key=remote_path)
+    except Exception:
         return False
+    if head.get('ContentLength') != size:
+        return False
+    return (head.get('ETag', '').strip('"') == etag
+            or head.get('Metadata', {}).get('md5') == md5_hex)
 
-# R2からファイル削除
-def delete_from_r2(client, remote_path, bucket):
+# R2へアップロード（同一内容がすでにあればスキップ）
+def upload_to_r2(client, local_path, remote_path, bucket, extra_args=None):
     try:
-        client.delete_object(Bucket=bucket, Key=remote_path)
+        size = os.path.getsize(local_path)
+        etag, md5_hex = compute_local_etag(local_path, r2_transfer_config)
+        if is_same_on_r2(client, bucket, remote_path, size, etag, md5_hex):
+            logger.info(f"⏭️ R2に同一ファイルあり（アップロード省略）: {remote_path}")
+            metrics.count("uploads_skipped")
+            return True
+
+        args = {'ACL': 'public-read', 'Metadata': {'md5': md5_hex}}
+        args.update(extra_args or {})
+        start = time.perf_counter()
+        with metrics.span("r2_upload", remote_path.partition("/")[0]):
+            with open(local_path, 'rb') as f:
+                client.upload_fileobj(f, bucket, remote_path, ExtraArgs=args, Config=r2_transfer_config.get())
+        elapsed = time.perf_counter() - start
+        metrics.count("bytes", size, kind="uploaded")
+        speed = size / 1024 / 1024 / elapsed if elapsed > 0 else 0
+        logger.info(f"📊 アップロード完了: {remote_path}（{size / 1024 / 1024:.1f}MB, {elapsed:.1f}秒, {speed:.2f}MB/s）")
         return True
     except Exception as e:
-        logger.error(f"R2削除失敗: {e}")
+        logger.error(f"R2アップロード失敗: {e}")
+        metrics.count("errors", stage="r2_upload", category="r2")
         return False
 
-# R2内のファイル一覧取得
-def list_r2_files(client, prefix, bucket):
+# R2からまとめて削除（delete_objects で最大1000件ずつ）。削除できたキーのリストを返す
+def delete_many_from_r2(client, remote_paths, bucket):
+    remote_paths = list(remote_paths)
+    deleted = []
+    for i in range(0, len(remote_paths), 1000):
+        batch = remote_paths[i:i + 1000]
+        try:
+            response = client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            errors = response.get('Errors', [])
+            for error in errors:
+                logger.error(f"R2削除失敗: {error.get('Key')} - {error.get('Message')}")
+            failed = {error.get('Key') for error in errors}
+            deleted += [key for key in batch if key not in failed]
+        except Exception as e:
+            logger.error(f"R2一括削除失敗（{len(batch)} 件）: {e}")
+    return deleted
+
+# R2内のオブジェクトをページ単位で順に返す（1000件を超えても全件たどる）
+def iter_r2_objects(client, prefix, bucket):
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            yield item
+
+# ファイル名の「MM-DD：」から日付を求める（年は現在から推定）
+def filename_date(filename, now):
+    mmdd = filename.split("：")[0]
+    file_date = datetime.strptime(mmdd, "%m-%d").replace(year=now.year)
+
+    # 年をまたいだ場合（例：現在1月で、ファイルが12月の場合）
+    if file_date > now and mmdd.startswith("12") and now.month < 2:
+        file_date = file_date.replace(year=now.year - 1)
+    return file_date
+
+# チャンネルごとの設定値を取得（[channel:<フォルダ名>] → [Settings] → 既定値 の順に探す）
+def channel_setting(config, folder_name, key, fallback=None):
+    section = f"channel:{folder_name}"
+    if config.has_section(section) and config.has_option(section, key):
+        return config.get(section, key)
+    return config['Settings'].get(key, fallback)
+
+# チャンネルごとの真偽値の設定（true / false, yes / no, on / off, 1 / 0）
+def channel_flag(config, folder_name, key, fallback=False):
+    value = channel_setting(config, folder_name, key)
+    if value is None:
+        return fallback
+    return configparser.ConfigParser.BOOLEAN_STATES.get(value.strip().lower(), fallback)
+
+# 設定から yt-dlp 同時実行数のリミッターを作る
+def create_limiter(config):
+    settings = config['Settings']
+    return AdaptiveLimiter(
+        int(settings.get('min_yt_dlp_processes', '1')),
+        int(settings.get('max_yt_dlp_processes', '2')),
+        adaptive=settings.getboolean('adaptive_concurrency', fallback=True),
+        backoff_base=float(settings.get('throttle_backoff_seconds', '30')),
+        backoff_max=float(settings.get('throttle_backoff_max_seconds', '900')),
+        breaker_threshold=int(settings.get('breaker_failures', '3')),
+        breaker_cooldown=float(settings.get('breaker_cooldown_seconds', '1800')),
+    )
+
+# 状態ストア（data/state.db）を開く（snapshot なら書き込みをメモリ上の複製だけに行う）
+def open_state_store(snapshot=False):
+    data_dir = os.path.join(project_dir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    return StateStore(os.path.join(data_dir, "state.db"), snapshot=snapshot)
+
+# 動画メタデータ取得（キャッシュにあれば yt-dlp -J を呼ばない）
+def get_video_metadata(video_id, url, state_store, cache_days, prefetched=None):
+    cached = state_store.get_video(video_id, cache_days)
+    if cached:
+        return cached["title"], cached["upload_date"], cached["duration"]
+
+    # まとめて先読みした結果があればそれを使う
+    data = (prefetched or {}).get(url)
+    if isinstance(data, YtDlpError):
+        raise data
+    if data is None:
+        with metrics.span("metadata"):
+            data = yt_dlp_engine.fetch_metadata(url)
+
+    title = data.get("title")
+    upload_date = data.get("upload_date")
+    duration = data.get("duration")
+
+    # 配信中のライブなどは長さが未確定なので、揃っている場合のみ保存する
+    if all([title, upload_date, duration]):
+        state_store.put_video(video_id, title, upload_date, duration)
+    return title, upload_date, duration
+
+# ffprobeで音声ファイルの長さ（秒）を取得（失敗時はNone）
+def probe_duration(filepath, config):
     try:
-        response = client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        if 'Contents' in response:
-            return [item['Key'] for item in response['Contents']]
-        return []
+        with metrics.span("ffprobe"):
+            returncode, stdout, stderr = run_process([
+                os.path.join(config['Paths']['ffmpeg_path'], "ffprobe"),
+                "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "json",
+                filepath
+            ])
+        if returncode != 0:
+            raise RuntimeError(stderr.strip() or f"終了コード {returncode}")
+
+        probe_data = json.loads(stdout)
+        return int(float(probe_data['format']['duration']))
     except Exception as e:
-        logger.error(f"R2ファイル一覧取得失敗: {e}")
-        return []
+        metrics.count("errors", stage="ffprobe", category="other")
+        logger.warning(f"⚠️ ffprobe失敗: {os.path.basename(filepath)} - {e}")
+        return None
+
+# 複数ファイルをバッチ単位で並列にffprobeし、長さインデックスに登録する
+def probe_and_index(folder_name, output_dir, filenames, config, state_store):
+    workers = int(config['Settings'].get('ffprobe_workers', '4'))
+    batch_size = int(config['Settings'].get('ffprobe_batch_size', '16'))
+    results = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(filenames), batch_size):
+            batch = filenames[i:i + batch_size]
+            futures = {
+                executor.submit(probe_duration, os.path.join(output_dir, name), config): name
+                for name in batch
+            }
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                duration = future.result()
+                results[name] = duration
+                if duration is None:
+                    continue
+                try:
+                    st = os.stat(os.path.join(output_dir, name))
+                    state_store.put_duration(folder_name, name, st.st_size, st.st_mtime_ns, duration)
+                except OSError:
+                    pass
+    return results
 
-# 番組処理関数
-def process_program(args):
-    folder_name, playlist_url, config, r2_client = args
+# 出力ディレクトリ内のMP3の長さを取得（インデックス優先、古いものだけ再計測）
+# probe=False なら ffprobe せず、古いものもインデックスの値（なければ推定値）を使う
+def load_durations(output_dir, folder_name, config, state_store, probe=True):
+    index = state_store.get_durations(folder_name)
+    durations = {}
+    stale = []
+
+    for filename in os.listdir(output_dir):
+        if not is_audio_file(filename):
+            continue
+        st = os.stat(os.path.join(output_dir, filename))
+        row = index.get(filename)
+        if row and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            durations[filename] = row["duration"]
+        else:
+            stale.append(filename)
 
-    # データディレクトリ内のチャンネルディレクトリを指定
+    # ローカルから消えたファイルはインデックスからも削除
+    missing = [name for name in index if name not in durations and name not in stale]
+    if missing:
+        state_store.delete_durations(folder_name, missing)
+
+    if stale and not probe:
+        for name in stale:
+            durations[name] = index[name]["duration"] if name in index else 3600
+    elif stale:
+        logger.info(f"⏱️ 長さを計測: {len(stale)} 件（インデックス済み {len(durations)} 件）")
+        for name, duration in probe_and_index(folder_name, output_dir, stale, config, state_store).items():
+            # 取得できない場合は推定値として1時間を設定（インデックスには登録しない）
+            durations[name] = duration if duration is not None else 3600
+
+    return durations
+
+# 長さインデックスの検証・再構築（全チャンネルのMP3をffprobeし直す）
+def verify_duration_index(config, state_store, rebuild=False):
     data_dir = os.path.join(project_dir, "data")
-    output_dir = os.path.join(data_dir, folder_name)
-    os.makedirs(output_dir, exist_ok=True)
+    if rebuild:
+        cleared = state_store.clear_durations()
+        logger.info(f"🧹 長さインデックスを再構築します（{cleared} 件削除）")
+
+    mismatched = 0
+    for folder_name in config['Playlists']:
+        output_dir = os.path.join(data_dir, folder_name)
+        if not os.path.isdir(output_dir):
+            continue
+        index = state_store.get_durations(folder_name)
+        filenames = [f for f in os.listdir(output_dir) if is_audio_file(f)]
+        orphans = [name for name in index if name not in filenames]
+        if orphans:
+            state_store.delete_durations(folder_name, orphans)
+
+        probed = probe_and_index(folder_name, output_dir, filenames, config, state_store)
+        for name, duration in probed.items():
+            row = index.get(name)
+            if row and duration is not None and abs(row["duration"] - duration) > 2:
+                mismatched += 1
+                logger.warning(f"⚠️ 長さ不一致: {folder_name}/{name} インデックス={row['duration']}秒 実測={duration}秒")
+        failed = sum(1 for d in probed.values() if d is None)
+        logger.info(f"✅ 長さインデックス検証: {folder_name}（{len(filenames)} 件, 孤立 {len(orphans)} 件, 失敗 {failed} 件）")
+
+    logger.info(f"🎉 長さインデックス検証完了（不一致 {mismatched} 件）")
+    return mismatched
+
+# 新しい順に並ぶチャンネルタブ（/videos, /streams）かどうか
+def is_newest_first(playlist_url):
+    return re.search(r'/(videos|streams)/?$', playlist_url) is not None
+
+# --flat-playlist の項目から公開日（YYYYMMDD）を取り出す（なければNone）
+def flat_entry_date(entry):
+    if entry.get("upload_date"):
+        return str(entry["upload_date"])
+    timestamp = entry.get("timestamp") or entry.get("release_timestamp")
+    if timestamp:
+        return datetime.fromtimestamp(timestamp).strftime('%Y%m%d')
+    return None
+
+# パイプライン全体で共有する実行コンテキスト
+class RunContext:
+    """設定・クライアント・各処理段をまとめて各段の処理関数に渡す"""
+
+    def __init__(self, config, r2_client, state_store, run_id=None, resumed=False, stopping=None,
+                 task_context=None, leases=None, plan=None):
+        self.config = config
+        self.r2_client = r2_client
+        self.state_store = state_store
+        # 複数ノードでチャンネルを分担するときのリース（分担しなければNone）
+        self.leases = leases
+        # チャンネルごとのエピソード一覧（R2の <チャンネル>/manifest.json と data/<チャンネル>/ のキャッシュ）
+        # 分担しなければマニフェストを書くのはこのノードだけなので、キャッシュがあればR2に問い合わせない
+        self.manifests = ManifestStore(r2_client, config['R2']['bucket'], os.path.join(project_dir, "data"),
+                                       trust_cache=leases is None)
+        # --plan のときは実行せずに予定を集める（r2_client は None）
+        self.plan = plan
+        # 作業ジャーナルの実行ID（resumed なら中断した実行の続き）
+        self.run_id = run_id
+        self.resumed = resumed
+        # SIGINT / SIGTERM を受けたら立てる（新しいタスクを始めない）
+        self.stopping = stopping or threading.Event()
+        # --profile 時は各段のタスクをスレッドごとの cProfile で包む
+        self.task_context = task_context
+        # 共有ストアの同じ動画・オブジェクトを複数チャンネルから同時に取得・送信しないためのロック
+        self._shared_locks = {}
+        self._shared_locks_guard = threading.Lock()
+
+        settings = config['Settings']
+        channel_workers = int(settings.get('max_workers', '3'))
+        queue_size = int(settings.get('stage_queue_size', '8'))
+        # 各段の同時実行数（未設定なら従来の max_workers / max_yt_dlp_processes に合わせる）
+        self.listing = Stage("listing", int(settings.get('listing_workers', str(channel_workers))), queue_size,
+                             stop_event=self.stopping, task_context=task_context)
+        self.metadata = Stage("metadata", int(settings.get('metadata_workers', str(channel_workers))), queue_size,
+                              stop_event=self.stopping, task_context=task_context)
+        self.download = Stage("download", int(settings.get('max_yt_dlp_processes', '2')), queue_size,
+                              stop_event=self.stopping, task_context=task_context)
+        self.upload = Stage("upload", int(settings.get('upload_workers', '2')), queue_size,
+                            stop_event=self.stopping, task_context=task_context)
+        # 期限切れ削除・RSS生成は後段から投入されるのでブロックさせない
+        # （停止時も番組の完了通知が必要なので停止要求では止めない）
+        self.finalize = Stage("finalize", int(settings.get('finalize_workers', '2')), task_context=task_context)
+
+    def shared_lock(self, name):
+        with self._shared_locks_guard:
+            return self._shared_locks.setdefault(name, threading.Lock())
+
+    def shutdown(self):
+        for stage in (self.listing, self.metadata, self.download, self.upload, self.finalize):
+            stage.shutdown()
+
+# --plan で集める、実行したら行う処理
+class RunPlan:
+    """ダウンロード・再送・R2の期限切れ削除・フィード更新の予定（複数スレッドから使う）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.downloads = []  # (チャンネル, 動画)
+        self.uploads = []    # (チャンネル, 動画) ダウンロード済みで未アップロードのもの
+        self.expired = []    # (チャンネル, R2のキー)
+        self.feeds = []      # (チャンネル, 理由)
+
+    def add(self, kind, folder_name, item):
+        with self._lock:
+            getattr(self, kind).append((folder_name, item))
+
+    def count(self, kind, folder_name):
+        with self._lock:
+            return sum(1 for name, _ in getattr(self, kind) if name == folder_name)
+
+# パイプライン内の1番組（チャンネル）の処理状態
+class ProgramJob:
+    """番組ごとの走査結果・判定結果を保持し、全タスク完了で後処理を起動する"""
+
+    def __init__(self, ctx, folder_name, playlist_url):
+        self.folder_name = folder_name
+        self.playlist_url = playlist_url
+        self.display_name = ctx.config['Channels'].get(folder_name, folder_name)
+        self.output_dir = os.path.join(project_dir, "data", folder_name)
+        self.incremental = (ctx.config['Settings'].getboolean('incremental_scan', fallback=True)
+                            and is_newest_first(playlist_url))
+        self.audio_mode = channel_setting(ctx.config, folder_name, 'audio_mode', DEFAULT_AUDIO_MODE)
+        if self.audio_mode not in AUDIO_MODES:
+            logger.warning(f"⚠️ 不明な audio_mode: {self.audio_mode}（{folder_name}）- {DEFAULT_AUDIO_MODE} を使用します")
+            self.audio_mode = DEFAULT_AUDIO_MODE
+        # ストリーミングでR2へ直接アップロードするか、その際ローカルにも残すか
+        self.stream_upload = channel_flag(ctx.config, folder_name, 'stream_upload')
+        self.keep_local = channel_flag(ctx.config, folder_name, 'keep_local')
+        # 音声を動画IDごとの共有ストアに置き、他のチャンネルと同じ動画を重複して取得しないか
+        self.shared = channel_flag(ctx.config, folder_name, 'shared_store')
+        self.video_ids = []    # 処理対象の動画ID（新しい順）
+        self.decisions = {}    # video_id -> (判定結果, 公開日)
+        self.durations = {}    # ファイル名 -> 長さ（秒）
+        self.downloaded = 0
+        self.failed = False    # 一覧取得に失敗した番組は後処理を行わない
+        self.lock = threading.Lock()
+        # 番組の全タスク（一覧・メタデータ・ダウンロード・アップロード）が終わったら後処理へ
+        self.tracker = WorkTracker(lambda: ctx.finalize.submit(finalize_program, ctx, self))
+        self.result = concurrent.futures.Future()
+
+    def decide(self, video_id, decision, upload_date):
+        with self.lock:
+            self.decisions[video_id] = (decision, upload_date)
+
+# 一覧取得段：プレイリストを取得し、処理対象の動画を決めてメタデータ段へ渡す
+def list_program(ctx, job):
+    config = ctx.config
+    folder_name = job.folder_name
+    os.makedirs(job.output_dir, exist_ok=True)
 
-    r2_bucket = config['R2']['bucket']
-    min_duration = int(config['Settings']['min_duration'])
-    max_duration = int(config['Settings']['max_duration'])
-    
-    # ローカルファイルとR2ファイルの保存期間を別々に取得
-    local_expire_days = int(config['Settings'].get('local_expire_days', '10'))
-    r2_expire_days = int(config['Settings'].get('r2_expire_days', '28'))
-    
     max_items = config['Settings'].get('max_items', '15')
     look_back_days = int(config['Settings'].get('look_back_days', '4'))
 
-    # 番組名を設定から取得
-    display_name = config['Channels'].get(folder_name, folder_name)
+    logger.info(f"🎙️ 番組処理開始: {folder_name} ({job.display_name})")
+
+    # マニフェストのないチャンネル（以前の版から移行）は、アップロードで追記する前にR2の一覧から作る
+    if ctx.plan is None:
+        try:
+            channel_manifest(ctx, folder_name)
+        except Exception as e:
+            logger.error(f"⚠️ マニフェスト読み込み失敗: {folder_name} - {e}")
 
-    logger.info(f"🎙️ 番組処理開始: {folder_name} ({display_name})")
+    # 中断した実行の再開：一覧取得済みならジャーナルの一覧をそのまま使う
+    if ctx.resumed:
+        journal = ctx.state_store.get_journal(folder_name, run_id=ctx.run_id)
+        if journal:
+            job.video_ids = list(journal)
+            logger.info(f"♻️ ジャーナルから再開: {len(job.video_ids)} 件（{folder_name}）")
+            job.durations = load_durations(job.output_dir, folder_name, config, ctx.state_store,
+                                           probe=ctx.plan is None)
+            ctx.metadata.submit(evaluate_program_videos, ctx, job, tracker=job.tracker)
+            return
 
-    threshold_date = int((datetime.today() - timedelta(days=look_back_days)).strftime('%Y%m%d'))
+    # 差分走査（新しい順のチャンネルタブのみ）：一覧の日付で打ち切り、前回の最新動画で停止
+    # 一覧の日付は「N日前」からの概算なので1日の余裕を持たせる
+    scan_cutoff_date = int((datetime.today() - timedelta(days=look_back_days + 1)).strftime('%Y%m%d'))
+    high_water_id, high_water_date = (ctx.state_store.get_high_water(folder_name)
+                                      if job.incremental else (None, None))
 
     # 動画リスト取得
     try:
-        result = subprocess.run([
-            "yt-dlp", "--flat-playlist", "-J",
-            "--playlist-items", f"1-{max_items}",
-            playlist_url
-        ], capture_output=True, text=True, check=True)
-
-        playlist = json.loads(result.stdout)
+        list_args = ["--flat-playlist", "--playlist-items", f"1-{max_items}"]
+        if job.incremental:
+            list_args += ["--extractor-args", "youtubetab:approximate_date"]
+        with metrics.span("listing", folder_name):
+            playlist = yt_dlp_engine.list_playlist(list_args, job.playlist_url)
         entries = playlist.get("entries", [])
-        logger.info(f"🎞️ 対象動画数: {len(entries)}")
-    except subprocess.CalledProcessError as e:
+        logger.info(f"🎞️ 対象動画数: {len(entries)}（{folder_name}）")
+    except YtDlpError as e:
+        if ctx.stopping.is_set():
+            job.failed = True
+            return
+        count_error("listing", e.stderr)
+        if classify_youtube_error(e.stderr) == "throttled":
+            yt_dlp_limiter.report_throttle(folder_name)
         logger.error(f"❌ 動画ID取得失敗: {folder_name} - {translate_youtube_error(e.stderr)}")
+        job.failed = True
         return
     except json.JSONDecodeError:
         logger.error(f"❌ 動画リストJSONパース失敗: {folder_name}")
+        job.failed = True
         return
     except Exception as e:
         logger.error(f"❌ 予期せぬエラー: {folder_name} - {e}")
+        job.failed = True
         return
 
-    downloaded = 0
-    durations = {}
-
-    # 既存MP3のメタデータ読み込み（すでにダウンロード済みの場合に使用）
-    for filename in os.listdir(output_dir):
-        if filename.endswith(".mp3"):
-            filepath = os.path.join(output_dir, filename)
-            try:
-                # ffprobeで動画の長さを取得
-                probe_result = subprocess.run([
-                    os.path.join(config['Paths']['ffmpeg_path'], "ffprobe"),
-                    "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "json",
-                    filepath
-                ], capture_output=True, text=True, check=True)
-
-                probe_data = json.loads(probe_result.stdout)
-                duration = float(probe_data['format']['duration'])
-                durations[filename] = int(duration)
-            except:
-                # 取得できない場合は推定値として1時間を設定
-                durations[filename] = 3600
-
-    # 各動画を処理
+    # 処理対象の動画を決定（差分走査では一覧の日付・ハイウォーターマークで打ち切る）
     for entry in entries:
         if not entry or not entry.get("id"):
             continue
         video_id = entry["id"]
+
+        if job.incremental:
+            if video_id == high_water_id:
+                logger.info(f"⏹️ 前回走査済みの動画に到達: {video_id}（{high_water_date}）")
+                break
+            entry_date = flat_entry_date(entry)
+            if entry_date and int(entry_date) < scan_cutoff_date:
+                logger.info(f"⏹️ 対象期間外に到達したため走査終了: {entry_date} < {scan_cutoff_date}")
+                break
+        job.video_ids.append(video_id)
+
+    # 前回までにダウンロードしたがアップロードできていない動画も対象に加える
+    # （差分走査では一覧に出てこないことがある）
+    pending_uploads = [video_id for video_id, row in ctx.state_store.get_journal(folder_name).items()
+                       if row["state"] == JOURNAL_DOWNLOADED and video_id not in job.video_ids]
+    job.video_ids += pending_uploads
+    if ctx.plan is None:
+        ctx.state_store.journal_listing(ctx.run_id, folder_name, job.video_ids)
+
+    # 既存MP3の長さを読み込み（インデックスが古い・未登録のファイルだけffprobeする）
+    job.durations = load_durations(job.output_dir, folder_name, config, ctx.state_store,
+                                   probe=ctx.plan is None)
+
+    if job.video_ids:
+        ctx.metadata.submit(evaluate_program_videos, ctx, job, tracker=job.tracker)
+
+# メタデータ段：各動画のメタデータを確認し、ダウンロードが必要なものをダウンロード段へ渡す
+def evaluate_program_videos(ctx, job):
+    config = ctx.config
+    state_store = ctx.state_store
+    min_duration = int(config['Settings']['min_duration'])
+    max_duration = int(config['Settings']['max_duration'])
+    look_back_days = int(config['Settings'].get('look_back_days', '4'))
+    metadata_cache_days = int(config['Settings'].get('metadata_cache_days', '30'))
+    threshold_date = int((datetime.today() - timedelta(days=look_back_days)).strftime('%Y%m%d'))
+
+    # ネガティブキャッシュにある動画（非公開・削除など）は yt-dlp を呼ばずにスキップ
+    video_ids = []
+    for video_id in job.video_ids:
+        negative = state_store.get_negative(video_id)
+        if negative is None:
+            video_ids.append(video_id)
+            continue
+        expires = datetime.fromtimestamp(negative["expires_at"]).strftime('%Y-%m-%d %H:%M')
+        logger.info(f"🚫 スキップ（{translate_youtube_error(negative['reason'])}, {expires} まで）: {video_id}")
+        if negative["category"] == "removed":
+            job.decide(video_id, DECISION_REMOVED, None)
+
+    # 中断前にメタデータの確認まで済んでいた動画は、ジャーナルの内容で続きから処理する
+    journal = state_store.get_journal(job.folder_name)
+
+    # キャッシュにない動画のメタデータをまとめて取得
+    uncached = [f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids
+                if not (journal.get(video_id) or {}).get("data")
+                and state_store.get_video(video_id, metadata_cache_days) is None]
+    prefetched = {}
+    if uncached:
+        with metrics.span("metadata", job.folder_name):
+            prefetched = yt_dlp_engine.fetch_metadata_batch(uncached)
+    if uncached:
+        logger.info(f"🔎 メタデータ取得: {len(uncached)} 件（キャッシュ済み {len(video_ids) - len(uncached)} 件）")
+
+    for video_id in video_ids:
+        if ctx.stopping.is_set():
+            break
         url = f"https://www.youtube.com/watch?v={video_id}"
+        row = journal.get(video_id) or {}
 
         try:
-            meta = subprocess.run(["yt-dlp", "-J", url], capture_output=True, text=True, check=True)
-            data = json.loads(meta.stdout)
+            if row.get("data"):
+                video = json.loads(row["data"])
+            else:
+                title, upload_date, duration = get_video_metadata(video_id, url, state_store, metadata_cache_days, prefetched)
 
-            title = data.get("title")
-            upload_date = data.get("upload_date")
-            duration = data.get("duration")
+                if not all([title, upload_date, duration]):
+                    logger.warning(f"⚠️ メタデータ不足: {url}")
+                    continue
 
-            if not all([title, upload_date, duration]):
-                logger.warning(f"⚠️ メタデータ不足: {url}")
-                continue
+                if int(upload_date) < threshold_date:
+                    logger.debug(f"⏭️ 古い動画をスキップ: {upload_date} < {threshold_date}")
+                    state_store.set_decision(video_id, DECISION_TOO_OLD)
+                    job.decide(video_id, DECISION_TOO_OLD, upload_date)
+                    continue
 
-            if int(upload_date) < threshold_date:
-                logger.debug(f"⏭️ 古い動画をスキップ: {upload_date} < {threshold_date}")
-                continue
+                if not (min_duration <= duration <= max_duration):
+                    logger.debug(f"⏭️ 長さ条件外をスキップ: {duration}秒")
+                    state_store.set_decision(video_id, DECISION_OUT_OF_RANGE)
+                    job.decide(video_id, DECISION_OUT_OF_RANGE, upload_date)
+                    continue
 
-            if not (min_duration <= duration <= max_duration):
-                logger.debug(f"⏭️ 長さ条件外をスキップ: {duration}秒")
-                continue
+                mmdd = datetime.strptime(upload_date, "%Y%m%d").strftime("%m-%d")
+                safe_title = "".join(c for c in title if c not in r'<>:"/\\|?*').replace("#", " ")
+                video = {
+                    "video_id": video_id,
+                    "url": url,
+                    "title": title,
+                    "upload_date": upload_date,
+                    "duration": duration,
+                    "basename": f"{mmdd}：{safe_title[:40]}",
+                }
+            basename = video["basename"]
 
-            mmdd = datetime.strptime(upload_date, "%Y%m%d").strftime("%m-%d")
-            safe_title = "".join(c for c in title if c not in r'<>:"/\\|?*').replace("#", " ")
-            filename = f"{mmdd}：{safe_title[:40]}.mp3"
-            filepath = os.path.join(output_dir, filename)
+            # 音声モードを切り替えた後も、別の形式で保存済みなら既存として扱う
+            # （ダウンロードは一時ファイル経由なので、存在するファイルは完全なもの）
+            existing = next((basename + ext for ext in AUDIO_EXTENSIONS
+                             if os.path.exists(os.path.join(job.output_dir, basename + ext))), None)
+            if existing and row.get("state") == JOURNAL_DOWNLOADED:
+                # ダウンロード後、アップロード前に中断・失敗していた
+                logger.info(f"♻️ 未アップロードのファイルを再送: {existing}")
+                video["filename"] = existing
+                video["filepath"] = os.path.join(job.output_dir, existing)
+                with job.lock:
+                    job.durations[existing] = video["duration"]
+                job.decide(video_id, DECISION_DOWNLOADED, video["upload_date"])
+                submit_video(ctx, job, ctx.upload, upload_video, video)
+                continue
+            if existing:
+                logger.info(f"⏭️ スキップ（既存）: {existing}")
+                state_store.touch_local_file(cache_path(os.path.join(job.output_dir, existing)))
+                with job.lock:
+                    job.durations[existing] = video["duration"]
+                state_store.set_decision(video_id, DECISION_EXISTS)
+                job.decide(video_id, DECISION_EXISTS, video["upload_date"])
+                continue
 
-            if os.path.exists(filepath):
-                logger.info(f"⏭️ スキップ（既存）: {filename}")
-                durations[filename] = duration
+            # ローカルに残さずR2へストリーミングしたエピソード・共有ストアへの参照
+            episode = state_store.find_episode(job.folder_name, [basename + ext for ext in AUDIO_EXTENSIONS])
+            if episode and episode["object_key"]:
+                shared = state_store.get_shared_object(episode["object_key"])
+                local_path = os.path.join(shared_dir, os.path.basename(episode["object_key"]))
+                if shared and shared["uploaded"]:
+                    logger.info(f"⏭️ スキップ（共有ストアに既存）: {episode['filename']}")
+                    state_store.set_decision(video_id, DECISION_EXISTS)
+                    job.decide(video_id, DECISION_EXISTS, video["upload_date"])
+                    continue
+                if shared and os.path.exists(local_path):
+                    logger.info(f"♻️ 未アップロードの共有ファイルを再送: {episode['filename']}")
+                    video.update(filename=episode["filename"], filepath=local_path, remote_path=episode["object_key"])
+                    with job.lock:
+                        job.durations[episode["filename"]] = video["duration"]
+                    job.decide(video_id, DECISION_DOWNLOADED, video["upload_date"])
+                    submit_video(ctx, job, ctx.upload, upload_video, video)
+                    continue
+                # 共有オブジェクトが失われていれば取得し直す
+            elif episode and not episode["local"]:
+                logger.info(f"⏭️ スキップ（R2に既存）: {episode['filename']}")
+                state_store.set_decision(video_id, DECISION_EXISTS)
+                job.decide(video_id, DECISION_EXISTS, video["upload_date"])
                 continue
 
-            logger.info(f"⬇️ ダウンロード: {filename}")
-            with yt_dlp_semaphore:  # セマフォを使用して同時実行数を制限
-                dl_result = subprocess.run([
-                    "yt-dlp", "-x",
-                    "--audio-format", "mp3",
-                    "--ffmpeg-location", config['Paths']['ffmpeg_path'],
-                    "--postprocessor-args", "-b:a 128k",
-                    "-o", filepath,
-                    url
-                ], capture_output=True, text=True)
-
-            if dl_result.returncode == 0:
-                downloaded += 1
-                durations[filename] = duration
-
-                # R2へアップロード
-                logger.info(f"☁️ アップロード: {filename}")
-                remote_path = f"{folder_name}/{filename}"
-                upload_success = upload_to_r2(r2_client, filepath, remote_path, r2_bucket)
-                if not upload_success:
-                    logger.warning(f"⚠️ アップロード処理でエラーが発生しました: {filename}")
+            if ctx.plan is None:
+                state_store.set_journal_state(job.folder_name, video_id, JOURNAL_METADATA, json.dumps(video))
+            if job.shared:
+                submit_video(ctx, job, ctx.download, shared_video, video)
+            elif job.stream_upload:
+                submit_video(ctx, job, ctx.download, stream_video, video)
             else:
-                logger.error(f"⚠️ ダウンロード失敗: {title}\n{translate_youtube_error(dl_result.stderr)}")
-        except subprocess.CalledProcessError as e:
+                submit_video(ctx, job, ctx.download, download_video, video)
+        except YtDlpError as e:
+            if ctx.stopping.is_set():
+                break
+            count_error("metadata", e.stderr)
+            if classify_youtube_error(e.stderr) == "throttled":
+                yt_dlp_limiter.report_throttle(job.folder_name)
             logger.error(f"⚠️ yt-dlp実行エラー: {translate_youtube_error(e.stderr)}")
+            remember_failure(ctx, job, video_id, e.stderr)
             continue
         except json.JSONDecodeError:
             logger.error(f"⚠️ JSONパース失敗: {url}")
@@ -329,141 +961,1202 @@ def process_program(args):
             logger.error(f"⚠️ 予期せぬエラー: {e}")
             continue
 
-    logger.info(f"✅ ダウンロード完了（{downloaded} 件）")
+# 動画をダウンロード段・アップロード段へ渡す（--plan では渡さずに予定として記録する）
+def submit_video(ctx, job, stage, func, video):
+    if ctx.plan is not None:
+        ctx.plan.add("uploads" if stage is ctx.upload else "downloads", job.folder_name, video)
+        return
+    stage.submit(func, ctx, job, video, tracker=job.tracker)
+
+# 動画固有の失敗をネガティブキャッシュに記録（プレミアは公開予定時刻まで、削除済みは長期間）
+def remember_failure(ctx, job, video_id, error_msg):
+    category = classify_youtube_error(error_msg)
+    if category not in NEGATIVE_CACHE_HOURS:
+        return
+    hours = float(ctx.config['Settings'].get(f'negative_cache_{category}_hours', str(NEGATIVE_CACHE_HOURS[category])))
+    if hours <= 0:
+        return
+    ttl = premiere_wait_seconds(error_msg) if category == "premiere" else None
+    if ttl is None:
+        ttl = hours * 3600
+    ctx.state_store.put_negative(video_id, job.folder_name, category, (error_msg or "").strip(), time.time() + ttl)
+    if category == "removed":
+        # 削除済みの動画は処理済みとして扱い、差分走査の停止位置を進められるようにする
+        ctx.state_store.set_decision(video_id, DECISION_REMOVED)
+        job.decide(video_id, DECISION_REMOVED, None)
 
-    # 古いファイル削除（ローカルとR2のパラメータを別々に適用）
-    logger.info(f"🧹 古いファイル削除: {folder_name}")
+# ネガティブキャッシュの一覧を表示
+def show_negative_cache(state_store):
+    rows = state_store.list_negative()
+    now = time.time()
+    print(f"{'folder':<16} {'video_id':<15} {'category':<12}{'failures':>9}  expires           reason")
+    for row in rows:
+        expires = datetime.fromtimestamp(row["expires_at"]).strftime('%Y-%m-%d %H:%M')
+        mark = " " if row["expires_at"] > now else "x"
+        reason = row["reason"].splitlines()[-1][:60] if row["reason"] else ""
+        print(f"{row['folder']:<16} {row['video_id']:<15} {row['category']:<12}{row['failures']:>9}  {expires}{mark}  {reason}")
+    print(f"合計 {len(rows)} 件（x: 期限切れ）")
 
-    # R2の現在のファイル一覧を取得
-    r2_files = list_r2_files(r2_client, f"{folder_name}/", r2_bucket)
-    r2_filenames = [os.path.basename(path) for path in r2_files]
+# 音声モードごとの保存先 (ファイル名, ローカルのパス, R2のキー) を返す
+# 共有ストアを使うチャンネルでは動画IDごとの共有オブジェクトに保存し、ファイル名はフィード上の名前になる
+def audio_target(job, video, mode):
+    filename = video["basename"] + audio_ext(mode)
+    if job.shared:
+        name = video["video_id"] + audio_ext(mode)
+        return filename, os.path.join(shared_dir, name), f"{SHARED_DIR}/{name}"
+    return filename, os.path.join(job.output_dir, filename), f"{job.folder_name}/{filename}"
 
-    # 現在の日時
-    now = datetime.now()
+# ローカル音声キャッシュでのファイルの記録名（data/ からの相対パス。共有ストアでは R2 のキーと同じ）
+def cache_path(local_path):
+    return os.path.relpath(local_path, os.path.join(project_dir, "data")).replace(os.sep, "/")
 
-    # ローカルファイル処理
-    logger.info(f"🧹 ローカルファイル確認中（{local_expire_days}日以上経過したものを削除）")
-    for filename in os.listdir(output_dir):
-        if filename.endswith(".mp3") and "：" in filename:
+# ダウンロード段（共有ストア）：同じ動画は動画IDごとに1チャンネルずつ処理し、
+# 共有ストアにあれば参照を追加するだけ、なければダウンロード（またはストリーミング）する
+def shared_video(ctx, job, video):
+    with ctx.shared_lock(video["video_id"]):
+        if ctx.stopping.is_set():
+            return
+        if reuse_shared_object(ctx, job, video):
+            return
+        if job.stream_upload:
+            stream_video(ctx, job, video)
+        else:
+            download_video(ctx, job, video)
+
+# 共有ストアに同じ動画の音声があれば、ダウンロードせずにこのチャンネルからの参照を追加する
+# （音声モードが違っても動画IDが同じなら再利用する。ファイル名とMIMEタイプは見つかったオブジェクトの形式になる）
+def reuse_shared_object(ctx, job, video):
+    modes = fallback_modes(job.audio_mode)
+    modes += [mode for mode in AUDIO_MODES if mode not in modes]
+    targets = {target[2]: target for target in (audio_target(job, video, mode) for mode in modes)}
+    shared = ctx.state_store.find_shared_object(list(targets))
+    if shared is None:
+        return False
+    filename, local_path, object_key = targets[shared["object_key"]]
+    # 送信前にローカルのファイルが失われたオブジェクトは取得し直す
+    if not (shared["uploaded"] or os.path.exists(local_path)):
+        return False
+
+    ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"], video["upload_date"],
+                                shared["size"], shared["duration"], local=False, object_key=object_key)
+    ctx.state_store.add_shared_hit(object_key, shared["size"])
+    ctx.state_store.touch_local_file(object_key)
+    metrics.count("dedup_hits")
+    metrics.count("bytes", shared["size"], kind="deduplicated")
+    logger.info(f"🔗 共有ストアの音声を再利用: {filename}（{object_key}, {shared['size'] / 1024 / 1024:.1f}MB）")
+    with job.lock:
+        job.durations[filename] = shared["duration"]
+    ctx.state_store.set_decision(video["video_id"], DECISION_EXISTS)
+    job.decide(video["video_id"], DECISION_EXISTS, video["upload_date"])
+    if shared["uploaded"]:
+        record_in_manifest(ctx, job, video, filename, object_key, shared["size"], shared["duration"])
+        ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_UPLOADED)
+    else:
+        # 他のチャンネルの送信が終わっていなければ、アップロード段で待ち合わせる
+        video.update(filename=filename, filepath=local_path, remote_path=object_key)
+        ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_DOWNLOADED)
+        ctx.upload.submit(upload_video, ctx, job, video, tracker=job.tracker)
+    return True
+
+# 共有ストアの一覧と、重複排除で省略したダウンロードの累計を表示
+def show_shared_store(state_store):
+    rows = state_store.list_shared_objects()
+    print(f"{'object':<32}{'refs':>5}{'hits':>5}{'MB':>8}  local uploaded")
+    for row in rows:
+        print(f"{row['object_key']:<32}{row['refs']:>5}{row['hits']:>5}{row['size'] / 1024 / 1024:>8.1f}"
+              f"  {'yes' if row['local'] else 'no':<5} {'yes' if row['uploaded'] else 'no'}")
+    stats = state_store.shared_stats()
+    stored = sum(row["size"] for row in rows)
+    print(f"合計 {len(rows)} 件 {stored / 1024 / 1024:.1f}MB（参照 {sum(row['refs'] for row in rows)} 件）")
+    print(f"重複排除で省略（累計）: ダウンロード {stats.get('dedup_downloads', 0)} 件, "
+          f"{stats.get('dedup_bytes', 0) / 1024 / 1024:.1f}MB")
+
+# ダウンロード段：音声をダウンロード・変換し、アップロード段へ渡す
+def download_video(ctx, job, video):
+    config = ctx.config
+    # AAC のストリームがない動画は m4a から mp3 にフォールバックする
+    modes = fallback_modes(job.audio_mode)
+
+    # 一時ディレクトリに動画IDのファイル名で書き出し、完了してから置き換える
+    # （中断しても完成したファイルと区別でき、次回は yt-dlp が .part から続きを取得する）
+    partial_dir = os.path.join(os.path.dirname(audio_target(job, video, modes[0])[1]), PARTIAL_DIR)
+    os.makedirs(partial_dir, exist_ok=True)
+
+    logger.info(f"⬇️ ダウンロード: {video['basename']}（{job.audio_mode}）")
+    ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_DOWNLOADING)
+    try:
+        # リミッターで同時実行数を制限（結果をスループット・エラー率として記録）
+        with yt_dlp_limiter.slot(job.folder_name) as slot:
+            for mode in modes:
+                filename, filepath, remote_path = audio_target(job, video, mode)
+                temp_path = os.path.join(partial_dir, video["video_id"] + audio_ext(mode))
+                try:
+                    # mp3 は変換（ffmpeg）を含む時間、m4a はほぼ取得のみの時間になる
+                    with metrics.span(f"download_{mode}", job.folder_name):
+                        yt_dlp_engine.download(download_args(mode, temp_path, config['Paths']['ffmpeg_path']), video["url"])
+                    os.replace(temp_path, filepath)
+                    break
+                except YtDlpError as e:
+                    if mode != modes[-1] and is_format_unavailable(e.stderr):
+                        logger.info(f"↩️ {mode} 用の音声ストリームがないため {modes[-1]} で再取得: {video['basename']}")
+                        metrics.count("format_fallbacks", mode=mode)
+                        continue
+                    slot.fail(classify_youtube_error(e.stderr))
+                    raise
+            slot.succeed(os.path.getsize(filepath))
+    except CircuitOpenError as e:
+        logger.warning(f"⏸️ ダウンロード見送り: {video['title']}（{e}）")
+        return
+    except YtDlpError as e:
+        if ctx.stopping.is_set():
+            logger.warning(f"⏸️ 中断: {video['title']}（次回の実行で再開します）")
+            return
+        count_error("download", e.stderr)
+        ctx.state_store.set_decision(video["video_id"], DECISION_FAILED)
+        logger.error(f"⚠️ ダウンロード失敗: {video['title']}\n{translate_youtube_error(e.stderr)}")
+        remember_failure(ctx, job, video["video_id"], e.stderr)
+        return
+
+    video["filename"] = filename
+    video["filepath"] = filepath
+    video["remote_path"] = remote_path
+    metrics.count("bytes", os.path.getsize(filepath), kind="downloaded")
+    metrics.count("episodes", mode=mode)
+    with job.lock:
+        job.downloaded += 1
+        job.durations[filename] = video["duration"]
+    ctx.state_store.set_decision(video["video_id"], DECISION_DOWNLOADED)
+    job.decide(video["video_id"], DECISION_DOWNLOADED, video["upload_date"])
+    st = os.stat(filepath)
+    if job.shared:
+        ctx.state_store.put_shared_object(remote_path, video["video_id"], st.st_size, video["duration"],
+                                          local=True, uploaded=False)
+        ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"],
+                                    video["upload_date"], st.st_size, video["duration"], local=False,
+                                    object_key=remote_path)
+    else:
+        ctx.state_store.put_duration(job.folder_name, filename, st.st_size, st.st_mtime_ns, video["duration"])
+        ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"],
+                                    video["upload_date"], st.st_size, video["duration"], local=True)
+    ctx.state_store.put_local_file(cache_path(filepath), SHARED_DIR if job.shared else job.folder_name,
+                                   st.st_size, video["upload_date"])
+    ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_DOWNLOADED)
+
+    ctx.upload.submit(upload_video, ctx, job, video, tracker=job.tracker)
+
+# R2上のオブジェクトのサイズ（なければNone）
+def r2_object_size(client, bucket, remote_path):
+    try:
+        return client.head_object(Bucket=bucket, Key=remote_path).get('ContentLength')
+    except Exception:
+        return None
+
+# ダウンロード段（ストリーミング）：ローカルディスクを経由せず yt-dlp → ffmpeg → R2 へ直接送る
+def stream_video(ctx, job, video):
+    config = ctx.config
+    bucket = config['R2']['bucket']
+    modes = fallback_modes(job.audio_mode)
+
+    # 状態ストアを失った場合などに備え、R2にすでにあれば送り直さない
+    for mode in modes:
+        filename, _, remote_path = audio_target(job, video, mode)
+        size = r2_object_size(ctx.r2_client, bucket, remote_path)
+        if size:
+            logger.info(f"⏭️ スキップ（R2に既存）: {filename}")
+            if job.shared:
+                ctx.state_store.put_shared_object(remote_path, video["video_id"], size, video["duration"],
+                                                  local=False, uploaded=True)
+            ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"],
+                                        video["upload_date"], size, video["duration"], local=False,
+                                        object_key=remote_path if job.shared else None)
+            record_in_manifest(ctx, job, video, filename, remote_path, size, video["duration"])
+            ctx.state_store.set_decision(video["video_id"], DECISION_EXISTS)
+            job.decide(video["video_id"], DECISION_EXISTS, video["upload_date"])
+            return
+
+    logger.info(f"📡 ストリーミング: {video['basename']}（{job.audio_mode}{', ローカル保存あり' if job.keep_local else ''}）")
+    ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_DOWNLOADING)
+    try:
+        with yt_dlp_limiter.slot(job.folder_name) as slot:
+            for mode in modes:
+                filename, local_path, remote_path = audio_target(job, video, mode)
+                start = time.perf_counter()
+                try:
+                    with metrics.span(f"stream_{mode}", job.folder_name):
+                        result = stream_audio_to_r2(
+                            ctx.r2_client, bucket, remote_path, video["url"], mode, config['Paths']['ffmpeg_path'],
+                            part_size=r2_transfer_config.multipart_chunksize,
+                            concurrency=r2_transfer_config.max_concurrency,
+                            extra_args={'ContentType': AUDIO_MODES[mode]["mime"]},
+                            local_path=local_path if job.keep_local else None,
+                        )
+                    break
+                except YtDlpError as e:
+                    if mode != modes[-1] and is_format_unavailable(e.stderr):
+                        logger.info(f"↩️ {mode} 用の音声ストリームがないため {modes[-1]} で再取得: {video['basename']}")
+                        metrics.count("format_fallbacks", mode=mode)
+                        continue
+                    slot.fail(classify_youtube_error(e.stderr))
+                    raise
+            slot.succeed(result.size)
+    except CircuitOpenError as e:
+        logger.warning(f"⏸️ ダウンロード見送り: {video['title']}（{e}）")
+        return
+    except YtDlpError as e:
+        if ctx.stopping.is_set():
+            logger.warning(f"⏸️ 中断: {video['title']}（次回の実行で再開します）")
+            return
+        count_error("download", e.stderr)
+        ctx.state_store.set_decision(video["video_id"], DECISION_FAILED)
+        logger.error(f"⚠️ ダウンロード失敗: {video['title']}\n{translate_youtube_error(e.stderr)}")
+        remember_failure(ctx, job, video["video_id"], e.stderr)
+        return
+    except StreamUploadError as e:
+        if ctx.stopping.is_set():
+            logger.warning(f"⏸️ 中断: {video['title']}（次回の実行で再開します）")
+            return
+        metrics.count("errors", stage="stream", category="stream")
+        ctx.state_store.set_decision(video["video_id"], DECISION_FAILED)
+        logger.error(f"⚠️ ストリーミング失敗: {video['title']} - {e}")
+        return
+
+    elapsed = time.perf_counter() - start
+    speed = result.size / 1024 / 1024 / elapsed if elapsed > 0 else 0
+    metrics.count("bytes", result.size, kind="streamed")
+    metrics.count("episodes", mode=mode)
+    logger.info(f"📊 ストリーミング完了: {remote_path}（{result.size / 1024 / 1024:.1f}MB, {elapsed:.1f}秒, {speed:.2f}MB/s）")
+
+    # 長さは ffmpeg の出力から取得し、取れなければメタデータの値を使う
+    duration = result.duration or video["duration"]
+    with job.lock:
+        job.downloaded += 1
+        job.durations[filename] = duration
+    ctx.state_store.set_decision(video["video_id"], DECISION_DOWNLOADED)
+    job.decide(video["video_id"], DECISION_DOWNLOADED, video["upload_date"])
+    if job.shared:
+        ctx.state_store.put_shared_object(remote_path, video["video_id"], result.size, duration,
+                                          local=job.keep_local, uploaded=True)
+        ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"],
+                                    video["upload_date"], result.size, duration, local=False, object_key=remote_path)
+    else:
+        ctx.state_store.put_episode(job.folder_name, filename, video["video_id"], video["title"],
+                                    video["upload_date"], result.size, duration, local=job.keep_local)
+    record_in_manifest(ctx, job, video, filename, remote_path, result.size, duration)
+    ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_UPLOADED)
+    if job.keep_local:
+        ctx.state_store.put_local_file(cache_path(local_path), SHARED_DIR if job.shared else job.folder_name,
+                                       result.size, video["upload_date"], uploaded=True)
+        if not job.shared:
+            st = os.stat(local_path)
+            ctx.state_store.put_duration(job.folder_name, filename, st.st_size, st.st_mtime_ns, duration)
+
+# アップロード段：ダウンロード済みの音声をR2へアップロード
+def upload_video(ctx, job, video):
+    filename = video["filename"]
+    logger.info(f"☁️ アップロード: {filename}")
+    remote_path = video.get("remote_path") or f"{job.folder_name}/{filename}"
+    if job.shared:
+        # 同じ共有オブジェクトを複数チャンネルから同時に送らない（先に送り終えていれば省略）
+        with ctx.shared_lock(remote_path):
+            shared = ctx.state_store.get_shared_object(remote_path)
+            upload_success = bool(shared and shared["uploaded"]) or upload_to_r2(
+                ctx.r2_client, video["filepath"], remote_path, ctx.config['R2']['bucket'])
+            if upload_success:
+                ctx.state_store.set_shared_uploaded(remote_path)
+        size = shared["size"] if shared else os.path.getsize(video["filepath"])
+    else:
+        upload_success = upload_to_r2(ctx.r2_client, video["filepath"], remote_path, ctx.config['R2']['bucket'])
+        size = os.path.getsize(video["filepath"]) if upload_success else 0
+    if upload_success:
+        record_in_manifest(ctx, job, video, filename, remote_path, size,
+                           video["duration"] or job.durations.get(filename))
+        ctx.state_store.set_local_uploaded(cache_path(video["filepath"]))
+        ctx.state_store.set_journal_state(job.folder_name, video["video_id"], JOURNAL_UPLOADED)
+    else:
+        logger.warning(f"⚠️ アップロード処理でエラーが発生しました: {filename}")
+
+# 後処理段：番組の全タスク完了後に、差分走査の状態とRSSを更新する
+def finalize_program(ctx, job):
+    if job.failed:
+        job.result.set_result(None)
+        return
+    if ctx.stopping.is_set():
+        # 中断時は走査状態・フィードを更新しない（次回ジャーナルから再開して反映する）
+        logger.info(f"⏸️ 後処理を見送り: {job.folder_name}")
+        job.result.set_result(None)
+        return
+    if ctx.plan is not None:
+        try:
+            plan_program_feed(ctx, job)
+            job.result.set_result(job.folder_name)
+        except Exception as e:
+            job.result.set_exception(e)
+        return
+    try:
+        logger.info(f"✅ ダウンロード完了（{job.folder_name}: {job.downloaded} 件）")
+        update_high_water(ctx, job)
+        if ctx.leases and not ctx.leases.holds(job.folder_name):
+            # 処理中にリースを失ったチャンネルのフィードは、引き継いだノードが書く
+            logger.warning(f"⚠️ リースを失ったためフィードを更新しません: {job.folder_name}")
+        else:
+            write_program_feed(ctx, job)
+        job.result.set_result(job.folder_name)
+    except Exception as e:
+        job.result.set_exception(e)
+
+# 差分走査のハイウォーターマークを更新
+def update_high_water(ctx, job):
+    if not job.incremental:
+        return
+    # 失敗・保留の動画より古いものだけをハイウォーターマークにする（次回も再試行されるように）
+    # 末尾まで途切れずに処理を終えた区間の中で最新の動画が次回の停止位置になる
+    new_high_water = None
+    for video_id in job.video_ids:
+        decision, upload_date = job.decisions.get(video_id, (None, None))
+        if decision is None:
+            new_high_water = None
+        elif new_high_water is None:
+            new_high_water = (video_id, upload_date)
+    if new_high_water:
+        ctx.state_store.set_high_water(job.folder_name, *new_high_water)
+
+# ローカル音声キャッシュの整理（全チャンネル・共有ストアをまとめて1回行う）
+# 公開日から local_expire_days を過ぎたファイルと、合計が local_cache_max_gb を超えた分を
+# アップロード済みのものから最後に使った時刻の古い順に削除する。
+# エピソードの記録（サイズ・長さ）は残すので、削除したファイルもRSSに載り続ける
+def evict_local_cache(ctx, folder_names):
+    config = ctx.config
+    state_store = ctx.state_store
+    budget = int(float(config['Settings'].get('local_cache_max_gb', '0')) * 1024 ** 3)
+    adopt_local_files(ctx, folder_names)
+
+    # 共有ストアのファイルは参照するチャンネルのうち最も長い保存期間まで残す
+    shared_expire = {}
+    for ref in state_store.shared_references():
+        days = int(channel_setting(config, ref["folder"], 'local_expire_days', '10'))
+        shared_expire[ref["object_key"]] = max(days, shared_expire.get(ref["object_key"], days))
+
+    today = datetime.now()
+    kept, evicted = [], []
+    for row in state_store.list_local_files():
+        local_path = os.path.join(project_dir, "data", row["path"])
+        if not os.path.exists(local_path):
+            # 他の処理（R2の期限切れ削除など）で消えたファイルは記録だけ消す
+            state_store.delete_local_files([row["path"]])
+            continue
+        if row["folder"] == SHARED_DIR:
+            expire_days = shared_expire.get(row["path"], int(config['Settings'].get('local_expire_days', '10')))
+        else:
+            expire_days = int(channel_setting(config, row["folder"], 'local_expire_days', '10'))
+        try:
+            age = (today - datetime.strptime(row["published"], "%Y%m%d")).days
+        except ValueError:
+            age = 0
+        if age > expire_days:
+            evicted.append((row, "age"))
+        else:
+            kept.append(row)
+
+    # 容量の上限を超えていれば、アップロード済みのものを使っていない順に削除（未送信のものは再送に使うので残す）
+    used = sum(row["size"] for row in kept)
+    if budget > 0:
+        for row in list(kept):
+            if used <= budget:
+                break
+            if row["uploaded"]:
+                kept.remove(row)
+                evicted.append((row, "budget"))
+                used -= row["size"]
+
+    freed = 0
+    for row, reason in evicted:
+        if evict_local_file(ctx, row):
+            freed += row["size"]
+            metrics.count("local_cache_evictions", reason=reason)
+    metrics.count("bytes", freed, kind="evicted")
+
+    limit = f"{budget / 1024 ** 3:.2f}GB" if budget > 0 else "上限なし"
+    logger.info(f"💾 ローカルキャッシュ: {len(kept)} 件 {used / 1024 ** 3:.2f}GB / {limit}"
+                f"（削除 {len(evicted)} 件 {freed / 1024 / 1024:.1f}MB）")
+    if budget > 0 and used > budget:
+        logger.warning(f"⚠️ 未アップロードのファイルだけで上限を超えています（{used / 1024 ** 3:.2f}GB）")
+
+    for folder_name in folder_names:
+        remove_stale_partials(config, os.path.join(project_dir, "data", folder_name, PARTIAL_DIR))
+    remove_stale_partials(config, os.path.join(shared_dir, PARTIAL_DIR))
+
+# ローカル音声キャッシュに記録のないファイル（以前の版でダウンロードしたもの）を登録する
+# エピソードの記録もなければ、ファイルから作ってRSSに載せ続けられるようにする
+def adopt_local_files(ctx, folder_names):
+    state_store = ctx.state_store
+    known = {row["path"] for row in state_store.list_local_files()}
+    for folder_name in folder_names:
+        output_dir = os.path.join(project_dir, "data", folder_name)
+        if not os.path.isdir(output_dir):
+            continue
+        episodes = state_store.get_episodes(folder_name)
+        durations = state_store.get_durations(folder_name)
+        for filename in os.listdir(output_dir):
+            local_path = os.path.join(output_dir, filename)
+            if not is_audio_file(filename) or cache_path(local_path) in known:
+                continue
+            st = os.stat(local_path)
+            episode = episodes.get(filename)
+            if episode:
+                published = episode["upload_date"]
+            else:
+                # 公開日が分からないので、ダウンロードした日（更新時刻）を使う
+                published = datetime.fromtimestamp(st.st_mtime).strftime("%Y%m%d")
+                duration = durations[filename]["duration"] if filename in durations else 0
+                title = os.path.splitext(filename)[0].split("：", 1)[-1]
+                state_store.put_episode(folder_name, filename, "", title, published, st.st_size, duration, local=True)
+            # 以前の版のファイルはアップロード済みとみなす（未送信のものは作業ジャーナルから再送される）
+            state_store.put_local_file(cache_path(local_path), folder_name, st.st_size, published, uploaded=True)
+
+# ローカルのファイルを1つ削除し、エピソード・共有ストアの記録を「ローカルなし」にする
+def evict_local_file(ctx, row):
+    local_path = os.path.join(project_dir, "data", row["path"])
+    try:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+    except OSError as e:
+        logger.error(f"⚠️ ローカルファイル削除エラー: {row['path']} - {e}")
+        return False
+    if row["folder"] == SHARED_DIR:
+        ctx.state_store.set_shared_local(row["path"], False)
+    else:
+        filename = os.path.basename(row["path"])
+        if row["uploaded"]:
+            ctx.state_store.set_episode_local(row["folder"], filename, False)
+        else:
+            # R2にないエピソードはRSSに載せられないので記録ごと消す
+            ctx.state_store.delete_episodes(row["folder"], [filename])
+        ctx.state_store.delete_durations(row["folder"], [filename])
+    ctx.state_store.delete_local_files([row["path"]])
+    logger.info(f"🗑️ ローカル削除: {row['path']}")
+    return True
+
+# 再開されないまま対象期間を過ぎたダウンロード途中のファイルを削除
+def remove_stale_partials(config, partial_dir):
+    partial_expire = time.time() - (int(config['Settings'].get('look_back_days', '4')) + 1) * 86400
+    if os.path.isdir(partial_dir):
+        for filename in os.listdir(partial_dir):
+            partial_path = os.path.join(partial_dir, filename)
             try:
-                mmdd = filename.split("：")[0]
-                file_date = datetime.strptime(mmdd, "%m-%d").replace(year=now.year)
-                
-                # 年をまたいだ場合（例：現在1月で、ファイルが12月の場合）
-                if file_date > now and mmdd.startswith("12") and now.month < 2:
-                    file_date = file_date.replace(year=now.year - 1)
-                
-                # ローカルファイルの期限確認
-                if (now - file_date).days > local_expire_days:
-                    # ローカルファイル削除
-                    local_path = os.path.join(output_dir, filename)
-                    if os.path.exists(local_path):
-                        os.remove(local_path)
-                        logger.info(f"🗑️ ローカル削除: {filename}")
-            except Exception as e:
+                if os.path.getmtime(partial_path) < partial_expire:
+                    os.remove(partial_path)
+                    logger.info(f"🗑️ ダウンロード途中のファイルを削除: {filename}")
+            except OSError as e:
                 logger.error(f"⚠️ ローカルファイル削除エラー: {filename} - {e}")
 
-    # R2ファイル処理（別の基準で削除）
-    logger.info(f"🧹 R2ファイル確認中（{r2_expire_days}日以上経過したものを削除）")
-    for filename in r2_filenames:
-        if filename.endswith(".mp3") and "：" in filename:
+# マニフェストのエピソードの公開日からの経過日数
+def episode_age_days(entry, today):
+    try:
+        return (today - datetime.strptime(entry["upload_date"], "%Y%m%d")).days
+    except ValueError:
+        return 0
+
+# チャンネルのマニフェストを読む（まだなければバケットの一覧から作る。--plan では作らずに None）
+def channel_manifest(ctx, folder_name):
+    episodes = ctx.manifests.load(folder_name)
+    if episodes is None and ctx.plan is None:
+        episodes = reconcile_manifest(ctx, folder_name)
+    return episodes
+
+# R2へ置いたエピソードをマニフェストに記録（アップロード・ストリーミング・共有オブジェクトの再利用の後）
+def record_in_manifest(ctx, job, video, filename, remote_path, size, duration):
+    entry = make_entry(remote_path, video["video_id"], video["title"], video["upload_date"], size, duration)
+    try:
+        ctx.manifests.put(job.folder_name, {filename: entry})
+    except Exception as e:
+        metrics.count("errors", stage="manifest", category="r2")
+        logger.error(f"⚠️ マニフェスト更新失敗: {job.folder_name}/{filename} - {e}（--reconcile-manifests で直せます）")
+
+# バケットの一覧からチャンネルのマニフェストを作り直す
+# listed: {キー: サイズ}（None ならこのチャンネルの prefix を一覧する）/ shared_listed: 共有ストアのキー（None なら確認しない）
+# 長さ・タイトル・公開日は、今のマニフェスト → 状態ストア → ファイル名 の順に分かるものを使う
+def reconcile_manifest(ctx, folder_name, listed=None, shared_listed=None):
+    if listed is None:
+        with metrics.span("r2_list", folder_name):
+            listed = {item['Key']: item['Size'] for item in
+                      iter_r2_objects(ctx.r2_client, f"{folder_name}/", ctx.config['R2']['bucket'])}
+    current = ctx.manifests.load(folder_name) or {}
+    rows = ctx.state_store.get_episodes(folder_name)
+    durations = ctx.state_store.get_durations(folder_name)
+    today = datetime.now()
+
+    episodes = {}
+    for key, size in listed.items():
+        filename = key.partition("/")[2]
+        if "/" in filename or not is_audio_file(filename):
+            continue
+        entry = current.get(filename) or {}
+        row = rows.get(filename) or {}
+        upload_date = entry.get("upload_date") or row.get("upload_date")
+        if not upload_date:
             try:
-                mmdd = filename.split("：")[0]
-                file_date = datetime.strptime(mmdd, "%m-%d").replace(year=now.year)
-                
-                # 年をまたいだ場合（例：現在1月で、ファイルが12月の場合）
-                if file_date > now and mmdd.startswith("12") and now.month < 2:
-                    file_date = file_date.replace(year=now.year - 1)
-                
-                # R2ファイルの期限確認
-                if (now - file_date).days > r2_expire_days:
-                    # R2ファイル削除
-                    remote_path = f"{folder_name}/{filename}"
-                    delete_success = delete_from_r2(r2_client, remote_path, r2_bucket)
-                    if delete_success:
-                        logger.info(f"🗑️ R2削除: {remote_path}")
+                upload_date = filename_date(filename, today).strftime("%Y%m%d")
+            except ValueError:
+                upload_date = today.strftime("%Y%m%d")
+        title = entry.get("title") or row.get("title") or os.path.splitext(filename)[0].split("：", 1)[-1]
+        duration = (entry.get("duration") or row.get("duration")
+                    or (durations[filename]["duration"] if filename in durations else 0))
+        episodes[filename] = make_entry(key, entry.get("video_id") or row.get("video_id"), title, upload_date,
+                                        size, duration)
+
+    # 共有ストアへの参照はチャンネルの prefix に出てこないので、今のマニフェストと状態ストアから引き継ぐ
+    refs = {filename: entry for filename, entry in current.items() if entry["key"].startswith(f"{SHARED_DIR}/")}
+    for filename, row in rows.items():
+        if row["object_key"] and row["uploaded"] and filename not in refs:
+            refs[filename] = make_entry(row["object_key"], row["video_id"], row["title"], row["upload_date"],
+                                        row["size"], row["duration"])
+    for filename, entry in refs.items():
+        if shared_listed is None or entry["key"] in shared_listed:
+            episodes[filename] = entry
+
+    ctx.manifests.replace(folder_name, episodes)
+    logger.info(f"🧾 マニフェストを作り直しました: {folder_name}（{len(episodes)} 件, "
+                f"追加 {len(set(episodes) - set(current))}, 削除 {len(set(current) - set(episodes))}）")
+    return episodes
+
+# 全チャンネルのマニフェストをバケット全体の一覧（ページ単位で全件）から作り直し、
+# どのマニフェストからも参照されず、最も長い保存期間を過ぎた共有オブジェクトを削除する
+def reconcile_manifests(ctx):
+    config = ctx.config
+    r2_bucket = config['R2']['bucket']
+    folder_names = list(config['Playlists'])
+    listed = {}         # チャンネル -> {キー: サイズ}
+    shared_listed = {}  # 共有ストアのキー -> 更新日時
+    scanned = 0
+    with metrics.span("r2_list"):
+        for item in iter_r2_objects(ctx.r2_client, "", r2_bucket):
+            scanned += 1
+            folder_name = item['Key'].partition("/")[0]
+            if folder_name == SHARED_DIR:
+                shared_listed[item['Key']] = item.get('LastModified')
+            else:
+                listed.setdefault(folder_name, {})[item['Key']] = item['Size']
+    metrics.count("r2_objects_listed", scanned)
+
+    # 複数ノードで分担している場合は、他のノードが処理中のチャンネルは作り直さない
+    held = [folder_name for folder_name in folder_names if ctx.leases is None or ctx.leases.acquire(folder_name)]
+    referenced = set()
+    complete = True  # 全チャンネルの参照が分かったか（分からなければ共有オブジェクトは消さない）
+    deleted, orphans = [], []
+    try:
+        for folder_name in folder_names:
+            if folder_name in held:
+                episodes = reconcile_manifest(ctx, folder_name, listed.get(folder_name, {}), shared_listed)
+            else:
+                logger.info(f"⏭️ 他のノードが処理中のため作り直しません: {folder_name}")
+                episodes = ctx.manifests.load(folder_name)
+                if episodes is None:
+                    complete = False
+                    continue
+            referenced.update(entry["key"] for entry in episodes.values())
+        if not complete:
+            logger.warning("⚠️ マニフェストのないチャンネルがあるため、参照のない共有オブジェクトは削除しません")
+            shared_listed = {}
+
+        max_days = max((int(channel_setting(config, folder_name, 'r2_expire_days', '28')) for folder_name in folder_names),
+                       default=int(config['Settings'].get('r2_expire_days', '28')))
+        utc_now = datetime.now(timezone.utc)
+        orphans = [key for key, modified in shared_listed.items()
+                   if key not in referenced and modified and (utc_now - modified).days > max_days]
+        for key in orphans:
+            logger.info(f"🗑️ R2削除（参照のない共有オブジェクト）: {key}")
+        deleted = delete_many_from_r2(ctx.r2_client, orphans, r2_bucket) if orphans else []
+        remove_shared_objects(ctx, deleted)
+    finally:
+        release_channels(ctx, held)
+    logger.info(f"✅ マニフェスト再構築完了（走査 {scanned} 件, チャンネル {len(held)}/{len(folder_names)}, "
+                f"参照のない共有オブジェクト削除 {len(deleted)}/{len(orphans)} 件）")
+
+# 削除した共有オブジェクトのローカルのファイルと状態ストアの記録を消す
+def remove_shared_objects(ctx, object_keys):
+    local_paths = [os.path.join(shared_dir, os.path.basename(key)) for key in object_keys]
+    for local_path in local_paths:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+    ctx.state_store.delete_local_files([cache_path(local_path) for local_path in local_paths])
+    ctx.state_store.delete_shared_objects(object_keys)
+
+# 期限切れにするエピソード以外から参照されている共有オブジェクトのキー
+# （このノードが担当しないチャンネルのマニフェストも読む。読めないものがあれば None）
+def referenced_shared_keys(ctx, manifests, expired):
+    keys = set()
+    for folder_name in ctx.config['Playlists']:
+        episodes = manifests.get(folder_name)
+        if episodes is None:
+            try:
+                episodes = ctx.manifests.load(folder_name)
             except Exception as e:
-                logger.error(f"⚠️ R2ファイル削除エラー: {filename} - {e}")
+                logger.warning(f"⚠️ マニフェスト読み込み失敗: {folder_name} - {e}（共有オブジェクトの削除を見送ります）")
+                return None
+            if episodes is None and ctx.plan is not None:
+                # --plan でキャッシュがないチャンネルの参照は分からない
+                return None
+            episodes = episodes or {}
+        dropped = set(expired.get(folder_name, []))
+        keys.update(entry["key"] for filename, entry in episodes.items()
+                    if filename not in dropped and entry["key"].startswith(f"{SHARED_DIR}/"))
+    return keys
 
-    # RSS生成
-    logger.info(f"📄 feed.xml 生成: {folder_name}")
-    rss_items = []
+# R2の期限切れエピソードを各チャンネルのマニフェストの公開日で判定する
+# (マニフェスト, 期限切れのファイル名, 削除するキー, うち共有ストアのキー) を返す。
+# 共有ストアのオブジェクトは、どのチャンネルのマニフェストからも参照されなくなったときだけ削除する
+def find_r2_expired(ctx, folder_names):
+    config = ctx.config
+    today = datetime.now()
+
+    manifests = {}  # チャンネル -> エピソード
+    expired = {}    # チャンネル -> 期限切れのファイル名
+    for folder_name in folder_names:
+        expire_days = int(channel_setting(config, folder_name, 'r2_expire_days', '28'))
+        try:
+            episodes = channel_manifest(ctx, folder_name)
+        except Exception as e:
+            logger.error(f"⚠️ マニフェスト読み込み失敗: {folder_name} - {e}")
+            metrics.count("errors", stage="manifest", category="r2")
+            continue
+        if episodes is None:
+            continue
+        manifests[folder_name] = episodes
+        expired[folder_name] = [filename for filename, entry in episodes.items()
+                                if episode_age_days(entry, today) > expire_days]
+
+    channel_keys = []
+    dropped_shared = set()
+    for folder_name, filenames in expired.items():
+        for filename in filenames:
+            key = manifests[folder_name][filename]["key"]
+            if key.startswith(f"{SHARED_DIR}/"):
+                dropped_shared.add(key)
+            else:
+                channel_keys.append(key)
+    # 共有オブジェクトは、他のチャンネル（他のノードが担当するものを含む）のマニフェストに残っていれば削除しない
+    shared_keys = []
+    if dropped_shared:
+        still_referenced = referenced_shared_keys(ctx, manifests, expired)
+        if still_referenced is not None:
+            shared_keys = sorted(dropped_shared - still_referenced)
+    return manifests, expired, channel_keys + shared_keys, shared_keys
+
+# R2の期限切れファイル削除（バケットを一覧せず、各チャンネルのマニフェストから判定してまとめて削除）
+def sweep_r2_expired(ctx, folder_names):
+    r2_bucket = ctx.config['R2']['bucket']
+    folder_names = list(folder_names)
 
-    # 現在のディレクトリ内のMP3ファイルを日付順（新しい順）にソート
-    mp3_files = [f for f in os.listdir(output_dir) if f.endswith(".mp3")]
-    mp3_files.sort(reverse=True)  # 新しい順
+    logger.info(f"🧹 R2ファイル確認中（{len(folder_names)} チャンネルのマニフェストから期限切れを削除）")
+    manifests, expired, to_delete, shared_keys = find_r2_expired(ctx, folder_names)
+    for remote_path in to_delete:
+        logger.info(f"🗑️ R2削除: {remote_path}")
+    with metrics.span("r2_delete"):
+        deleted = set(delete_many_from_r2(ctx.r2_client, to_delete, r2_bucket)) if to_delete else set()
+    metrics.count("r2_objects_deleted", len(deleted))
+
+    # 削除できたエピソード（共有ストアの参照は、オブジェクトを残す場合も）をマニフェストと状態ストアから外す
+    failed = set(to_delete) - deleted
+    for folder_name, filenames in expired.items():
+        removed = [filename for filename in filenames if manifests[folder_name][filename]["key"] not in failed]
+        if not removed:
+            continue
+        try:
+            ctx.manifests.remove(folder_name, removed)
+        except Exception as e:
+            metrics.count("errors", stage="manifest", category="r2")
+            logger.error(f"⚠️ マニフェスト更新失敗: {folder_name} - {e}（次回の削除でやり直します）")
+            continue
+        ctx.state_store.delete_episodes(folder_name, removed)
+    deleted_shared = [key for key in shared_keys if key in deleted]
+    remove_shared_objects(ctx, deleted_shared)
+    logger.info(f"✅ R2期限切れ削除完了（マニフェスト {len(manifests)} 件, 削除 {len(deleted)}/{len(to_delete)} 件"
+                f"{f', うち共有ストア {len(deleted_shared)} 件' if deleted_shared else ''}）")
+
+# マニフェスト（R2に置いたエピソードの一覧）から (チャンネル情報, 新しい順のRSS項目) を作る
+# ローカルから削除したファイルやストリーミングしたものも、R2にある間は載る
+def build_program_feed(ctx, job, episodes):
+    config = ctx.config
+    folder_name = job.folder_name
+    durations = job.durations
+    public_base_url = config['R2']['public_base_url']
 
     max_rss_items = int(config['Settings'].get('max_rss_items', '30'))
+    r2_expire_days = int(channel_setting(config, folder_name, 'r2_expire_days', '28'))
+    today = datetime.now()
 
-    for filename in mp3_files:
+    rss_items = []
+    for filename, entry in sorted(episodes.items(), key=lambda item: (item[1]["upload_date"], item[0]), reverse=True):
         if len(rss_items) >= max_rss_items:
             break
-
+        if episode_age_days(entry, today) > r2_expire_days:
+            # 期限切れ削除を待っている
+            continue
         try:
-            base = os.path.splitext(filename)[0]
-            if "：" not in base:
-                continue
-
-            mmdd, raw_title = base.split("：", 1)
-            title = raw_title.strip()
-            today = datetime.strptime(mmdd, "%m-%d").replace(year=datetime.now().year)
-            pubdate = email.utils.format_datetime(today)
-            filepath = os.path.join(output_dir, filename)
-            filesize = os.path.getsize(filepath)
-            fileurl = f"{config['R2']['public_base_url']}/{folder_name}/{filename}"
-
-            duration_sec = durations.get(filename, 0)
-            h, m, s = duration_sec // 3600, (duration_sec % 3600) // 60, duration_sec % 60
-            duration_str = f"{h:02}:{m:02}:{s:02}"
-
-            item = f"""
-    <item>
-      <title>{title}</title>
-      <enclosure url=\"{fileurl}\" length=\"{filesize}\" type=\"audio/mpeg\" />
-      <guid>{fileurl}</guid>
-      <pubDate>{pubdate}</pubDate>
-      <itunes:duration>{duration_str}</itunes:duration>
-    </item>"""
-            rss_items.append(item)
-        except Exception as e:
+            pub_date = datetime.strptime(entry["upload_date"], "%Y%m%d")
+            rss_items.append(make_item(entry["title"], f"{public_base_url}/{entry['key']}", entry["size"],
+                                       mime_type_for(filename), pub_date,
+                                       entry["duration"] or durations.get(filename, 0)))
+        except (KeyError, ValueError) as e:
             logger.error(f"⚠️ RSS項目エラー: {filename} ({e})")
             continue
 
-    rss_feed = f"""<?xml version=\"1.0\" encoding=\"UTF-8\"?>
-<rss version=\"2.0\" xmlns:itunes=\"http://www.itunes.com/dtds/podcast-1.0.dtd\">
-  <channel>
-    <title>{display_name}</title>
-    <link>{config['R2']['public_base_url']}/{folder_name}/</link>
-    <description>{display_name} の音声Podcast</description>
-    <language>ja</language>
-    <itunes:category text="News"/>
-    <lastBuildDate>{email.utils.format_datetime(datetime.utcnow())}</lastBuildDate>
-    {''.join(rss_items)}
-  </channel>
-</rss>
-"""
+    channel = {
+        "title": job.display_name,
+        "link": f"{public_base_url}/{folder_name}/",
+        "description": f"{job.display_name} の音声Podcast",
+        "language": "ja",
+        "category": "News",
+    }
+    return channel, rss_items
+
+# RSS生成とR2へのアップロード（項目が前回から変わったときだけ）
+def write_program_feed(ctx, job):
+    config = ctx.config
+    folder_name = job.folder_name
+    public_base_url = config['R2']['public_base_url']
+    channel, rss_items = build_program_feed(ctx, job, channel_manifest(ctx, folder_name))
+
+    # 内容が前回アップロードしたものと同じなら書き出し・アップロードを省略
+    rss_path = os.path.join(job.output_dir, "feed.xml")
+    items_hash = feed_hash(channel, rss_items)
+    if ctx.state_store.get_feed_hash(folder_name) == items_hash and os.path.exists(rss_path):
+        logger.info(f"📄 feed.xml 変更なし（{len(rss_items)} 件）: {folder_name}")
+        ctx.state_store.mark_in_feed(folder_name)
+        return
 
-    # RSSファイルを保存
-    rss_path = os.path.join(output_dir, "feed.xml")
-    with open(rss_path, "w", encoding="utf-8") as f:
-        f.write(rss_feed)
+    # RSSファイルを保存（lastBuildDate は内容が変わったときだけ更新される）
+    logger.info(f"📄 feed.xml 生成: {folder_name}（{len(rss_items)} 件）")
+    with metrics.span("feed_build", folder_name):
+        write_feed(rss_path, channel, rss_items, datetime.now(timezone.utc))
     logger.info(f"✅ RSS生成完了: {folder_name}")
 
-    # RSSファイルをR2にアップロード
+    # RSSファイルをR2にアップロード（ポッドキャストアプリが条件付きリクエストで取得できるようにヘッダを付ける）
     logger.info(f"☁️ RSSをR2にアップロード中: {folder_name}/feed.xml")
     remote_feed_path = f"{folder_name}/feed.xml"
-    feed_upload_success = upload_to_r2(r2_client, rss_path, remote_feed_path, r2_bucket)
+    feed_cache_seconds = int(config['Settings'].get('feed_cache_seconds', '300'))
+    feed_upload_success = upload_to_r2(ctx.r2_client, rss_path, remote_feed_path, config['R2']['bucket'],
+                                       extra_args={
+                                           'ContentType': 'application/rss+xml; charset=utf-8',
+                                           'CacheControl': f'public, max-age={feed_cache_seconds}',
+                                       })
     if feed_upload_success:
+        # アップロードできたときだけハッシュを保存（失敗したら次回また送る）
+        ctx.state_store.set_feed_hash(folder_name, items_hash)
+        ctx.state_store.mark_in_feed(folder_name)
         logger.info(f"✅ RSSのR2アップロード完了: {remote_feed_path}")
         # RSSファイルのR2 URL（参考用に表示）
-        rss_url = f"{config['R2']['public_base_url']}/{remote_feed_path}"
+        rss_url = f"{public_base_url}/{remote_feed_path}"
         logger.info(f"📡 RSS URL: {rss_url}")
     else:
         logger.error(f"❌ RSSのR2アップロード失敗: {remote_feed_path}")
 
-    return folder_name
+# --plan: フィードが変わるかをキャッシュのマニフェストで判定する（ダウンロード予定があれば変わる）
+def plan_program_feed(ctx, job):
+    folder_name = job.folder_name
+    planned = ctx.plan.count("downloads", folder_name) + ctx.plan.count("uploads", folder_name)
+    episodes = ctx.manifests.load(folder_name)
+    if episodes is None:
+        ctx.plan.add("feeds", folder_name, "マニフェストのキャッシュなし（実行時にR2の一覧から作成）")
+        return
+    channel, rss_items = build_program_feed(ctx, job, episodes)
+    if planned:
+        ctx.plan.add("feeds", folder_name, f"新しいエピソード {planned} 件")
+    elif ctx.state_store.get_feed_hash(folder_name) != feed_hash(channel, rss_items):
+        ctx.plan.add("feeds", folder_name, f"項目の変化（期限切れ・メタデータ更新, {len(rss_items)} 件）")
+    elif not os.path.exists(os.path.join(job.output_dir, "feed.xml")):
+        ctx.plan.add("feeds", folder_name, "feed.xml がローカルにない")
+
+# --plan: R2の期限切れ削除の予定（キャッシュのマニフェストで判定する）
+def plan_r2_expired(ctx, folder_names):
+    _, _, to_delete, _ = find_r2_expired(ctx, list(folder_names))
+    for key in to_delete:
+        ctx.plan.add("expired", key.partition("/")[0], key)
+
+# --plan の結果を表示する
+def print_plan(ctx):
+    plan = ctx.plan
+    print("📋 実行計画（R2にはアクセスしていません。マニフェストはローカルのキャッシュで判定しています）")
+    if ctx.config['Settings'].get('lease_backend', 'off').strip().lower() not in ('', 'off'):
+        print("  ※ 複数ノードで分担中のため、担当に関係なく全チャンネルを表示しています")
+    print(f"⬇️ ダウンロード予定: {len(plan.downloads)} 件")
+    for folder_name, video in sorted(plan.downloads, key=lambda item: (item[0], item[1]["upload_date"])):
+        print(f"  {folder_name}: {video['basename']} [{video['video_id']}]")
+    print(f"☁️ 再送予定（ダウンロード済み・未アップロード）: {len(plan.uploads)} 件")
+    for folder_name, video in sorted(plan.uploads, key=lambda item: (item[0], item[1]["upload_date"])):
+        print(f"  {folder_name}: {video['basename']} [{video['video_id']}]")
+    print(f"🗑️ R2期限切れ削除予定: {len(plan.expired)} 件")
+    for _, key in sorted(plan.expired):
+        print(f"  {key}")
+    print(f"📄 フィード更新予定: {len(plan.feeds)} チャンネル")
+    for folder_name, reason in sorted(plan.feeds):
+        print(f"  {folder_name}: {reason}")
+
+# --plan: 一覧・メタデータだけを取得し、実行したら行う処理を表示する（R2にはアクセスせず、状態も進めない）
+def run_plan(config, state_store):
+    ctx = RunContext(config, None, state_store, plan=RunPlan())
+    install_signal_handlers(ctx.stopping)
+    try:
+        run_pipeline(ctx, dict(config['Playlists']))
+    finally:
+        ctx.shutdown()
+    if ctx.stopping.is_set():
+        return 130
+    plan_r2_expired(ctx, config['Playlists'].keys())
+    print_plan(ctx)
+    return 0
+
+# 設定から複数ノード分担用のリースの保存先を作る（lease_backend = off なら None）
+def create_lease_store(config, r2_client):
+    settings = config['Settings']
+    backend = settings.get('lease_backend', 'off').strip().lower()
+    if backend in ('', 'off'):
+        return None
+    node_id = settings.get('node_id', '').strip() or socket.gethostname()
+    options = {
+        "lease_seconds": int(settings.get('lease_seconds', '600')),
+        "node_timeout": float(settings.get('node_timeout_minutes', '90')) * 60,
+    }
+    if backend == 'r2':
+        return R2LeaseStore(r2_client, config['R2']['bucket'], node_id, **options)
+    if backend == 'dir':
+        lease_dir = settings.get('lease_dir', '').strip() or os.path.join(project_dir, "data", "leases")
+        return DirectoryLeaseStore(lease_dir, node_id, **options)
+    logger.error(f"❌ 不明な lease_backend: {backend}（off / r2 / dir）")
+    sys.exit(1)
+
+# このノードが受け持つチャンネル（生きているノードの間で振り分けたもの）のリースを取り、取れたものを返す
+# 他のノードから引き継いだチャンネルは、マニフェストからエピソードを取り込んでから処理する
+def acquire_channels(ctx, folder_names):
+    folder_names = list(folder_names)
+    if ctx.leases is None:
+        return folder_names
+    try:
+        assigned = ctx.leases.assign(folder_names)
+    except Exception as e:
+        logger.error(f"⚠️ ノード一覧の取得に失敗: {e}")
+        return []
+    held = []
+    for folder_name in assigned:
+        try:
+            lease = ctx.leases.acquire(folder_name)
+        except Exception as e:
+            logger.error(f"⚠️ リース取得に失敗: {folder_name} - {e}")
+            continue
+        if lease is None:
+            logger.info(f"⏭️ 他のノードが処理中: {folder_name}")
+            metrics.count("leases", result="busy")
+            continue
+        metrics.count("leases", result="acquired")
+        if lease.previous_owner not in (None, ctx.leases.node_id):
+            import_manifest_episodes(ctx, folder_name)
+        held.append(folder_name)
+    logger.info(f"🤝 担当チャンネル: {len(held)}/{len(folder_names)}（ノード {ctx.leases.node_id}）")
+    return held
+
+def release_channels(ctx, folder_names):
+    if ctx.leases:
+        for folder_name in folder_names:
+            ctx.leases.release(folder_name)
 
-def main():
+# 引き継いだチャンネルのマニフェストのエピソードを、このノードの状態ストアに取り込む
+# （前のノードがアップロードしたエピソードをダウンロードし直さないようにする）
+def import_manifest_episodes(ctx, folder_name):
+    try:
+        episodes = ctx.manifests.load(folder_name) or {}
+    except Exception as e:
+        logger.warning(f"⚠️ 引き継いだチャンネルのマニフェストを読めませんでした: {folder_name} - {e}")
+        return
+    known = ctx.state_store.get_episodes(folder_name)
+    imported = 0
+    for filename, entry in episodes.items():
+        object_key = entry["key"] if entry["key"].startswith(f"{SHARED_DIR}/") else None
+        if object_key and ctx.state_store.get_shared_object(object_key) is None:
+            ctx.state_store.put_shared_object(object_key, entry["video_id"], entry["size"], entry["duration"],
+                                              local=False, uploaded=True)
+        if filename in known:
+            continue
+        ctx.state_store.put_episode(folder_name, filename, entry["video_id"], entry["title"], entry["upload_date"],
+                                    entry["size"], entry["duration"], local=False, object_key=object_key)
+        imported += 1
+    logger.info(f"📥 引き継いだチャンネルのエピソードを取り込みました: {folder_name}（{imported}/{len(episodes)} 件）")
+
+# SIGINT / SIGTERM で新しい処理を止め、実行中の yt-dlp を終了させる（2回目は即時終了）
+def install_signal_handlers(stopping):
+    def handle(signum, frame):
+        if stopping.is_set():
+            raise KeyboardInterrupt
+        stopping.set()
+        terminated = terminate_active_processes()
+        logger.warning(f"🛑 {signal.Signals(signum).name} を受信: 新しい処理を止めて終了します"
+                       f"（実行中のプロセス {terminated} 件を停止）")
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+# 全番組をパイプラインに投入し、番組ごとの完了を待つ（ProgramJob のリストを返す）
+def run_pipeline(ctx, playlists):
+    jobs = []
+    for folder_name, playlist_url in playlists.items():
+        print(f"番組タスク追加: {folder_name}")
+        job = ProgramJob(ctx, folder_name, playlist_url)
+        jobs.append(job)
+        ctx.listing.submit(list_program, ctx, job, tracker=job.tracker)
+
+    # 完了を待機
+    print(f"全タスク投入完了、完了を待機中（タスク数: {len(jobs)}）...")
+    for future in concurrent.futures.as_completed([job.result for job in jobs]):
+        try:
+            folder_name = future.result()
+            if folder_name:
+                logger.info(f"✅ 番組処理完了: {folder_name}")
+                print(f"番組処理完了: {folder_name}")
+        except Exception as e:
+            error_msg = f"⚠️ 番組処理中にエラーが発生: {e}"
+            logger.error(error_msg)
+            print(error_msg)
+    return jobs
+
+# 番組の処理結果を (結果, ダウンロード件数, エラー) にまとめる
+def job_outcome(ctx, job):
+    if job.result.exception():
+        return "error", job.downloaded, str(job.result.exception())
+    if ctx.stopping.is_set():
+        return "interrupted", job.downloaded, None
+    if job.failed:
+        return "list_failed", 0, "動画一覧の取得に失敗"
+    return "ok", job.downloaded, None
+
+# プロセスの起動から import 完了・最初の子プロセス起動までの秒数（実行レポート用）
+def startup_times():
+    started = process_started_at()
+    if started is None:
+        return {"imports": None, "first_subprocess": None}
+    first = min(first_process_at.values()) if first_process_at else None
+    return {"imports": round(imported_at - started, 3),
+            "first_subprocess": round(first - started, 3) if first else None}
+
+# 実行レポート（段ごとの所要時間・カウンタ・チャンネルごとの結果）を JSON と Prometheus 形式で書き出す
+def write_run_report(ctx, jobs, status, started, processes_before):
+    settings = ctx.config['Settings']
+    finished = time.time()
+    subprocesses = {program: n - processes_before.get(program, 0)
+                    for program, n in sorted(process_counts.items()) if n - processes_before.get(program, 0)}
+    report = {
+        "run_id": ctx.run_id,
+        "status": status,
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "finished_at": datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+        "finished_at_unix": round(finished, 3),
+        "duration_seconds": round(finished - started, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "startup": startup_times(),
+        "metrics": metrics.snapshot(),
+        "subprocesses": subprocesses,
+        "channels": {},
+    }
+    for job in jobs:
+        result, downloaded, error = job_outcome(ctx, job)
+        report["channels"][job.folder_name] = {"result": result, "downloaded": downloaded, "error": error}
+
+    try:
+        keep = int(settings.get('run_report_keep', '100'))
+        if keep > 0:
+            os.makedirs(reports_dir, exist_ok=True)
+            stamp = datetime.fromtimestamp(finished).strftime('%Y%m%d-%H%M%S')
+            report_path = os.path.join(reports_dir, f"run-{stamp}-{ctx.run_id}.json")
+            write_json_report(report_path, report)
+            old_reports = sorted(glob.glob(os.path.join(reports_dir, "run-*.json")))[:-keep]
+            for old_path in old_reports:
+                os.remove(old_path)
+            logger.info(f"📈 実行レポート: {report_path}")
+        textfile = settings.get('metrics_textfile', '').strip()
+        if textfile:
+            write_prometheus_textfile(textfile, report)
+    except OSError as e:
+        logger.error(f"⚠️ 実行レポートの書き出しに失敗: {e}")
+    return report
+
+# --profile の結果を保存し、時間のかかった関数を表示する
+def dump_profile(profiler):
+    os.makedirs(reports_dir, exist_ok=True)
+    profile_path = os.path.join(reports_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+    stats = profiler.dump(profile_path)
+    if stats is None:
+        return
+    stats.sort_stats("cumulative").print_stats(15)
+    logger.info(f"🔬 プロファイル: {profile_path}（詳細: python -m pstats {profile_path}）")
+
+# チャンネルごとの確認間隔（秒）
+def poll_intervals(config):
+    return {
+        folder_name: float(channel_setting(config, folder_name, 'poll_interval_minutes', '60')) * 60
+        for folder_name in config['Playlists']
+    }
+
+# 設定値から yt-dlp 実行エンジンを作る
+def create_configured_engine(config):
+    return create_engine(
+        config['Settings'].get('yt_dlp_backend', 'subprocess'),
+        workers=int(config['Settings'].get('yt_dlp_library_workers', '4')),
+        logger=logger,
+    )
+
+# デーモンモードの1巡：確認時刻になったチャンネルだけをパイプラインで処理する
+def run_daemon_cycle(ctx, scheduler, due):
+    metrics.reset()
+    started = time.time()
+    processes_before = dict(process_counts)
+    ctx.run_id, ctx.resumed = ctx.state_store.begin_run()
+    logger.info(f"⏰ 巡回開始 #{ctx.run_id}: {', '.join(due)}")
+    held = acquire_channels(ctx, due)
+    for folder_name in due:
+        scheduler.started(folder_name)
+        if folder_name not in held:
+            scheduler.finished(folder_name, "other_node")
+    jobs = run_pipeline(ctx, {folder_name: ctx.config['Playlists'][folder_name] for folder_name in held})
+    for job in jobs:
+        result, downloaded, error = job_outcome(ctx, job)
+        scheduler.finished(job.folder_name, result, downloaded, error)
+    scheduler.cycles += 1
+    if not ctx.stopping.is_set():
+        evict_local_cache(ctx, ctx.config['Playlists'].keys())
+    release_channels(ctx, held)
+    status = RUN_INTERRUPTED if ctx.stopping.is_set() else RUN_FINISHED
+    ctx.state_store.finish_run(ctx.run_id, status)
+    write_run_report(ctx, jobs, status, started, processes_before)
+
+# デーモンモード：R2クライアント・yt-dlpワーカー・各段のスレッドを保ったまま、
+# チャンネルごとの確認間隔で巡回し、config.ini の変更を再起動なしで反映する
+def run_daemon(config, state_store):
+    global yt_dlp_engine, yt_dlp_limiter, r2_transfer_config
+    config_path = os.path.join(script_dir, 'config.ini')
+    status_path = os.path.join(project_dir, "data", "status.json")
+    stopping = threading.Event()
+    install_signal_handlers(stopping)
+
+    def settings_of(config):
+        settings = config['Settings']
+        return (float(settings.get('poll_jitter_percent', '10')) / 100,
+                float(settings.get('sweep_interval_minutes', '60')) * 60,
+                float(settings.get('config_check_seconds', '30')),
+                int(settings.get('status_port', '0')))
+
+    jitter, sweep_interval, config_check, status_port = settings_of(config)
+    scheduler = ChannelScheduler(jitter)
+    scheduler.configure(poll_intervals(config))
+    scheduler.restore(read_status(status_path))
+
+    yt_dlp_engine = create_configured_engine(config)
+    r2_transfer_config = create_transfer_config(config)
+    r2_client = lazy_r2_client(config)
+    # リースの設定（lease_*, node_*）は起動時に読み、変更は再起動で反映する
+    leases = create_lease_store(config, r2_client)
+    if leases:
+        leases.start()
+    ctx = RunContext(config, r2_client, state_store, stopping=stopping, leases=leases)
+    server = start_status_server(status_port, scheduler.status) if status_port else None
+    config_mtime = os.path.getmtime(config_path)
+    last_sweep = 0.0
+    logger.info(f"🛰️ デーモンモード開始（{len(config['Playlists'])} チャンネル, バックエンド {yt_dlp_engine.name}"
+                f"{f', 状態 http://127.0.0.1:{status_port}/' if server else ''}）")
+
+    try:
+        while not stopping.is_set():
+            switch_daily_log_file()
+
+            # config.ini が変わっていれば読み直す（巡回の合間なので各段は空いている）
+            mtime = os.path.getmtime(config_path)
+            if mtime != config_mtime:
+                config_mtime = mtime
+                try:
+                    new_config = load_config()
+                except SystemExit:
+                    logger.error("❌ config.ini の再読み込みに失敗しました（前の設定で継続します）")
+                    new_config = None
+                if new_config is not None:
+                    if dict(new_config['R2']) != dict(ctx.config['R2']):
+                        r2_client = lazy_r2_client(new_config)
+                    engine_changed = any(new_config['Settings'].get(key) != ctx.config['Settings'].get(key)
+                                         for key in ('yt_dlp_backend', 'yt_dlp_library_workers'))
+                    yt_dlp_limiter = create_limiter(new_config)
+                    r2_transfer_config = create_transfer_config(new_config)
+                    ctx.shutdown()
+                    if engine_changed:
+                        # library のワーカーは各段・リース延長・状態サーバーのスレッドをすべて止めてから fork し直す
+                        # （他のスレッドがロックを持ったまま fork するとワーカーが固まることがある）
+                        if leases:
+                            leases.stop()
+                        if server:
+                            server.shutdown()
+                            server.server_close()
+                        yt_dlp_engine.close()
+                        yt_dlp_engine = create_configured_engine(new_config)
+                        if leases:
+                            leases.start()
+                        if server:
+                            server = start_status_server(status_port, scheduler.status)
+                    ctx = RunContext(new_config, r2_client, state_store, stopping=stopping, leases=leases)
+                    jitter, sweep_interval, config_check, _ = settings_of(new_config)
+                    scheduler.jitter = jitter
+                    scheduler.configure(poll_intervals(new_config))
+                    logger.info(f"🔄 config.ini を再読み込みしました（{len(new_config['Playlists'])} チャンネル）")
+
+            due = scheduler.due()
+            if due:
+                run_daemon_cycle(ctx, scheduler, due)
+                if not stopping.is_set() and time.time() - last_sweep >= sweep_interval:
+                    held = acquire_channels(ctx, ctx.config['Playlists'].keys())
+                    sweep_r2_expired(ctx, held)
+                    release_channels(ctx, held)
+                    last_sweep = time.time()
+            write_status(status_path, scheduler.status())
+
+            # 次の確認時刻まで待つ（設定変更の確認のため config_check_seconds ごとに起きる）
+            wait = min(scheduler.next_wakeup() - time.time(), config_check)
+            if wait > 0:
+                stopping.wait(wait)
+    finally:
+        ctx.shutdown()
+        if leases:
+            leases.stop()
+        if server:
+            server.shutdown()
+        write_status(status_path, scheduler.status())
+
+    logger.info("🛑 デーモンモードを終了しました")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube→ポッドキャスト変換")
+    parser.add_argument("--rebuild-metadata-cache", action="store_true",
+                        help="動画メタデータキャッシュを破棄してから実行する（全件 yt-dlp -J で再取得）")
+    parser.add_argument("--verify-durations", action="store_true",
+                        help="長さインデックスを全ファイルのffprobeで検証・更新して終了する")
+    parser.add_argument("--rebuild-durations", action="store_true",
+                        help="長さインデックスを破棄して全ファイルをffprobeし直して終了する")
+    parser.add_argument("--reset-scan-state", action="store_true",
+                        help="差分走査のハイウォーターマークを破棄してから実行する")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常駐してチャンネルごとの確認間隔で巡回する（config.ini の変更は自動で反映）")
+    parser.add_argument("--show-negative-cache", action="store_true",
+                        help="ネガティブキャッシュ（非公開・削除・プレミア待ちの動画）を表示して終了する")
+    parser.add_argument("--purge-negative-cache", nargs="?", const="all", metavar="CATEGORY",
+                        choices=["all", *NEGATIVE_CACHE_HOURS],
+                        help="ネガティブキャッシュを削除して終了する（分類を指定するとその分類のみ）")
+    parser.add_argument("--show-shared-store", action="store_true",
+                        help="共有ストアのオブジェクトと重複排除で省略した量を表示して終了する")
+    parser.add_argument("--plan", action="store_true",
+                        help="一覧・メタデータだけを取得し、ダウンロード・R2の期限切れ削除・フィード更新の予定を表示して終了する（R2にはアクセスしない）")
+    parser.add_argument("--reconcile-manifests", action="store_true",
+                        help="バケットの一覧から全チャンネルのマニフェストを作り直し、参照のない共有オブジェクトを削除して終了する")
+    parser.add_argument("--profile", action="store_true",
+                        help="各段のスレッドで cProfile を取り、data/reports/profile-*.pstats に保存する")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    leases = None
     try:
         # 最初のログ出力前にプリントを追加
         print("スクリプト実行開始: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
@@ -475,18 +2168,78 @@ def main():
         config = load_config()
         print("設定ファイル読み込み完了")
 
-        # 設定から並列処理数を読み込み
-        max_workers = int(config['Settings'].get('max_workers', '3'))
-        max_yt_dlp = int(config['Settings'].get('max_yt_dlp_processes', '2'))
+        # yt-dlpの同時実行数リミッターを設定（min〜max の範囲で適応的に調整）
+        global yt_dlp_limiter
+        yt_dlp_limiter = create_limiter(config)
+
+        # 状態ストアを開き、期限切れのメタデータを掃除
+        # --plan ではメモリ上の複製を使い、キャッシュ・判定・ネガティブキャッシュなどを書き換えない
+        state_store = open_state_store(snapshot=args.plan)
+        metadata_cache_days = int(config['Settings'].get('metadata_cache_days', '30'))
+        if args.rebuild_metadata_cache:
+            purged = state_store.purge_videos()
+            logger.info(f"🧹 メタデータキャッシュを再構築します（{purged} 件削除）")
+        elif metadata_cache_days > 0:
+            purged = state_store.purge_videos(older_than_days=metadata_cache_days)
+            if purged:
+                logger.info(f"🧹 期限切れメタデータを削除: {purged} 件")
+        logger.info(f"🗃️ メタデータキャッシュ: {state_store.count_videos()} 件")
+        if args.reset_scan_state:
+            reset = state_store.reset_high_water()
+            logger.info(f"🧹 差分走査の状態を破棄しました（{reset} チャンネル）")
+
+        # ネガティブキャッシュの表示・削除のみ行う場合
+        if args.show_negative_cache:
+            show_negative_cache(state_store)
+            return 0
+        if args.show_shared_store:
+            show_shared_store(state_store)
+            return 0
+        if args.purge_negative_cache:
+            category = None if args.purge_negative_cache == "all" else args.purge_negative_cache
+            purged = state_store.purge_negative(category=category)
+            logger.info(f"🧹 ネガティブキャッシュを削除しました（{purged} 件）")
+            return 0
+        purged = state_store.purge_negative(expired_only=True)
+        if purged:
+            logger.info(f"🧹 期限切れのネガティブキャッシュを削除: {purged} 件")
+
+        # 長さインデックスの検証・再構築のみ行う場合
+        if args.verify_durations or args.rebuild_durations:
+            verify_duration_index(config, state_store, rebuild=args.rebuild_durations)
+            return 0
+
+        # デーモンモード（終了まで戻らない）
+        if args.daemon:
+            return run_daemon(config, state_store)
+
+        # yt-dlp実行エンジン（library はスレッド起動前にワーカープロセスを fork する）
+        global yt_dlp_engine
+        yt_dlp_engine = create_configured_engine(config)
+        logger.info(f"⚙️ yt-dlpバックエンド: {yt_dlp_engine.name}")
 
-        # yt-dlpの同時実行数制限用セマフォを設定
-        global yt_dlp_semaphore
-        yt_dlp_semaphore = threading.Semaphore(max_yt_dlp)
+        # 実行計画の表示のみ行う場合（R2にはアクセスしない）
+        if args.plan:
+            return run_plan(config, state_store)
 
-        # R2クライアント初期化
-        print("R2クライアント初期化開始...")
-        r2_client = init_r2_client(config)
-        print("R2クライアント初期化完了")
+        # R2クライアントは最初にR2へアクセスするときに作る（新しい動画も期限切れもない実行では作らない）
+        global r2_transfer_config
+        r2_transfer_config = create_transfer_config(config)
+        r2_client = lazy_r2_client(config)
+
+        # 複数ノードで分担する場合は、このノードが受け持つチャンネルのリースを実行中ずっと保つ
+        leases = create_lease_store(config, r2_client)
+        if leases:
+            leases.start()
+
+        # マニフェストの作り直しのみ行う場合
+        if args.reconcile_manifests:
+            ctx = RunContext(config, r2_client, state_store, leases=leases)
+            try:
+                reconcile_manifests(ctx)
+            finally:
+                ctx.shutdown()
+            return 0
 
         # 設定からチャンネルとプレイリスト情報を取得
         channels = dict(config['Channels'].items())
@@ -494,30 +2247,52 @@ def main():
         print(f"処理対象チャンネル数: {len(channels)}")
         print(f"処理対象プレイリスト数: {len(playlists)}")
 
-        # 並列処理で各番組を処理
-        print(f"並列処理開始（最大ワーカー数: {max_workers}）...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for folder_name, playlist_url in playlists.items():
-                print(f"番組タスク追加: {folder_name}")
-                futures.append(executor.submit(process_program, (folder_name, playlist_url, config, r2_client)))
+        # 作業ジャーナルを開始（前回の実行が中断していればその続きから）
+        run_id, resumed = state_store.begin_run()
+        if resumed:
+            summary = ", ".join(f"{state} {count}" for state, count in state_store.journal_summary(run_id).items())
+            logger.info(f"♻️ 中断した実行 #{run_id} を再開します（{summary or '記録なし'}）")
+
+        # 段階別パイプラインで全番組を処理（一覧・メタデータ・ダウンロード・アップロード）
+        profiler = ThreadProfiler() if args.profile else None
+        ctx = RunContext(config, r2_client, state_store, run_id, resumed,
+                         task_context=profiler.task if profiler else None, leases=leases)
+        playlists = {folder_name: playlists[folder_name] for folder_name in acquire_channels(ctx, playlists)}
+        install_signal_handlers(ctx.stopping)
+        if profiler:
+            logger.info(f"🔬 プロファイル取得中（外部から見る場合: py-spy dump --pid {os.getpid()}）")
+        print(f"並列処理開始（一覧 {ctx.listing.workers} / メタデータ {ctx.metadata.workers} / "
+              f"ダウンロード {ctx.download.workers} / アップロード {ctx.upload.workers}）...")
+        metrics.reset()
+        started = time.time()
+        processes_before = dict(process_counts)
+        try:
+            jobs = run_pipeline(ctx, playlists)
+        finally:
+            ctx.shutdown()
+
+        if ctx.stopping.is_set():
+            state_store.finish_run(run_id, RUN_INTERRUPTED)
+            write_run_report(ctx, jobs, RUN_INTERRUPTED, started, processes_before)
+            logger.warning(f"🛑 中断しました（実行 #{run_id}）。次回の実行で続きから再開します")
+            return 130
+
+        # R2の期限切れファイルはマニフェストから判定してまとめて削除
+        sweep_r2_expired(ctx, playlists.keys())
+        evict_local_cache(ctx, playlists.keys())
+        if not r2_client.created:
+            logger.info("💤 R2への変更はありませんでした（R2クライアントを作らずに終了）")
+        state_store.finish_run(run_id)
+        write_run_report(ctx, jobs, RUN_FINISHED, started, processes_before)
+        if profiler:
+            dump_profile(profiler)
 
-            # 完了を待機
-            print(f"全タスク投入完了、完了を待機中（タスク数: {len(futures)}）...")
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    folder_name = future.result()
-                    if folder_name:
-                        logger.info(f"✅ 番組処理完了: {folder_name}")
-                        print(f"番組処理完了: {folder_name}")
-                except Exception as e:
-                    error_msg = f"⚠️ 番組処理中にエラーが発生: {e}"
-                    logger.error(error_msg)
-                    print(error_msg)
-        
         print("全ての並列処理が完了しました")
         logger.info("🎉 全処理完了！")
 
+    except KeyboardInterrupt:
+        logger.warning("🛑 強制終了しました。次回の実行で続きから再開します")
+        return 130
     except Exception as e:
         error_message = f"❌ 致命的エラー: {str(e)}"
         print(error_message)  # 標準出力に出力
@@ -535,6 +2310,11 @@ def main():
             print(f"ログ記録中にさらにエラー発生: {str(log_error)}")
         
         return 1
+    finally:
+        # 常駐ワーカー（library バックエンド）を停止し、リースを手放す
+        yt_dlp_engine.close()
+        if leases:
+            leases.stop()
 
     return 0
 
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+yt-dlp → ffmpeg → R2 のストリーミングアップロード
+----------------------------------------
+ローカルディスクに音声ファイルを置かずに、yt-dlp の出力を ffmpeg でパイプ変換し、
+パートサイズごとに区切って R2 のマルチパートアップロードへ直接送る。
+メモリ使用量は「パートサイズ ×（同時送信パート数 + 1）」に収まる。
+サイズとMD5は送信しながら数え、長さは ffmpeg の進捗出力から取得する。
+"""
+
+import concurrent.futures
+import hashlib
+import os
+import re
+import subprocess
+import threading
+
+from audio_formats import stream_codec_args, stream_format
+from ytdlp_engine import YtDlpError, forget_process, start_process
+
+# R2（S3互換）のマルチパートは最後以外のパートが5MB以上必要
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class StreamUploadError(Exception):
+    """ffmpeg やアップロードの失敗"""
+
+
+class StreamResult:
+    def __init__(self, size, duration, md5_hex):
+        self.size = size
+        self.duration = duration
+        self.md5_hex = md5_hex
+
+
+class _TailReader(threading.Thread):
+    """パイプの stderr を読み続け、末尾だけを保持する（パイプ詰まり防止）"""
+
+    def __init__(self, stream, limit=65536):
+        super().__init__(daemon=True)
+        self._stream = stream
+        self._limit = limit
+        self.data = b""
+
+    def run(self):
+        for chunk in iter(lambda: self._stream.read(4096), b""):
+            self.data = (self.data + chunk)[-self._limit:]
+
+    def text(self):
+        return self.data.decode("utf-8", errors="replace")
+
+
+def _read_exact(stream, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            break
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _parse_ffmpeg_duration(stderr_text):
+    """ffmpeg の進捗出力の最後の time=HH:MM:SS.xx から長さ（秒）を求める"""
+    matches = re.findall(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)", stderr_text)
+    if not matches:
+        return None
+    h, m, s = matches[-1]
+    return int(int(h) * 3600 + int(m) * 60 + float(s))
+
+
+def stream_audio_to_r2(client, bucket, key, url, mode, ffmpeg_path,
+                       part_size=16 * 1024 * 1024, concurrency=4,
+                       extra_args=None, local_path=None):
+    """動画の音声を変換しながら R2 にマルチパートアップロードする
+
+    local_path を指定した場合は同じ内容をローカルにも保存する（完了時に置き換え）。
+    yt-dlp の失敗は YtDlpError、それ以外の失敗は StreamUploadError を送出する。
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    ytdlp_cmd = ["yt-dlp", "--no-progress", "-f", stream_format(mode), "-o", "-", url]
+    ffmpeg_cmd = [os.path.join(ffmpeg_path, "ffmpeg"), "-hide_banner", "-nostdin",
+                  "-i", "pipe:0", "-vn", *stream_codec_args(mode), "pipe:1"]
+
+    # アップロードの開始と一時ファイルの作成はプロセスを起動する前に行う
+    # （プロセスの起動以降の失敗は、下の try でプロセス・アップロード・一時ファイルを片付ける）
+    args = {'ACL': 'public-read'}
+    args.update(extra_args or {})
+    try:
+        upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **args)['UploadId']
+    except Exception as e:
+        raise StreamUploadError(str(e)) from e
+
+    local_tmp = f"{local_path}.part" if local_path else None
+    try:
+        local_file = open(local_tmp, "wb") if local_tmp else None
+    except OSError as e:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass
+        raise StreamUploadError(str(e)) from e
+
+    source = encoder = None
+    md5 = hashlib.md5()
+    size = 0
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def upload_part(number, body):
+        try:
+            response = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                          PartNumber=number, Body=body)
+            return {'PartNumber': number, 'ETag': response['ETag']}
+        finally:
+            slots.release()
+
+    try:
+        source = start_process(ytdlp_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        encoder = start_process(ffmpeg_cmd, stdin=source.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        source.stdout.close()  # yt-dlp の出力は ffmpeg だけが読む
+        source_err = _TailReader(source.stderr)
+        encoder_err = _TailReader(encoder.stderr)
+        source_err.start()
+        encoder_err.start()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            while True:
+                chunk = _read_exact(encoder.stdout, part_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                md5.update(chunk)
+                if local_file:
+                    local_file.write(chunk)
+                slots.acquire()  # 送信中のパートが上限に達したら読み込みを待つ
+                futures.append(executor.submit(upload_part, len(futures) + 1, chunk))
+            parts = [future.result() for future in futures]
+
+        encoder.wait()
+        source.wait()
+        source_err.join()
+        encoder_err.join()
+        if source.returncode != 0:
+            raise YtDlpError(source_err.text())
+        if encoder.returncode != 0 or size == 0:
+            raise StreamUploadError(f"ffmpeg失敗（終了コード {encoder.returncode}, {size} バイト）: "
+                                    f"{encoder_err.text()[-500:]}")
+
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={'Parts': parts})
+    except BaseException as e:
+        for proc in (source, encoder):
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass
+        if local_file:
+            local_file.close()
+            os.remove(local_tmp)
+            local_file = None
+        if isinstance(e, (YtDlpError, StreamUploadError, KeyboardInterrupt, SystemExit)):
+            raise
+        raise StreamUploadError(str(e)) from e
+    finally:
+        if local_file:
+            local_file.close()
+        for proc in (source, encoder):
+            if proc is not None:
+                forget_process(proc)
+
+    if local_tmp:
+        os.replace(local_tmp, local_path)
+    return StreamResult(size, _parse_ffmpeg_duration(encoder_err.text()), md5.hexdigest())
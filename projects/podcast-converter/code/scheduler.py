@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+デーモンモードのチャンネル巡回スケジュール
+----------------------------------------
+チャンネルごとの確認間隔（±ゆらぎ付き）で次回の確認時刻を決め、
+各チャンネルの次回確認時刻・前回の結果を状態ファイル（JSON）と
+ローカルのHTTPエンドポイントで見られるようにする。
+"""
+
+import http.server
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds") if timestamp else None
+
+
+def _parse_iso(text):
+    return datetime.fromisoformat(text).timestamp() if text else None
+
+
+class ChannelState:
+    def __init__(self, folder, interval):
+        self.folder = folder
+        self.interval = interval
+        self.next_due = 0.0
+        self.last_started = None
+        self.last_finished = None
+        self.last_result = None
+        self.last_downloaded = None
+        self.last_error = None
+
+
+class ChannelScheduler:
+    """チャンネルごとの確認間隔で、確認すべきチャンネルを返す"""
+
+    def __init__(self, jitter=0.1, rng=None):
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._channels = {}
+        self.started_at = time.time()
+        self.config_loaded_at = None
+        self.cycles = 0
+
+    def _next_due(self, started, interval):
+        return started + interval * (1 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def configure(self, intervals, now=None):
+        """{フォルダ名: 間隔（秒）} に合わせてチャンネルを追加・削除・更新する"""
+        now = now or time.time()
+        with self._lock:
+            for folder in list(self._channels):
+                if folder not in intervals:
+                    del self._channels[folder]
+            for folder, interval in intervals.items():
+                state = self._channels.get(folder)
+                if state is None:
+                    state = self._channels[folder] = ChannelState(folder, interval)
+                    # 起動直後に全チャンネルが同時に動かないよう少しずらす
+                    state.next_due = now + self._rng.uniform(0, min(interval * self.jitter, 60))
+                elif state.interval != interval:
+                    state.interval = interval
+                    if state.last_started:
+                        state.next_due = self._next_due(state.last_started, interval)
+            self.config_loaded_at = now
+
+    def restore(self, status):
+        """前回の状態ファイルから前回の確認時刻・結果を引き継ぐ（configure の後に呼ぶ）"""
+        with self._lock:
+            for folder, saved in (status or {}).get("channels", {}).items():
+                state = self._channels.get(folder)
+                if state is None:
+                    continue
+                try:
+                    state.last_started = _parse_iso(saved.get("last_poll"))
+                    state.last_finished = _parse_iso(saved.get("last_finished"))
+                except ValueError:
+                    continue
+                state.last_result = saved.get("last_result")
+                state.last_downloaded = saved.get("last_downloaded")
+                state.last_error = saved.get("last_error")
+                if state.last_started:
+                    state.next_due = max(state.next_due, self._next_due(state.last_started, state.interval))
+
+    def due(self, now=None):
+        """確認時刻を過ぎたチャンネルを、期限の古い順に返す"""
+        now = now or time.time()
+        with self._lock:
+            states = sorted((s for s in self._channels.values() if s.next_due <= now), key=lambda s: s.next_due)
+            return [s.folder for s in states]
+
+    def started(self, folder, now=None):
+        now = now or time.time()
+        with self._lock:
+            state = self._channels[folder]
+            state.last_started = now
+            state.next_due = self._next_due(now, state.interval)
+
+    def finished(self, folder, result, downloaded=None, error=None, now=None):
+        with self._lock:
+            state = self._channels.get(folder)
+            if state is None:
+                return
+            state.last_finished = now or time.time()
+            state.last_result = result
+            state.last_downloaded = downloaded
+            state.last_error = error
+
+    def next_wakeup(self):
+        with self._lock:
+            return min((s.next_due for s in self._channels.values()), default=time.time() + 60)
+
+    def status(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "started_at": _iso(self.started_at),
+                "updated_at": _iso(time.time()),
+                "config_loaded_at": _iso(self.config_loaded_at),
+                "cycles": self.cycles,
+                "channels": {
+                    s.folder: {
+                        "interval_minutes": round(s.interval / 60, 1),
+                        "next_poll": _iso(s.next_due),
+                        "last_poll": _iso(s.last_started),
+                        "last_finished": _iso(s.last_finished),
+                        "last_result": s.last_result,
+                        "last_downloaded": s.last_downloaded,
+                        "last_error": s.last_error,
+                    }
+                    for s in sorted(self._channels.values(), key=lambda s: s.next_due)
+                },
+            }
+
+
+def read_status(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_status(path, status):
+    """状態ファイルを一時ファイルに書き出してから置き換える"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_status_server(port, get_status, host="127.0.0.1"):
+    """GET で状態をJSONで返すHTTPサーバーをバックグラウンドで起動する"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(get_status(), ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="status-server", daemon=True).start()
+    return server
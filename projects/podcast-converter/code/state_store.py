@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+ローカル状態ストア
+----------------------------------------
+実行をまたいで保持したい情報を data/state.db（SQLite）に保存する。
+- videos: 動画IDごとのメタデータ（タイトル・公開日・長さ）と判定結果
+- durations: 音声ファイルの長さインデックス（ファイル名・サイズ・更新時刻で鮮度判定）
+- channels: チャンネルごとの走査済み最新動画（ハイウォーターマーク）
+- feeds: チャンネルごとに最後にアップロードした feed.xml の内容ハッシュ
+- episodes: ダウンロードしたエピソード（ストリーミングでローカルに残さない場合もRSSを作れるよう、
+  R2上のファイル名・サイズ・長さを記録する）。共有ストアを使うチャンネルでは共有オブジェクトへの参照になる
+- shared_objects / shared_stats: 動画IDごとに1つだけ保存する共有ストアの音声と、重複排除で節約した
+  ダウンロード数・バイト数の累計。参照（episodes）がなくなったオブジェクトを削除する
+- local_files: ローカルに置いている音声ファイル（全チャンネル・共有ストア）のサイズ・公開日・
+  アップロード済みか・最後に使った時刻。容量の上限を超えたら使っていない順に削除する
+- negative: 取得に失敗した動画（非公開・削除・プレミア公開待ちなど）を期限付きで記録し、
+  期限までは yt-dlp を呼ばずにスキップする
+- runs / journal: 実行ごとの作業ジャーナル。動画ごとの進捗（一覧取得済み → メタデータ取得済み →
+  ダウンロード中 → ダウンロード済み → アップロード済み → フィード反映済み）を記録し、
+  中断した実行を次回続きから再開できるようにする
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+# 動画ごとの判定結果
+DECISION_DOWNLOADED = "downloaded"      # ダウンロード済み
+DECISION_EXISTS = "exists"              # ローカルに既存
+DECISION_TOO_OLD = "too_old"            # look_back_days より古い
+DECISION_OUT_OF_RANGE = "out_of_range"  # 長さ条件外
+DECISION_FAILED = "download_failed"     # ダウンロード失敗（次回再試行）
+DECISION_REMOVED = "removed"            # 削除済み（再試行しない）
+
+# 作業ジャーナルの動画ごとの状態（この順に進む）
+JOURNAL_LISTED = "listed"
+JOURNAL_METADATA = "metadata"
+JOURNAL_DOWNLOADING = "downloading"
+JOURNAL_DOWNLOADED = "downloaded"
+JOURNAL_UPLOADED = "uploaded"
+JOURNAL_IN_FEED = "in_feed"
+
+# 実行の状態
+RUN_RUNNING = "running"
+RUN_INTERRUPTED = "interrupted"
+RUN_FINISHED = "finished"
+
+
+class StateStore:
+    """SQLiteの状態ストア（複数スレッドから共有して使う）
+
+    snapshot=True ならファイルを読み取り専用で開いてメモリ上に複製し、以後の書き込みは
+    その複製にだけ行う（--plan 用。閉じると捨てられ、state.db は変わらない）。
+    """
+
+    def __init__(self, db_path, snapshot=False):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if snapshot:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            if os.path.exists(db_path):
+                uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+                source = sqlite3.connect(uri, uri=True)
+                try:
+                    source.backup(self._conn)
+                finally:
+                    source.close()
+        else:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id    TEXT PRIMARY KEY,
+                    title       TEXT NOT NULL,
+                    upload_date TEXT NOT NULL,
+                    duration    INTEGER NOT NULL,
+                    decision    TEXT,
+                    fetched_at  REAL NOT NULL,
+                    updated_at  REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS durations (
+                    folder     TEXT NOT NULL,
+                    filename   TEXT NOT NULL,
+                    size       INTEGER NOT NULL,
+                    mtime_ns   INTEGER NOT NULL,
+                    duration   INTEGER NOT NULL,
+                    probed_at  REAL NOT NULL,
+                    PRIMARY KEY (folder, filename)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS channels (
+                    folder        TEXT PRIMARY KEY,
+                    last_video_id TEXT,
+                    last_date     TEXT,
+                    updated_at    REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS feeds (
+                    folder      TEXT PRIMARY KEY,
+                    items_hash  TEXT NOT NULL,
+                    updated_at  REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS episodes (
+                    folder      TEXT NOT NULL,
+                    filename    TEXT NOT NULL,
+                    video_id    TEXT NOT NULL,
+                    title       TEXT NOT NULL,
+                    upload_date TEXT NOT NULL,
+                    size        INTEGER NOT NULL,
+                    duration    INTEGER NOT NULL,
+                    local       INTEGER NOT NULL,
+                    created_at  REAL NOT NULL,
+                    PRIMARY KEY (folder, filename)
+                )
+            """)
+            self._add_column("episodes", "object_key", "TEXT")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_objects (
+                    object_key  TEXT PRIMARY KEY,
+                    video_id    TEXT NOT NULL,
+                    size        INTEGER NOT NULL,
+                    duration    INTEGER NOT NULL,
+                    local       INTEGER NOT NULL,
+                    uploaded    INTEGER NOT NULL,
+                    hits        INTEGER NOT NULL DEFAULT 0,
+                    created_at  REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_stats (
+                    name   TEXT PRIMARY KEY,
+                    value  INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS local_files (
+                    path        TEXT PRIMARY KEY,
+                    folder      TEXT NOT NULL,
+                    size        INTEGER NOT NULL,
+                    published   TEXT NOT NULL,
+                    uploaded    INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    created_at  REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS negative (
+                    video_id    TEXT PRIMARY KEY,
+                    folder      TEXT NOT NULL,
+                    category    TEXT NOT NULL,
+                    reason      TEXT NOT NULL,
+                    failures    INTEGER NOT NULL,
+                    expires_at  REAL NOT NULL,
+                    created_at  REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status      TEXT NOT NULL,
+                    started_at  REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    folder      TEXT NOT NULL,
+                    video_id    TEXT NOT NULL,
+                    run_id      INTEGER NOT NULL,
+                    position    INTEGER NOT NULL,
+                    state       TEXT NOT NULL,
+                    data        TEXT,
+                    updated_at  REAL NOT NULL,
+                    PRIMARY KEY (folder, video_id)
+                )
+            """)
+
+    def _add_column(self, table, column, definition):
+        """以前の版で作ったテーブルに列を追加する（すでにあれば何もしない）"""
+        columns = [row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- 動画メタデータ ----
+
+    def get_video(self, video_id, max_age_days):
+        """キャッシュ済みメタデータを返す（期限切れ・未登録ならNone）"""
+        if max_age_days <= 0:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row["fetched_at"] > max_age_days * 86400:
+            return None
+        return dict(row)
+
+    def put_video(self, video_id, title, upload_date, duration):
+        """yt-dlp -J で取得したメタデータを保存する（判定結果は保持）"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO videos (video_id, title, upload_date, duration, fetched_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    title = excluded.title,
+                    upload_date = excluded.upload_date,
+                    duration = excluded.duration,
+                    fetched_at = excluded.fetched_at,
+                    updated_at = excluded.updated_at
+            """, (video_id, title, str(upload_date), int(duration), now, now))
+
+    def set_decision(self, video_id, decision):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE videos SET decision = ?, updated_at = ? WHERE video_id = ?",
+                (decision, time.time(), video_id),
+            )
+
+    def purge_videos(self, older_than_days=None):
+        """メタデータを削除する（日数指定なしなら全件）。削除件数を返す"""
+        with self._lock, self._conn:
+            if older_than_days is None:
+                cur = self._conn.execute("DELETE FROM videos")
+            else:
+                cutoff = time.time() - older_than_days * 86400
+                cur = self._conn.execute("DELETE FROM videos WHERE fetched_at < ?", (cutoff,))
+            return cur.rowcount
+
+    def count_videos(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    # ---- 長さインデックス ----
+
+    def get_durations(self, folder):
+        """フォルダ内の長さインデックスを {filename: row} で返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM durations WHERE folder = ?", (folder,)
+            ).fetchall()
+        return {row["filename"]: dict(row) for row in rows}
+
+    def put_duration(self, folder, filename, size, mtime_ns, duration):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO durations (folder, filename, size, mtime_ns, duration, probed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (folder, filename, int(size), int(mtime_ns), int(duration), time.time()))
+
+    def delete_durations(self, folder, filenames):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM durations WHERE folder = ? AND filename = ?",
+                [(folder, name) for name in filenames],
+            )
+
+    def clear_durations(self):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM durations").rowcount
+
+    # ---- チャンネル走査状態 ----
+
+    def get_high_water(self, folder):
+        """前回までに処理を終えた最新の動画IDと公開日を返す（未登録なら (None, None)）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_video_id, last_date FROM channels WHERE folder = ?", (folder,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return row["last_video_id"], row["last_date"]
+
+    def set_high_water(self, folder, video_id, upload_date):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO channels (folder, last_video_id, last_date, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (folder, video_id, upload_date, time.time()))
+
+    def reset_high_water(self, folder=None):
+        with self._lock, self._conn:
+            if folder is None:
+                return self._conn.execute("DELETE FROM channels").rowcount
+            return self._conn.execute("DELETE FROM channels WHERE folder = ?", (folder,)).rowcount
+
+    # ---- フィード ----
+
+    def get_feed_hash(self, folder):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT items_hash FROM feeds WHERE folder = ?", (folder,)
+            ).fetchone()
+        return row["items_hash"] if row else None
+
+    def set_feed_hash(self, folder, items_hash):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feeds (folder, items_hash, updated_at) VALUES (?, ?, ?)",
+                (folder, items_hash, time.time()),
+            )
+
+    # ---- エピソード ----
+
+    def put_episode(self, folder, filename, video_id, title, upload_date, size, duration, local, object_key=None):
+        """エピソードを記録する（object_key を指定すると共有ストアのオブジェクトへの参照になる）"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO episodes
+                    (folder, filename, video_id, title, upload_date, size, duration, local, created_at, object_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (folder, filename, video_id, title, str(upload_date), int(size), int(duration or 0),
+                  1 if local else 0, time.time(), object_key))
+
+    def find_episode(self, folder, filenames):
+        """候補のファイル名（拡張子違いなど）のうち、記録済みのエピソードを返す"""
+        filenames = list(filenames)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM episodes WHERE folder = ? AND filename IN ({','.join('?' * len(filenames))})",
+                (folder, *filenames),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_episodes(self, folder):
+        """フォルダのエピソードを {filename: row} で返す（共有オブジェクトの参照は uploaded 付き）"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT e.*, s.uploaded AS uploaded FROM episodes e
+                LEFT JOIN shared_objects s ON s.object_key = e.object_key
+                WHERE e.folder = ?
+            """, (folder,)).fetchall()
+        return {row["filename"]: dict(row) for row in rows}
+
+    def set_episode_local(self, folder, filename, local):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE episodes SET local = ? WHERE folder = ? AND filename = ?",
+                               (1 if local else 0, folder, filename))
+
+    def delete_episodes(self, folder, filenames):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM episodes WHERE folder = ? AND filename = ?",
+                [(folder, name) for name in filenames],
+            )
+
+    # ---- 共有ストア ----
+
+    def get_shared_object(self, object_key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM shared_objects WHERE object_key = ?", (object_key,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_shared_object(self, object_keys):
+        """候補のキー（音声モード違い）のうち、最初に見つかった共有オブジェクトを返す"""
+        for object_key in object_keys:
+            row = self.get_shared_object(object_key)
+            if row:
+                return row
+        return None
+
+    def put_shared_object(self, object_key, video_id, size, duration, local, uploaded):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO shared_objects (object_key, video_id, size, duration, local, uploaded, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(object_key) DO UPDATE SET
+                    size = excluded.size, duration = excluded.duration,
+                    local = excluded.local, uploaded = excluded.uploaded
+            """, (object_key, video_id, int(size), int(duration or 0), 1 if local else 0,
+                  1 if uploaded else 0, time.time()))
+
+    def set_shared_uploaded(self, object_key):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE shared_objects SET uploaded = 1 WHERE object_key = ?", (object_key,))
+
+    def set_shared_local(self, object_key, local):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE shared_objects SET local = ? WHERE object_key = ?",
+                               (1 if local else 0, object_key))
+
+    def add_shared_hit(self, object_key, size):
+        """重複排除でダウンロードを省略した回数とバイト数を記録する"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE shared_objects SET hits = hits + 1 WHERE object_key = ?", (object_key,))
+            self._conn.executemany("""
+                INSERT INTO shared_stats (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            """, [("dedup_downloads", 1), ("dedup_bytes", int(size))])
+
+    def shared_references(self):
+        """共有オブジェクトへの参照（チャンネルごとのエピソード）をすべて返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM episodes WHERE object_key IS NOT NULL"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_shared_objects(self):
+        """共有オブジェクトを参照数（refs）付きで返す"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT s.*, COUNT(e.object_key) AS refs FROM shared_objects s
+                LEFT JOIN episodes e ON e.object_key = s.object_key
+                GROUP BY s.object_key ORDER BY s.created_at
+            """).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_shared_objects(self, object_keys):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM shared_objects WHERE object_key = ?",
+                                   [(key,) for key in object_keys])
+
+    def shared_stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM shared_stats").fetchall()
+        return {row["name"]: row["value"] for row in rows}
+
+    # ---- ローカル音声キャッシュ ----
+
+    def put_local_file(self, path, folder, size, published, uploaded=False):
+        """ローカルに置いた音声ファイルを記録する（path は data/ からの相対パス）"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO local_files (path, folder, size, published, uploaded, accessed_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, published = excluded.published,
+                    uploaded = excluded.uploaded, accessed_at = excluded.accessed_at
+            """, (path, folder, int(size), str(published), 1 if uploaded else 0, now, now))
+
+    def touch_local_file(self, path):
+        """最後に使った時刻を更新する（記録がなければ何もしない）"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE local_files SET accessed_at = ? WHERE path = ?", (time.time(), path))
+
+    def set_local_uploaded(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE local_files SET uploaded = 1 WHERE path = ?", (path,))
+
+    def list_local_files(self):
+        """記録済みのローカルファイルを、最後に使った時刻の古い順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM local_files ORDER BY accessed_at, published"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_local_files(self, paths):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM local_files WHERE path = ?", [(path,) for path in paths])
+
+    # ---- ネガティブキャッシュ ----
+
+    def get_negative(self, video_id):
+        """期限内のネガティブキャッシュを返す（期限切れ・未登録ならNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM negative WHERE video_id = ? AND expires_at > ?", (video_id, time.time())
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put_negative(self, video_id, folder, category, reason, expires_at):
+        """失敗を記録する（同じ動画が続けて失敗した回数も数える）"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO negative (video_id, folder, category, reason, failures, expires_at, created_at)
+                VALUES (?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    folder = excluded.folder,
+                    category = excluded.category,
+                    reason = excluded.reason,
+                    failures = negative.failures + 1,
+                    expires_at = excluded.expires_at
+            """, (video_id, folder, category, reason[:500], expires_at, time.time()))
+
+    def list_negative(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM negative ORDER BY folder, expires_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge_negative(self, category=None, expired_only=False):
+        """ネガティブキャッシュを削除する（分類・期限切れのみで絞り込み可）。削除件数を返す"""
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if expired_only:
+            conditions.append("expires_at <= ?")
+            params.append(time.time())
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM negative{where}", params).rowcount
+
+    # ---- 作業ジャーナル ----
+
+    def begin_run(self):
+        """実行を開始する。前回の実行が終わっていなければ再開し (run_id, True) を返す
+
+        新しい実行では、アップロード待ちのもの以外の前回のジャーナルを破棄する。
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT run_id, status FROM runs ORDER BY run_id DESC LIMIT 1"
+            ).fetchone()
+            if row and row["status"] != RUN_FINISHED:
+                self._conn.execute(
+                    "UPDATE runs SET status = ?, finished_at = NULL WHERE run_id = ?",
+                    (RUN_RUNNING, row["run_id"]),
+                )
+                return row["run_id"], True
+            self._conn.execute("DELETE FROM journal WHERE state != ?", (JOURNAL_DOWNLOADED,))
+            cur = self._conn.execute(
+                "INSERT INTO runs (status, started_at) VALUES (?, ?)", (RUN_RUNNING, now)
+            )
+            return cur.lastrowid, False
+
+    def finish_run(self, run_id, status=RUN_FINISHED):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                (status, time.time(), run_id),
+            )
+
+    def journal_listing(self, run_id, folder, video_ids):
+        """一覧取得の結果を記録する（ダウンロード済みでアップロード待ちの動画は状態を保つ）"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO journal (folder, video_id, run_id, position, state, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(folder, video_id) DO UPDATE SET
+                    run_id = excluded.run_id,
+                    position = excluded.position,
+                    state = CASE WHEN journal.state = ? THEN journal.state ELSE excluded.state END,
+                    updated_at = excluded.updated_at
+            """, [(folder, video_id, run_id, i, JOURNAL_LISTED, now, JOURNAL_DOWNLOADED)
+                  for i, video_id in enumerate(video_ids)])
+
+    def get_journal(self, folder, run_id=None):
+        """フォルダのジャーナルを {video_id: row} で返す（run_id 指定時はその実行の分のみ、一覧順）"""
+        query = "SELECT * FROM journal WHERE folder = ?"
+        params = [folder]
+        if run_id is not None:
+            query += " AND run_id = ?"
+            params.append(run_id)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY position", params).fetchall()
+        return {row["video_id"]: dict(row) for row in rows}
+
+    def set_journal_state(self, folder, video_id, state, data=None):
+        """動画の状態を進める（data を指定した場合は作業内容も保存する）"""
+        with self._lock, self._conn:
+            if data is None:
+                self._conn.execute(
+                    "UPDATE journal SET state = ?, updated_at = ? WHERE folder = ? AND video_id = ?",
+                    (state, time.time(), folder, video_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE journal SET state = ?, data = ?, updated_at = ? WHERE folder = ? AND video_id = ?",
+                    (state, data, time.time(), folder, video_id),
+                )
+
+    def mark_in_feed(self, folder):
+        """アップロード済みの動画をフィード反映済みにする"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE journal SET state = ?, updated_at = ? WHERE folder = ? AND state = ?",
+                (JOURNAL_IN_FEED, time.time(), folder, JOURNAL_UPLOADED),
+            ).rowcount
+
+    def journal_summary(self, run_id):
+        """実行のジャーナルを状態ごとの件数で返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS n FROM journal WHERE run_id = ? GROUP BY state", (run_id,)
+            ).fetchall()
+        return {row["state"]: row["n"] for row in rows}
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+yt-dlp 実行エンジン
+----------------------------------------
+プレイリスト一覧・メタデータ取得・ダウンロードを同じインターフェースで実行する。
+- SubprocessEngine: 呼び出しごとに yt-dlp コマンドを起動する（従来の方式）
+- LibraryEngine: yt-dlp をライブラリとして読み込んだ常駐ワーカープロセスで実行する
+  （import・エクストラクタ初期化・HTTPセッションをワーカー内で使い回す）
+
+どちらのエンジンも失敗時は YtDlpError を送出し、stderr 相当のメッセージを
+.stderr に持つので translate_youtube_error でそのまま分類できる。
+起動した子プロセスは登録しておき、中断時に terminate_active_processes でまとめて終了させる。
+"""
+
+import collections
+import importlib.util
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+import time
+
+
+class YtDlpError(Exception):
+    """yt-dlp の実行失敗（stderr にエラーメッセージを保持）"""
+
+    def __init__(self, stderr):
+        super().__init__(stderr)
+        self.stderr = stderr or ""
+
+
+# 実行中の子プロセス（中断時にまとめて終了させる）
+_active_processes = set()
+_active_lock = threading.Lock()
+_terminating = False
+# 起動した子プロセス数（プログラム名ごと、実行レポート用）
+process_counts = collections.Counter()
+# プログラムごとに最初の子プロセスを起動した時刻（起動時間の計測用）
+first_process_at = {}
+
+
+def start_process(cmd, **kwargs):
+    """子プロセスを起動して登録する（終了後に forget_process で登録を外す）
+
+    terminate_active_processes の後は新しいプロセスを起動せず YtDlpError を送出する。
+    """
+    with _active_lock:
+        if _terminating:
+            raise YtDlpError("ERROR: Interrupted (shutting down)")
+        proc = subprocess.Popen(cmd, **kwargs)
+        _active_processes.add(proc)
+        program = os.path.basename(cmd[0])
+        process_counts[program] += 1
+        first_process_at.setdefault(program, time.time())
+    return proc
+
+
+def forget_process(proc):
+    with _active_lock:
+        _active_processes.discard(proc)
+
+
+def terminate_active_processes():
+    """実行中の子プロセスに SIGTERM を送り、以降の起動を止める。送った数を返す"""
+    global _terminating
+    with _active_lock:
+        _terminating = True
+        procs = [proc for proc in _active_processes if proc.poll() is None]
+    for proc in procs:
+        try:
+            proc.terminate()
+        except OSError:
+            pass
+    return len(procs)
+
+
+def run_process(cmd):
+    """コマンドを実行して (終了コード, stdout, stderr) を返す"""
+    proc = start_process(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        forget_process(proc)
+    return proc.returncode, stdout, stderr
+
+
+class SubprocessEngine:
+    """呼び出しごとに yt-dlp プロセスを起動するエンジン"""
+
+    name = "subprocess"
+
+    def _run_json(self, args, url):
+        returncode, stdout, stderr = run_process(["yt-dlp", *args, "-J", url])
+        if returncode != 0:
+            raise YtDlpError(stderr)
+        return json.loads(stdout)
+
+    def list_playlist(self, args, playlist_url):
+        return self._run_json(args, playlist_url)
+
+    def fetch_metadata(self, url):
+        return self._run_json([], url)
+
+    def fetch_metadata_batch(self, urls):
+        """{url: メタデータ辞書 または YtDlpError} を返す"""
+        results = {}
+        for url in urls:
+            try:
+                results[url] = self.fetch_metadata(url)
+            except (YtDlpError, json.JSONDecodeError) as e:
+                results[url] = e if isinstance(e, YtDlpError) else YtDlpError(str(e))
+        return results
+
+    def download(self, args, url):
+        returncode, _, stderr = run_process(["yt-dlp", *args, url])
+        if returncode != 0:
+            raise YtDlpError(stderr)
+
+    def close(self):
+        pass
+
+
+# ---- ワーカープロセス側の処理 ----
+
+# オプション（CLI引数）ごとに作った YoutubeDL をワーカー内で使い回す
+_worker_ydls = {}
+
+
+def _worker_init():
+    # 中断はメインプロセス側で扱うので、ワーカーは SIGINT を無視する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import yt_dlp  # noqa: F401  ワーカー起動時に一度だけ import する
+
+
+def _build_ydl(args, quiet=True):
+    import yt_dlp
+    opts = yt_dlp.parse_options(list(args)).ydl_opts
+    if quiet:
+        opts.update(quiet=True, no_warnings=True, noprogress=True)
+    return yt_dlp.YoutubeDL(opts)
+
+
+def _cached_ydl(args):
+    key = tuple(args)
+    ydl = _worker_ydls.get(key)
+    if ydl is None:
+        ydl = _build_ydl(args)
+        _worker_ydls[key] = ydl
+    return ydl
+
+
+def _worker_extract(args, urls):
+    """各URLの情報を取得し [(ok, 情報 or エラーメッセージ), ...] を返す"""
+    ydl = _cached_ydl(args)
+    results = []
+    for url in urls:
+        try:
+            info = ydl.extract_info(url, download=False)
+            results.append((True, ydl.sanitize_info(info)))
+        except Exception as e:
+            results.append((False, str(e)))
+    return results
+
+
+def _worker_download(args, url):
+    # 出力先(-o)が毎回変わるので YoutubeDL はダウンロードごとに作る
+    # （import 済みのモジュールとエクストラクタ定義はワーカー内で再利用される）
+    try:
+        with _build_ydl(args) as ydl:
+            retcode = ydl.download([url])
+        if retcode != 0:
+            return False, f"yt-dlp exited with code {retcode}"
+        return True, ""
+    except Exception as e:
+        return False, str(e)
+
+
+class LibraryEngine:
+    """yt-dlp をライブラリとして常駐ワーカープロセスで実行するエンジン"""
+
+    name = "library"
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        # スレッドを起動する前に fork してワーカーを常駐させる
+        self._pool = multiprocessing.get_context("fork").Pool(workers, initializer=_worker_init)
+
+    def list_playlist(self, args, playlist_url):
+        ok, payload = self._pool.apply(_worker_extract, (list(args), [playlist_url]))[0]
+        if not ok:
+            raise YtDlpError(payload)
+        return payload
+
+    def fetch_metadata(self, url):
+        ok, payload = self._pool.apply(_worker_extract, ([], [url]))[0]
+        if not ok:
+            raise YtDlpError(payload)
+        return payload
+
+    def fetch_metadata_batch(self, urls):
+        """URLをワーカー数で分割してまとめて取得し {url: メタデータ辞書 または YtDlpError} を返す"""
+        urls = list(urls)
+        if not urls:
+            return {}
+        chunk_size = max(1, -(-len(urls) // self.workers))
+        chunks = [urls[i:i + chunk_size] for i in range(0, len(urls), chunk_size)]
+        pending = [(chunk, self._pool.apply_async(_worker_extract, ([], chunk))) for chunk in chunks]
+
+        results = {}
+        for chunk, async_result in pending:
+            for url, (ok, payload) in zip(chunk, async_result.get()):
+                results[url] = payload if ok else YtDlpError(payload)
+        return results
+
+    def download(self, args, url):
+        ok, message = self._pool.apply(_worker_download, (list(args), url))
+        if not ok:
+            raise YtDlpError(message)
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+
+def create_engine(backend, workers=4, logger=None):
+    """設定値からエンジンを作る（library が使えない場合は subprocess にフォールバック）"""
+    if backend == "library":
+        if importlib.util.find_spec("yt_dlp") is None:
+            if logger:
+                logger.warning("⚠️ yt_dlp モジュールが見つからないため subprocess バックエンドを使用します")
+            return SubprocessEngine()
+        return LibraryEngine(workers)
+    if backend != "subprocess" and logger:
+        logger.warning(f"⚠️ 不明な yt_dlp_backend: {backend}（subprocess を使用します）")
+    return SubprocessEngine()